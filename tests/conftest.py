@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# 被测模块是仓库根目录下的顶层模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tmall_comment_crawler_cmd import HttpTransport, TmallCommentCrawler  # noqa: E402
+from tmall_fake_mtop import FakeMtopServer  # noqa: E402
+
+
+@pytest.fixture
+def fake_server():
+    """5页的本地模拟接口，不注入错误"""
+    with FakeMtopServer(total_pages=5, seed=1) as server:
+        yield server
+
+
+@pytest.fixture
+def make_crawler():
+    """创建指向模拟接口的爬虫：make_crawler(server, **TmallCommentCrawler参数)，默认不限速、快速退避"""
+    transports = []
+
+    def make(server, **kwargs):
+        if 'transport' not in kwargs:
+            kwargs['transport'] = HttpTransport(max_retries=3, backoff_factor=0.01, max_backoff=0.05)
+            transports.append(kwargs['transport'])
+        kwargs.setdefault('rate_limit', 100)
+        kwargs.setdefault('adaptive', False)
+        crawler = TmallCommentCrawler(base_url=server.url, **kwargs)
+        crawler.set_cookie(server.cookie())
+        return crawler
+
+    yield make
+    for transport in transports:
+        transport.close()
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from tmall_comment_crawler_cmd import AccountPool, CrawlCancelled, CrawlControl
+from tmall_comment_e2e import run_e2e
+from tmall_fake_mtop import FakeMtopServer
+
+COOKIE = "tracknick=test; _m_h5_tk=0123456789abcdef0123456789abcdef_1700000000000"
+
+
+def quarantined_pool(quarantine, max_quarantine_wait=300):
+    pool = AccountPool([COOKIE], rate=100, max_failures=1, throttle_quarantine=quarantine,
+                       adaptive=False, max_quarantine_wait=max_quarantine_wait)
+    pool.report_throttled(pool.accounts[0])
+    return pool
+
+
+def test_acquire_waits_for_quarantine_to_end():
+    pool = quarantined_pool(0.3)
+    started = time.monotonic()
+    assert pool.acquire() is pool.accounts[0]
+    assert time.monotonic() - started >= 0.25
+
+
+def test_acquire_async_waits_for_quarantine_to_end():
+    import asyncio
+    pool = quarantined_pool(0.3)
+    assert asyncio.run(pool.acquire_async()) is pool.accounts[0]
+
+
+def test_acquire_gives_up_after_max_wait():
+    pool = quarantined_pool(30, max_quarantine_wait=1)
+    started = time.monotonic()
+    assert pool.acquire() is None
+    assert time.monotonic() - started < 0.5
+
+
+def test_quarantine_wait_can_be_cancelled():
+    pool = quarantined_pool(30)
+    control = CrawlControl()
+    threading.Timer(0.2, control.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(CrawlCancelled):
+        pool.acquire(control=control)
+    assert time.monotonic() - started < 2
+
+
+@pytest.mark.parametrize('concurrency', [1, 3])
+def test_single_account_recovers_from_throttling(concurrency):
+    # 只有一个账号且频繁被限流时，应等待隔离结束而不是让剩余页面全部失败（seed=10时账号会被隔离）
+    with FakeMtopServer(total_pages=30, throttle_rate=0.2, seed=10) as server:
+        report = run_e2e(server, concurrency=concurrency, rate=10.0, accounts=1)
+    assert report['failed_pages'] == 0
+    assert report['pages'] == 30
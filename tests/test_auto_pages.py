@@ -0,0 +1,42 @@
+from tmall_comment_crawler_cmd import TmallCommentCrawler
+
+
+def test_auto_pages_stops_at_total_page(fake_server, make_crawler):
+    crawler = make_crawler(fake_server, concurrency=3)
+    plans = []
+    comments = crawler.get_comments('1', 1, None, auto_pages=True, plan_callback=plans.append)
+    assert len(comments) == 100
+    assert plans == [5]
+    assert fake_server.stats()['requests'] == 5
+    assert crawler.page_info['totalPage'] == '5'
+
+
+def test_auto_pages_respects_end_page_cap(fake_server, make_crawler):
+    crawler = make_crawler(fake_server)
+    comments = crawler.get_comments('1', 2, 3, auto_pages=True)
+    assert len(comments) == 40
+    assert fake_server.stats()['requests'] == 2
+
+
+def test_fixed_range_requests_every_page(fake_server, make_crawler):
+    crawler = make_crawler(fake_server)
+    assert len(crawler.get_comments('1', 1, 8)) == 100
+    assert fake_server.stats()['requests'] == 8
+
+
+def test_plan_end_page():
+    plan = TmallCommentCrawler._plan_end_page
+    assert plan(1, None, {'totalPage': '250'}) == 250
+    assert plan(1, 10, {'totalPage': '250'}) == 10
+    assert plan(3, 10, {'totalPage': '2'}) == 3
+    assert plan(1, 7, {}) == 7
+    assert plan(4, None, {'totalPage': 'x'}) == 4
+
+
+def test_is_last_page(make_crawler, fake_server):
+    crawler = make_crawler(fake_server)
+    assert crawler._is_last_page(3, [{'id': '1'}], {'hasNext': 'false'})
+    assert crawler._is_last_page(3, [], {'hasNext': 'true'})
+    assert not crawler._is_last_page(3, [{'id': '1'}], {'hasNext': 'true'})
+    crawler.failed_pages = [3]
+    assert not crawler._is_last_page(3, [], {})
@@ -0,0 +1,150 @@
+import json
+import os
+
+from tmall_comment_batch import BatchCrawler, BatchJob, JobOutputs, load_jobs, parse_job_line
+from tmall_comment_crawler_cmd import HttpTransport, TmallCommentCrawler
+from tmall_comment_export import JsonlSink
+
+
+def test_parse_job_line():
+    job = parse_job_line("714871191114, 2 7 feedbackdate  # 备注")
+    assert (job.item_id, job.start_page, job.end_page, job.order_type, job.auto_pages) == \
+        ('714871191114', 2, 7, 'feedbackdate', False)
+    assert parse_job_line("  # 注释") is None
+    auto = parse_job_line("123 1 auto", default_end=5)
+    assert auto.end_page is None and auto.auto_pages
+
+
+def test_load_jobs_from_text_json_and_jsonl(tmp_path):
+    text = tmp_path / 'jobs.txt'
+    text.write_text("1\n2 3 4\n\n", encoding='utf-8')
+    assert [(j.item_id, j.start_page, j.end_page) for j in load_jobs(str(text), default_end=9)] == \
+        [('1', 1, 9), ('2', 3, 4)]
+
+    records = [{'item_id': 5, 'end_page': 'auto'}, {'item_id': '6', 'start_page': 2, 'order_type': 'feedbackdate'}]
+    as_json = tmp_path / 'jobs.json'
+    as_json.write_text(json.dumps(records), encoding='utf-8')
+    as_jsonl = tmp_path / 'jobs.jsonl'
+    as_jsonl.write_text('\n'.join(json.dumps(r) for r in records), encoding='utf-8')
+    for path in (as_json, as_jsonl):
+        jobs = load_jobs(str(path))
+        assert jobs[0].item_id == '5' and jobs[0].auto_pages
+        assert (jobs[1].start_page, jobs[1].end_page, jobs[1].order_type) == (2, 5, 'feedbackdate')
+
+
+def test_run_keeps_job_order_and_summarizes(fake_server):
+    transport = HttpTransport(backoff_factor=0.01, max_backoff=0.05)
+    batch = BatchCrawler(workers=3, rate_limit=100, adaptive=False, cookie=fake_server.cookie(),
+                         transport=transport, base_url=fake_server.url)
+    jobs = [BatchJob(item_id, 1, 2) for item_id in ('11', '22', '33')]
+    seen = []
+    results, summary = batch.run(jobs, on_result=lambda r: seen.append(r.job.item_id))
+    transport.close()
+
+    assert [r.job for r in results] == jobs
+    assert sorted(seen) == ['11', '22', '33']
+    assert all(r.ok and len(r.comments) == 40 for r in results)
+    assert {c['auctionNumId'] for c in results[1].comments} == {'22'}
+    assert summary['items'] == 3 and summary['succeeded'] == 3
+    assert summary['comments'] == 120 and summary['pages'] == 6
+
+
+def test_failing_job_does_not_stop_the_batch(fake_server, monkeypatch):
+    original = TmallCommentCrawler.iter_comments
+
+    def iter_comments(self, item_id, *args, **kwargs):
+        if item_id == '2':
+            raise RuntimeError("boom")
+        return original(self, item_id, *args, **kwargs)
+
+    monkeypatch.setattr(TmallCommentCrawler, 'iter_comments', iter_comments)
+    transport = HttpTransport(backoff_factor=0.01, max_backoff=0.05)
+    batch = BatchCrawler(workers=2, rate_limit=100, adaptive=False, cookie=fake_server.cookie(),
+                         transport=transport, base_url=fake_server.url)
+    results, summary = batch.run([BatchJob(item_id, 1, 1) for item_id in ('1', '2', '3')])
+    transport.close()
+    assert [r.ok for r in results] == [True, False, True]
+    assert results[1].error == "boom"
+    assert (summary['succeeded'], summary['failed']) == (2, 1)
+
+
+def make_batch(server, **kwargs):
+    transport = HttpTransport(backoff_factor=0.01, max_backoff=0.05)
+    return BatchCrawler(rate_limit=100, adaptive=False, cookie=server.cookie(), transport=transport,
+                        base_url=server.url, **kwargs)
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_run_streams_pages_to_outputs(fake_server, tmp_path):
+    batch = make_batch(fake_server, workers=2)
+    outputs = JobOutputs(output_dir=str(tmp_path), ext='.jsonl')
+    pages = []
+
+    def on_page(job, page, comments, failed):
+        pages.append((job.item_id, page))
+        outputs.on_page(job, page, comments, failed)
+
+    results, summary = batch.run([BatchJob('11', 1, 3), BatchJob('22', 1, 2)],
+                                 on_page=on_page, open_output=outputs.open)
+    batch.transport.close()
+    files = [outputs.finish(result) for result in results]
+
+    # 评论写入文件，不在结果中累积
+    assert all(not r.comments for r in results)
+    assert [r.count for r in results] == [60, 40] and summary['comments'] == 100
+    assert sorted(pages) == [('11', 1), ('11', 2), ('11', 3), ('22', 1), ('22', 2)]
+    assert os.path.basename(files[0]).startswith('11_') and '_60条评论_' in files[0]
+    assert [len(read_jsonl(path)) for path in files] == [60, 40]
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(path) for path in files)
+
+
+def test_write_failure_keeps_written_pages(fake_server, tmp_path):
+    class FailingSink(JsonlSink):
+        def write_page(self, comments):
+            if self.rows_written >= 40:
+                raise OSError("磁盘已满")
+            super().write_page(comments)
+
+    batch = make_batch(fake_server)
+    path = str(tmp_path / 'out.jsonl')
+    results, _ = batch.run([BatchJob('11', 1, 5)], open_output=lambda job: FailingSink(path))
+    batch.transport.close()
+
+    assert results[0].error == "保存失败: 磁盘已满"
+    assert len(read_jsonl(path)) == 40
+
+
+def test_job_without_comments_leaves_no_file(fake_server, tmp_path):
+    batch = make_batch(fake_server)
+    outputs = JobOutputs(output_dir=str(tmp_path), ext='.csv', filter_empty_comments=True)
+    results, _ = batch.run([BatchJob('11', 50, 51)], on_page=outputs.on_page, open_output=outputs.open)
+    batch.transport.close()
+    assert outputs.finish(results[0]) is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_dedup_index_is_saved_after_output_commits(fake_server, tmp_path):
+    from tmall_comment_dedup import DedupIndex
+
+    class FailingSink(JsonlSink):
+        def close(self):
+            super().close()
+            raise OSError("磁盘已满")
+
+    path = str(tmp_path / 'ids.idx')
+    batch = make_batch(fake_server, dedup=DedupIndex(path))
+    out = str(tmp_path / 'out.jsonl')
+    results, _ = batch.run([BatchJob('11', 1, 2)], open_output=lambda job: FailingSink(out))
+    assert results[0].error == "保存失败: 磁盘已满"
+    # 输出失败：索引中没有这次的评论ID，重新运行时评论仍会输出
+    assert not os.path.exists(path) or len(DedupIndex(path)) == 0
+    assert len(batch.dedup) == 0
+
+    results, _ = batch.run([BatchJob('11', 1, 2)], open_output=lambda job: JsonlSink(out))
+    batch.transport.close()
+    assert results[0].ok and results[0].count == 40
+    assert len(DedupIndex(path)) == 40
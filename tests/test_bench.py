@@ -0,0 +1,77 @@
+import io
+import os
+
+import pytest
+
+pytest.importorskip('pandas')
+
+import tmall_comment_bench as bench
+from tmall_comment_crawler_cmd import TmallCommentCrawler, parse_jsonp
+
+
+@pytest.fixture(scope='module')
+def body():
+    return bench.load_payload()
+
+
+def test_compact_payload_parses_like_the_sample(body):
+    with open(bench.DEFAULT_PAYLOAD, 'rb') as f:
+        sample = parse_jsonp(f.read())
+    assert b'\n' not in body
+    assert parse_jsonp(body) == sample
+
+
+def test_parse_cases_agree(body):
+    results = [func(body) for _, func in bench.parse_cases()]
+    assert all(result == results[0] for result in results[1:])
+    # 计时后恢复orjson后端
+    orjson = bench.crawler_cmd.orjson
+    bench.parse_offset_stdlib(body)
+    assert bench.crawler_cmd.orjson is orjson
+
+
+def test_replicate_comments(body):
+    comments = bench.replicate_comments(body, 45)
+    sample = parse_jsonp(body)['data']['rateList']
+    assert len(comments) == 45
+    assert comments[len(sample)] == sample[0]
+
+
+def test_bench_flatten_checks_both_paths(body):
+    results = bench.bench_flatten(bench.replicate_comments(body, 60), repeat=1)
+    assert [name for name, _, _ in results] == ['逐行展开 (原实现)', '列式 comments_to_frame']
+    assert all(seconds > 0 and rate > 0 for _, seconds, rate in results)
+
+
+def test_sign_crawler_signs_like_a_real_crawler():
+    crawler = bench._sign_crawler()
+    real = TmallCommentCrawler()
+    real.token = crawler.token
+    assert crawler._generate_sign(1, '{}') == real._generate_sign(1, '{}')
+    assert crawler._build_params('1', 2)['data'] == real._build_params('1', 2)['data']
+
+
+def test_suite_records_every_stage(tmp_path):
+    suite = bench.BenchSuite(rows_list=[40], repeat=3, memory=False)
+    suite.out = io.StringIO()
+    results = suite.run()
+    stages = {r['stage'] for r in results}
+    assert stages == set(bench.STAGES)
+    exports = [r for r in results if r['stage'] == 'export']
+    assert {r['case'] for r in exports} == {name for name, _, _, _ in bench.export_cases()}
+    assert all(r['rows'] == 40 and r['file_bytes'] > 0 for r in exports)
+    assert all(r['seconds'] >= 0 and r['unit'] for r in results)
+
+
+def test_compare_results_matches_cases():
+    old = {'results': [{'stage': 'parse', 'case': 'a', 'payload': '完整', 'rows': 0, 'rate': 10.0, 'unit': 'MB/秒'},
+                       {'stage': 'parse', 'case': 'gone', 'payload': '完整', 'rows': 0, 'rate': 1.0, 'unit': 'MB/秒'}]}
+    new = {'results': [{'stage': 'parse', 'case': 'a', 'payload': '完整', 'rows': 0, 'rate': 25.0, 'unit': 'MB/秒'},
+                       {'stage': 'parse', 'case': 'new', 'payload': '完整', 'rows': 0, 'rate': 5.0, 'unit': 'MB/秒'}]}
+    assert bench.compare_results(old, new) == [(('parse', 'a', '完整', 0), 'MB/秒', 10.0, 25.0, 2.5)]
+
+
+def test_environment_info_lists_dependencies():
+    info = bench.environment_info()
+    assert set(info) >= {'python', 'commit', 'orjson', 'pandas', 'openpyxl'}
+    assert os.path.isabs(bench.BASE_DIR)
@@ -0,0 +1,41 @@
+import socket
+import threading
+import time
+
+from tmall_comment_crawler_cmd import HttpTransport, TmallCommentCrawler
+from tmall_fake_mtop import FakeMtopServer
+
+
+def cancel_after(crawler, seconds):
+    threading.Timer(seconds, crawler.control.cancel).start()
+
+
+def test_cancel_during_throttle_backoff_is_prompt():
+    with FakeMtopServer(total_pages=5, throttle_rate=1.0, seed=1) as server:
+        transport = HttpTransport(max_retries=5, backoff_factor=10, max_backoff=30)
+        crawler = TmallCommentCrawler(concurrency=1, rate_limit=100, transport=transport, base_url=server.url,
+                                      adaptive=False)
+        crawler.set_cookie(server.cookie())
+        cancel_after(crawler, 0.5)
+        started = time.monotonic()
+        comments = crawler.get_comments('1', 1, 3)
+    assert time.monotonic() - started < 3
+    assert comments == []
+    assert crawler.cancelled
+    assert '解析' not in crawler.last_error
+
+
+def test_cancel_during_network_backoff_is_prompt():
+    # 没有监听的端口，连接立即失败并进入网络退避
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    transport = HttpTransport(max_retries=5, backoff_factor=10, max_backoff=30)
+    crawler = TmallCommentCrawler(concurrency=1, rate_limit=100, transport=transport,
+                                  base_url=f"http://127.0.0.1:{port}/h5/", adaptive=False)
+    cancel_after(crawler, 0.5)
+    started = time.monotonic()
+    crawler.get_comments('1', 1, 1)
+    assert time.monotonic() - started < 3
+    assert crawler.cancelled
+    assert crawler.failed_pages == []
@@ -0,0 +1,112 @@
+import csv
+import json
+
+import pytest
+
+import tmall_comment_batch as batch
+import tmall_comment_crawler_cmd as cmd
+from tmall_fake_mtop import FakeMtopServer
+
+
+@pytest.fixture(scope='module')
+def server():
+    with FakeMtopServer(total_pages=4, seed=1) as server:
+        yield server
+
+
+def run(args, server, capsys):
+    code = cmd.main(args + ['--base-url', server.url, '--cookie', server.cookie(), '--rate', '100'])
+    return code, capsys.readouterr().out
+
+
+def test_json_progress_and_exit_code(server, tmp_path, capsys):
+    code, out = run(['111', '-p', '2', '--json', '-o', str(tmp_path / '{item_id}.jsonl')], server, capsys)
+    events = [json.loads(line) for line in out.splitlines()]
+    assert code == cmd.EXIT_OK
+    assert [(e['event'], e.get('page')) for e in events] == [('page', 1), ('page', 2), ('item', None),
+                                                            ('summary', None)]
+    assert events[0] == {'event': 'page', 'item_id': '111', 'page': 1, 'comments': 20, 'failed': False}
+    assert events[2]['comments'] == 40
+    assert events[-1]['exit_code'] == cmd.EXIT_OK
+
+
+@pytest.mark.parametrize('ext', ['csv', 'jsonl'])
+def test_fields_apply_to_streaming_formats(server, tmp_path, capsys, ext):
+    path = tmp_path / f'out.{ext}'
+    code, _ = run(['111', '-p', '1', '-q', '--fields', 'feedback,interactInfo.likeCount', '-o', str(path)],
+                  server, capsys)
+    assert code == cmd.EXIT_OK
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        columns = next(csv.reader(f)) if ext == 'csv' else list(json.loads(f.readline()))
+    # 与xlsx / parquet一致，只输出选择的字段
+    assert columns == ['评论内容', '点赞数']
+
+
+@pytest.mark.parametrize('args', [['--end-page', '0'], ['--pages', '0'], ['--start-page', '3', '--end-page', '2']])
+def test_invalid_page_range_is_a_usage_error(server, capsys, args):
+    with pytest.raises(SystemExit) as exc:
+        run(['111'] + args, server, capsys)
+    assert exc.value.code == cmd.EXIT_USAGE
+
+
+def test_rate_is_used_per_account_with_cookie_file(server, tmp_path, capsys, monkeypatch):
+    rates = []
+
+    class RecordingPool(cmd.AccountPool):
+        def __init__(self, cookies, rate=0.7, **kwargs):
+            rates.append(rate)
+            super().__init__(cookies, rate=rate, **kwargs)
+
+    monkeypatch.setattr(cmd, 'AccountPool', RecordingPool)
+    cookie_file = tmp_path / 'cookies.txt'
+    cookie_file.write_text(f"{server.cookie(0)}\n{server.cookie(0)}\n", encoding='utf-8')
+    code = cmd.main(['111', '-p', '1', '-q', '--base-url', server.url, '--cookie-file', str(cookie_file),
+                     '--rate', '5', '--output-dir', str(tmp_path)])
+    assert code == cmd.EXIT_OK
+    assert rates == [5.0]
+
+
+def test_interactive_mode_reports_failure(tmp_path, monkeypatch):
+    answers = iter(['111', '2', 'n', 'xlsx'])
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+    monkeypatch.chdir(tmp_path)
+
+    def failing_get_comments(self, item_id, start_page=1, end_page=5, *args, **kwargs):
+        assert (start_page, end_page) == (1, 2)
+        self.failed_pages = [1, 2]
+        self.last_error = "鉴权失败"
+        return []
+
+    monkeypatch.setattr(cmd.TmallCommentCrawler, 'get_comments', failing_get_comments)
+    assert cmd.interactive_main() == cmd.EXIT_FAILED
+
+
+def test_load_cookies_skips_blank_and_comment_lines(tmp_path):
+    path = tmp_path / 'cookies.txt'
+    path.write_text("# 账号1\n a=1; _m_h5_tk=x_1 \n\nb=2\n", encoding='utf-8')
+    assert cmd.load_cookies(str(path)) == ['a=1; _m_h5_tk=x_1', 'b=2']
+
+
+def test_batch_entry_point_shares_the_cli(server, tmp_path, capsys):
+    jobs = tmp_path / 'jobs.txt'
+    jobs.write_text("111 1 2\n222 1 1\n", encoding='utf-8')
+    code = batch.main([str(jobs), '--json', '--base-url', server.url, '--cookie', server.cookie(), '--rate', '100',
+                       '--output-dir', str(tmp_path / 'out'), '-f', 'jsonl'])
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert code == cmd.EXIT_OK
+    assert sorted(e['item_id'] for e in events if e['event'] == 'item') == ['111', '222']
+    assert sum(e['event'] == 'page' for e in events) == 3
+    assert len(list((tmp_path / 'out').iterdir())) == 2
+
+
+def test_batch_entry_point_returns_failure_exit_code(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exc:
+        batch.main([str(tmp_path / 'missing.txt'), '-q'])
+    assert exc.value.code == cmd.EXIT_USAGE
+
+
+def test_all_jobs_failing_is_a_failure_exit_code(tmp_path, capsys):
+    with FakeMtopServer(total_pages=2, illegal_access_rate=1.0, seed=1) as server:
+        code, _ = run(['111', '-p', '1', '-q', '--output-dir', str(tmp_path)], server, capsys)
+    assert code == cmd.EXIT_FAILED
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,39 @@
+from tmall_comment_store import CommentStore
+
+
+def page(ids, text='好'):
+    return [{'id': i, 'feedback': f"{text}{n}"} if i is not None else {'feedback': f"{text}{n}"}
+            for n, i in enumerate(ids)]
+
+
+def test_add_page_and_restore(tmp_path):
+    store = CommentStore(str(tmp_path / 'comments.db'))
+    comments = page(['1', '2', '3'])
+    assert store.add_page('9', '', 1, comments) == 3
+    assert store.add_page('9', '', 2, page(['3', '4'], '差')) == 1
+    assert store.get_checkpoint('9') == 2
+    assert store.known_ids('9', ['2', '4', '5']) == {'2', '4'}
+    assert list(store.iter_pages('9', '', 1, 1)) == [(1, comments)]
+    assert store.count('9') == 4
+    store.close()
+
+
+def test_comments_without_id_are_all_stored(tmp_path):
+    store = CommentStore(str(tmp_path / 'comments.db'))
+    comments = page([None, None, '', '7'])
+    assert store.add_page('9', '', 1, comments) == 4
+    restored = list(store.iter_pages('9', '', 1, 1))[0][1]
+    assert [c['feedback'] for c in restored] == ['好0', '好1', '好2', '好3']
+    # 同一条无ID的评论再次出现时按内容判断为已入库
+    assert store.add_page('9', '', 2, comments[:1]) == 0
+    assert store.count('9') == 4
+    store.close()
+
+
+def test_checkpoint_does_not_advance_past_failed_page(tmp_path):
+    store = CommentStore(str(tmp_path / 'comments.db'))
+    store.add_page('9', 'feedbackdate', 1, page(['1']))
+    store.add_page('9', 'feedbackdate', 2, page(['2']), advance_checkpoint=False)
+    assert store.get_checkpoint('9', 'feedbackdate') == 1
+    assert store.get_checkpoint('9', '') == 0
+    store.close()
@@ -0,0 +1,51 @@
+import logging
+
+import pytest
+
+import tmall_comment_coverage as coverage_module
+from tmall_comment_batch import BatchCrawler
+from tmall_comment_coverage import CoverageCrawler, tag_expression
+from tmall_comment_crawler_cmd import HttpTransport
+from tmall_fake_mtop import FakeMtopServer
+
+
+@pytest.fixture(scope='module')
+def capped_server():
+    # 300条评论，每种筛选条件最多翻5页（100条）
+    with FakeMtopServer(population=300, page_cap=5, seed=1) as server:
+        yield server
+
+
+@pytest.fixture
+def batch(capped_server):
+    transport = HttpTransport(backoff_factor=0.01, max_backoff=0.05)
+    yield BatchCrawler(workers=2, rate_limit=200, adaptive=False, cookie=capped_server.cookie(),
+                       transport=transport, base_url=capped_server.url)
+    transport.close()
+
+
+def test_shards_cover_more_than_one_order(batch):
+    comments, report = CoverageCrawler(batch, chunk_pages=5).crawl('1')
+    ids = [c['id'] for c in comments]
+    assert len(ids) == len(set(ids)) == report['distinct']
+    assert report['feed_all_count'] == 300
+    assert report['distinct'] > 100
+
+
+def test_tag_expression_format():
+    assert tag_expression(123) == "attributeId:123"
+
+
+def test_ignored_tag_filter_is_reported(batch, monkeypatch, caplog):
+    # 接口不认expression时返回不筛选的结果
+    monkeypatch.setattr(coverage_module, 'TAG_EXPRESSION_FORMAT', "unknown:{attribute_id}")
+    with caplog.at_level(logging.WARNING, logger='tmall_comment_coverage'):
+        CoverageCrawler(batch, rate_types=(), orders=('',), chunk_pages=5).crawl('1')
+    warnings = [r.getMessage() for r in caplog.records if '标签筛选可能没有生效' in r.getMessage()]
+    assert len(warnings) == 1
+
+
+def test_working_tag_filter_is_not_reported(batch, caplog):
+    with caplog.at_level(logging.WARNING, logger='tmall_comment_coverage'):
+        CoverageCrawler(batch, rate_types=(), orders=('',), chunk_pages=5).crawl('1')
+    assert not any('标签筛选可能没有生效' in r.getMessage() for r in caplog.records)
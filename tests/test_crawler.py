@@ -0,0 +1,61 @@
+import asyncio
+
+
+def test_get_comments_fetches_pages_in_order(fake_server, make_crawler):
+    crawler = make_crawler(fake_server, concurrency=3)
+    comments = crawler.get_comments('1', 1, 3)
+    assert [c['id'] for c in comments] == [f"{page:06d}{i:03d}" for page in (1, 2, 3) for i in range(20)]
+    assert crawler.failed_pages == []
+
+
+def test_get_comments_inside_running_event_loop(fake_server, make_crawler):
+    # Qt/异步宿主和Jupyter中已有运行中的事件循环，同步接口不应抛出RuntimeError
+    crawler = make_crawler(fake_server)
+
+    async def host():
+        return crawler.get_comments('1', 1, 2)
+
+    assert len(asyncio.run(host())) == 40
+
+
+def test_iter_comments_inside_running_event_loop(fake_server, make_crawler):
+    crawler = make_crawler(fake_server)
+
+    async def host():
+        return [page for page, _ in crawler.iter_comments('1', 1, 2)]
+
+    assert asyncio.run(host()) == [1, 2]
+
+
+def test_crawl_to_file_commits_dedup_ids_after_writing(fake_server, make_crawler, tmp_path):
+    from tmall_comment_dedup import DedupIndex
+
+    path = str(tmp_path / 'ids.idx')
+    crawler = make_crawler(fake_server, dedup=DedupIndex(path))
+    assert crawler.crawl_to_file('1', str(tmp_path / 'a.jsonl'), 1, 2) == 40
+    assert len(DedupIndex(path)) == 40
+
+    # 已保存过的评论不再输出，只有第3页是新的
+    crawler = make_crawler(fake_server, dedup=DedupIndex(path))
+    assert crawler.crawl_to_file('1', str(tmp_path / 'b.jsonl'), 1, 3) == 20
+
+
+def test_comment_counter_counts_delivered_comments_after_dedup(fake_server, make_crawler):
+    from tmall_comment_dedup import DedupIndex
+
+    crawler = make_crawler(fake_server, dedup=DedupIndex())
+    crawler.get_comments('1', 1, 2)
+    # 第二遍的评论全部重复，不再计数
+    crawler.get_comments('1', 1, 3)
+    assert crawler.metrics.comments.total() == 60
+    assert crawler.metrics.duplicates.total() == 40
+
+
+def test_comment_counter_excludes_pages_not_delivered_after_cancel(fake_server, make_crawler):
+    crawler = make_crawler(fake_server, concurrency=1)
+    delivered = 0
+    for page, comments in crawler.iter_comments('1', 1, 5):
+        delivered += len(comments)
+        crawler.control.cancel()
+    assert crawler.cancelled and delivered < 100
+    assert crawler.metrics.comments.total() == delivered
@@ -0,0 +1,51 @@
+from tmall_comment_dedup import DedupIndex
+
+
+def test_filter_drops_repeated_ids():
+    index = DedupIndex()
+    assert len(index.filter([{'id': '1'}, {'id': '2'}, {'id': '1'}])) == 2
+    assert index.filter([{'id': '2'}, {'id': '3'}]) == [{'id': '3'}]
+    assert index.duplicates == 2
+
+
+def test_comments_without_id_are_kept():
+    index = DedupIndex()
+    comments = [{'feedback': 'a'}, {'id': '', 'feedback': 'b'}, {'id': None, 'feedback': 'c'}, {'id': '5'}]
+    assert index.filter(comments) == comments
+    assert index.filter([{'feedback': 'd'}, {'id': '5'}]) == [{'feedback': 'd'}]
+    assert len(index) == 1
+    assert index.add('') is True
+
+
+def test_comments_without_id_are_kept_in_bloom_mode():
+    index = DedupIndex(bloom=True, capacity=1000)
+    assert len(index.filter([{'feedback': 'a'}, {'feedback': 'b'}])) == 2
+
+
+def test_pending_ids_are_saved_only_after_commit(tmp_path):
+    path = str(tmp_path / 'ids.idx')
+    index = DedupIndex(path)
+    added = []
+    assert len(index.filter([{'id': '1'}, {'id': '2'}], added)) == 2
+    # 待提交的ID同样参与去重
+    assert index.filter([{'id': '2'}, {'id': '3'}], added) == [{'id': '3'}]
+    index.save()
+    assert len(DedupIndex(path)) == 0
+
+    index.commit(added[:2])
+    index.rollback(added[2:])
+    index.save()
+    reloaded = DedupIndex(path)
+    assert '1' in reloaded and '2' in reloaded and '3' not in reloaded
+    assert index.filter([{'id': '3'}]) == [{'id': '3'}]
+
+
+def test_rollback_in_bloom_mode(tmp_path):
+    path = str(tmp_path / 'ids.bloom')
+    index = DedupIndex(path, bloom=True, capacity=1000)
+    added = []
+    index.filter([{'id': '7'}, {'id': '8'}], added)
+    index.rollback(added)
+    assert '7' not in index
+    index.save()
+    assert len(DedupIndex(path, bloom=True)) == 0
@@ -0,0 +1,73 @@
+import copy
+import os
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from tmall_comment_crawler_cmd import parse_jsonp
+from tmall_comment_bench import flatten_rowwise
+from tmall_comment_export import EXPORT_COLUMNS, comments_to_frame
+from tmall_comment_record import Projection, field_columns, path_getter, to_records
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '响应完整.txt')
+
+
+@pytest.fixture(scope='module')
+def comments():
+    with open(SAMPLE, 'rb') as f:
+        comments = parse_jsonp(f.read())['data']['rateList']
+    # 构造缺失字段、无法压缩的嵌套字段和不同的评论ID
+    comments = copy.deepcopy(comments)
+    comments[0].pop('reply', None)
+    comments[1]['interactInfo'] = {'likeCount': '7'}
+    comments[2].pop('share', None)
+    comments[3]['id'] = ''
+    return comments
+
+
+def rowwise(comments):
+    return flatten_rowwise(comments).astype(str)
+
+
+def test_frame_values():
+    comment = {
+        'id': '42', 'feedback': '好', 'rateType': '0', 'annoy': '1', 'copy': 'false',
+        'skuMap': {'颜色': '红', '尺码': 'L'}, 'interactInfo': {'likeCount': '3', 'alreadyLike': 'true'},
+        'userTagList': [{'tagCode': 'a', 'tagDesc': '老客'}, {'tagCode': 'b', 'tagDesc': '会员', 'tagIconPic': 'p'}],
+    }
+    row = comments_to_frame([comment, {'id': '43'}]).iloc[0]
+    assert (row['评论ID'], row['评论内容'], row['评价类型']) == ('42', '好', '中评')
+    assert (row['是否匿名'], row['是否复制'], row['是否已点赞'], row['可否点赞']) == ('是', '否', '是', '否')
+    assert (row['点赞数'], row['评论数'], row['商家回复']) == ('3', 0, '')
+    assert row['商品规格'] == '颜色: 红, 尺码: L'
+    assert (row['用户标签_1_描述'], row['用户标签_2_代码'], row['用户标签_2_图标']) == ('老客', 'b', 'p')
+    assert row['用户标签_1_图标'] == ''
+    other = comments_to_frame([comment, {'id': '43'}]).iloc[1]
+    assert other['评价类型'] == '差评' and pd.isna(other['用户标签_1_代码'])
+
+
+def test_frame_selected_fields():
+    frame = comments_to_frame([{'id': '1', 'feedback': 'x', 'userTagList': [{'tagCode': 'a'}]}],
+                              ['interactInfo.likeCount', 'feedback'])
+    assert list(frame.columns) == ['评论内容', '点赞数']
+
+
+def test_frame_matches_rowwise_for_dicts(comments):
+    assert comments_to_frame(comments).astype(str).equals(rowwise(comments))
+
+
+def test_frame_matches_rowwise_for_records(comments):
+    records = to_records(comments)
+    assert comments_to_frame(records).astype(str).equals(rowwise(comments))
+
+
+def test_field_columns_match_path_getter(comments):
+    paths = [path for _, path, _ in EXPORT_COLUMNS] + ['userTagList', 'unknownField', 'share.missing']
+    records = to_records(comments)
+    projected = to_records(comments, Projection(['feedback', 'interactInfo.likeCount']))
+    for data in (comments, records, projected, comments[:2] + records[2:]):
+        columns = field_columns(data, paths)
+        for path in paths:
+            get = path_getter(path)
+            assert list(columns[path]) == [get(c) for c in data], path
@@ -0,0 +1,100 @@
+import csv
+
+import pytest
+
+from tmall_comment_export import CsvSink, open_sink
+
+
+def comment(comment_id, tags=0):
+    return {
+        'id': str(comment_id),
+        'feedback': f"评论{comment_id}",
+        'userTagList': [{'tagCode': f"c{i}", 'tagDesc': f"标签{i}", 'tagIconPic': ''} for i in range(tags)],
+    }
+
+
+PAGES = [
+    [comment(1), comment(2, tags=1)],
+    [comment(3, tags=2)],  # 第2页出现新的用户标签列
+    [comment(4, tags=1)],
+]
+
+
+def test_csv_sink_extends_header_for_new_columns(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    with CsvSink(path) as sink:
+        for page in PAGES:
+            sink.write_page(page)
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [r['评论ID'] for r in rows] == ['1', '2', '3', '4']
+    assert rows[2]['用户标签_2_描述'] == '标签1'
+    assert rows[0]['用户标签_2_描述'] == ''
+    assert rows[3]['用户标签_1_代码'] == 'c0'
+    with open(path, 'rb') as f:
+        assert f.read().count(b'\xef\xbb\xbf') == 1
+
+
+def test_parquet_sink_merges_segments_with_new_columns(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'out.parquet')
+    with open_sink(path) as sink:
+        for page in PAGES:
+            sink.write_page(page)
+    table = pq.read_table(path)
+    assert table.num_rows == 4
+    assert table.column('评论ID').to_pylist() == ['1', '2', '3', '4']
+    assert table.column('用户标签_2_描述').to_pylist() == [None, None, '标签1', None]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['out.parquet']
+
+
+def test_jsonl_rows_match_frame(tmp_path):
+    import json
+
+    from tmall_comment_export import comments_to_frame
+
+    path = str(tmp_path / 'out.jsonl')
+    with open_sink(path) as sink:
+        for page in PAGES:
+            sink.write_page(page)
+    with open(path, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    frame = comments_to_frame([c for page in PAGES for c in page])
+    assert len(rows) == 4
+    # 只有该评论有的用户标签列才写出
+    assert '用户标签_1_代码' not in rows[0]
+    assert rows[2]['用户标签_2_描述'] == '标签1'
+    for row, (_, expected) in zip(rows, frame.iterrows()):
+        assert row == {name: value for name, value in expected.items() if not pd_isna(value)}
+
+
+def test_sinks_filter_empty_feedback_and_select_fields(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    page = [comment(1), dict(comment(2), feedback="此用户没有填写评价。")]
+    with open_sink(path, filter_empty_comments=True, fields=['id', 'feedback']) as sink:
+        sink.write_page(page)
+    assert (sink.rows_written, sink.filtered_count) == (1, 1)
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        assert list(csv.reader(f)) == [['评论内容', '评论ID'], ['评论1', '1']]
+
+
+def pd_isna(value):
+    import pandas as pd
+    return pd.isna(value)
+
+
+def test_xlsx_sink_header_covers_later_columns(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    path = str(tmp_path / 'out.xlsx')
+    with open_sink(path) as sink:
+        for page in PAGES + [[dict(comment(5), feedback="含\x01控制字符")]]:
+            sink.write_page(page)
+    rows = list(openpyxl.load_workbook(path).active.values)
+    header = list(rows[0])
+    assert header[-6:] == ['用户标签_1_代码', '用户标签_1_描述', '用户标签_1_图标',
+                           '用户标签_2_代码', '用户标签_2_描述', '用户标签_2_图标']
+    column = {name: [row[i] for row in rows[1:]] for i, name in enumerate(header)}
+    assert column['评论ID'] == ['1', '2', '3', '4', '5']
+    assert column['用户标签_2_描述'] == [None, None, '标签1', None, None]
+    assert column['评论内容'][-1] == "含 控制字符"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['out.xlsx']
@@ -0,0 +1,146 @@
+import logging
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+pytest.importorskip('PyQt5.QtWidgets')
+
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+import tmall_comment_crawler_gui as gui  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def app():
+    # 窗口会把根日志器的级别设为INFO，测试结束后恢复
+    level = logging.getLogger().level
+    yield QApplication.instance() or QApplication([])
+    logging.getLogger().setLevel(level)
+
+
+@pytest.fixture
+def window(app):
+    window = gui.TmallCommentCrawlerGUI()
+    window.log_timer.stop()  # 由测试手动刷新日志
+    window.flush_logs()
+    window.log_text.clear()
+    yield window
+    window.close()
+
+
+def test_log_handler_buffers_records_from_logging():
+    handler = gui.BufferedLogHandler(max_lines=3)
+    logger = logging.getLogger('test_gui.buffer')
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        for i in range(5):
+            logger.warning("第 %d 条", i)
+    finally:
+        logger.removeHandler(handler)
+    lines = handler.drain()
+    # 来不及刷新时丢弃最早的记录
+    assert [line.split('] ', 1)[1] for line in lines] == ["第 2 条", "第 3 条", "第 4 条"]
+    assert handler.drain() == []
+
+
+def test_logs_reach_the_pane_only_on_flush(window):
+    window.log("界面消息")
+    logging.getLogger('tmall_comment_crawler_cmd').info("爬虫消息")
+    assert window.log_text.toPlainText() == ''
+
+    window.flush_logs()
+    lines = window.log_text.toPlainText().splitlines()
+    assert [line.split('] ', 1)[1] for line in lines] == ["界面消息", "爬虫消息"]
+    assert window.log_text.blockCount() == 2
+
+
+def test_log_pane_is_capped(window):
+    window.log_text.setMaximumBlockCount(50)
+    for i in range(120):
+        window.log(f"消息 {i}")
+    window.flush_logs()
+    lines = window.log_text.toPlainText().splitlines()
+    assert len(lines) == 50
+    assert lines[-1].endswith("消息 119")
+
+
+def test_closing_window_removes_log_handler(app):
+    window = gui.TmallCommentCrawlerGUI()
+    assert window.log_handler in logging.getLogger().handlers
+    window.close()
+    assert window.log_handler not in logging.getLogger().handlers
+
+
+FIELDS = [('userNick', '用户昵称'), ('feedback', '评论内容'), ('interactInfo.likeCount', '点赞数')]
+
+
+def make_comments():
+    return [
+        {'userNick': 'a', 'feedback': '质量很好', 'interactInfo': {'likeCount': '9'}},
+        {'userNick': 'b', 'feedback': 'Good', 'interactInfo': {'likeCount': '10'}},
+        {'userNick': 'c', 'feedback': '一般', 'interactInfo': {'likeCount': ''}},
+        {'userNick': 'GOOD', 'feedback': '还行', 'interactInfo': {'likeCount': '1'}},
+    ]
+
+
+@pytest.fixture
+def models(app):
+    model = gui.CommentTableModel(FIELDS)
+    proxy = gui.CommentFilterProxyModel()
+    proxy.setSourceModel(model)
+    model.set_comments(make_comments())
+    return model, proxy
+
+
+def column(model, col):
+    return [model.data(model.index(row, col)) for row in range(model.rowCount())]
+
+
+def test_table_model_shows_fields_by_path(models):
+    model, _ = models
+    assert (model.rowCount(), model.columnCount()) == (4, 3)
+    assert [model.headerData(c, gui.Qt.Horizontal) for c in range(3)] == ['用户昵称', '评论内容', '点赞数']
+    assert column(model, 2) == ['9', '10', '', '1']
+
+
+def test_count_columns_sort_as_integers(models):
+    model, _ = models
+    model.sort(2)
+    assert column(model, 2) == ['', '1', '9', '10']
+    model.sort(2, gui.Qt.DescendingOrder)
+    assert column(model, 2) == ['10', '9', '1', '']
+    model.sort(0)
+    assert column(model, 0) == ['GOOD', 'a', 'b', 'c']
+
+
+def test_proxy_filters_one_column_or_all_columns(models):
+    model, proxy = models
+    proxy.set_filter('good', 1)
+    assert column(proxy, 0) == ['b']
+    proxy.set_filter('GOOD')
+    assert column(proxy, 0) == ['b', 'GOOD']
+    proxy.set_filter('  ')
+    assert proxy.rowCount() == 4
+
+
+def test_proxy_keeps_filter_when_sorting_and_appending(models):
+    model, proxy = models
+    proxy.set_filter('good')
+    proxy.sort(2, gui.Qt.DescendingOrder)
+    assert column(proxy, 0) == ['b', 'GOOD']
+    model.append_comments([{'userNick': 'd', 'feedback': 'very good', 'interactInfo': {'likeCount': '3'}},
+                           {'userNick': 'e', 'feedback': '差', 'interactInfo': {'likeCount': '5'}}])
+    assert model.rowCount() == 6
+    assert sorted(column(proxy, 0)) == ['GOOD', 'b', 'd']
+
+
+def test_results_tab_counts_filtered_rows(window):
+    window.show_results(make_comments())
+    assert window.results_count_label.text() == "共 4 条"
+    column_index = window.filter_column_combo.findData(-1)
+    window.filter_column_combo.setCurrentIndex(column_index)
+    window.filter_input.setText('good')
+    window.apply_results_filter()
+    assert window.results_count_label.text() == "显示 2 / 4 条"
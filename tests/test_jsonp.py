@@ -0,0 +1,40 @@
+import json
+import os
+
+import pytest
+
+import tmall_comment_crawler_cmd
+from tmall_comment_crawler_cmd import parse_jsonp
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '响应完整.txt')
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def backend(request, monkeypatch):
+    if request.param == 'json':
+        monkeypatch.setattr(tmall_comment_crawler_cmd, 'orjson', None)
+    elif tmall_comment_crawler_cmd.orjson is None:
+        pytest.skip("未安装orjson")
+    return request.param
+
+
+def test_parses_callback_envelope(backend):
+    body = b'  mtopjsonppcdetail12({"ret":["SUCCESS::ok"],"data":{"rateList":[{"id":"1","feedback":"(\xe5\xa5\xbd)"}]}})'
+    result = parse_jsonp(body)
+    assert result['ret'] == ['SUCCESS::ok']
+    assert result['data']['rateList'][0]['feedback'] == '(好)'
+    assert parse_jsonp(body.decode('utf-8')) == result
+
+
+def test_parses_sample_response(backend):
+    with open(SAMPLE, 'rb') as f:
+        body = f.read()
+    text = body.decode('utf-8')
+    expected = json.loads(text[text.index('(') + 1:text.rindex(')')])
+    assert parse_jsonp(body) == expected
+
+
+@pytest.mark.parametrize('body', [b'', b'{"ret": []}', b'mtopjsonppcdetail1', b'mtopjsonppcdetail1)('])
+def test_rejects_non_jsonp(backend, body):
+    with pytest.raises(ValueError):
+        parse_jsonp(body)
@@ -0,0 +1,79 @@
+import urllib.request
+
+import pytest
+
+from tmall_comment_metrics import CrawlMetrics, MetricsRegistry
+
+
+def test_counter_labels_and_totals():
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', "请求数")
+    requests.inc(ret='SUCCESS')
+    requests.inc(2, ret='FAIL_SYS_TRAFFIC_LIMIT')
+    requests.inc(ret='SUCCESS')
+    assert requests.value(ret='SUCCESS') == 2
+    assert requests.total() == 4
+    assert requests.by_label('ret') == {'SUCCESS': 2, 'FAIL_SYS_TRAFFIC_LIMIT': 2}
+    assert registry.counter('requests_total') is requests
+    with pytest.raises(ValueError):
+        registry.gauge('requests_total')
+
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram('latency', buckets=(0.1, 0.2, 0.4))
+    for value in (0.05, 0.05, 0.15, 0.3):
+        latency.observe(value, account='a')
+    latency.observe(10, account='b')
+    assert latency.count() == 5
+    assert latency.count({'account': 'a'}) == 4
+    assert latency.mean({'account': 'a'}) == pytest.approx(0.1375)
+    assert latency.quantile(0.5, {'account': 'a'}) == pytest.approx(0.1)
+    assert latency.quantile(0.75, {'account': 'a'}) == pytest.approx(0.2)
+    # 落在+Inf桶时返回最大的有限上界
+    assert latency.quantile(1.0) == 0.4
+
+
+def test_prometheus_exposition():
+    registry = MetricsRegistry()
+    registry.counter('pages_total', "页面数").inc(3, status='ok')
+    registry.gauge('request_rate', "速率").set(1.5)
+    registry.histogram('seconds', "耗时", buckets=(1, 2)).observe(1.5)
+    text = registry.to_prometheus()
+    assert '# TYPE tmall_pages_total counter' in text
+    assert 'tmall_pages_total{status="ok"} 3' in text
+    assert 'tmall_request_rate 1.5' in text
+    assert 'tmall_seconds_bucket{le="1"} 0' in text
+    assert 'tmall_seconds_bucket{le="2"} 1' in text
+    assert 'tmall_seconds_bucket{le="+Inf"} 1' in text
+    assert 'tmall_seconds_count 1' in text
+
+
+def test_write_and_serve_prometheus(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter('pages_total').inc()
+    path = tmp_path / 'tmall.prom'
+    registry.write_prometheus(str(path))
+    assert path.read_text(encoding='utf-8') == registry.to_prometheus()
+    assert not (tmp_path / 'tmall.prom.tmp').exists()
+
+    port = registry.serve(port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert response.read().decode('utf-8') == registry.to_prometheus()
+    finally:
+        registry.close()
+
+
+def test_crawl_metrics_shared_registry_and_summary(fake_server, make_crawler):
+    registry = MetricsRegistry()
+    for item_id in ('1', '2'):
+        make_crawler(fake_server, metrics=registry).get_comments(item_id, 1, 2)
+    metrics = CrawlMetrics(registry)
+    assert metrics.pages.value(status='ok') == 4
+    assert metrics.requests.value(ret='SUCCESS') == 4
+    assert metrics.comments.total() == 80
+    assert metrics.request_seconds.count() == 4
+    lines = metrics.summary_lines()
+    assert lines[0].startswith("请求 4 次")
+    assert any("评论 80 条" in line for line in lines)
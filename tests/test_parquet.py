@@ -0,0 +1,71 @@
+import copy
+import os
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from tmall_comment_crawler_cmd import TmallCommentCrawler, parse_jsonp
+from tmall_comment_export import (comments_to_frame, export_column_kind, frame_columns, parquet_column_kind,
+                                  write_parquet)
+from tmall_comment_record import to_records
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '响应完整.txt')
+
+
+@pytest.fixture(scope='module')
+def comments():
+    with open(SAMPLE, 'rb') as f:
+        comments = copy.deepcopy(parse_jsonp(f.read())['data']['rateList'])
+    comments[0]['interactInfo']['likeCount'] = ''  # 空计数存为null
+    return to_records(comments)
+
+
+def test_column_kinds():
+    assert parquet_column_kind('interactInfo.likeCount') == 'int'
+    assert parquet_column_kind('auctionTitle') == 'dictionary'
+    assert parquet_column_kind('feedback') == 'string'
+    assert export_column_kind('用户标签_3_描述') == 'dictionary'
+    assert export_column_kind('评论内容') == 'string'
+
+
+def test_save_to_parquet_types_and_values(comments, tmp_path):
+    path = str(tmp_path / 'out.parquet')
+    TmallCommentCrawler().save_to_parquet(comments, path)
+    table = pq.read_table(path)
+    schema = table.schema
+
+    assert schema.field('点赞数').type == pa.int64()
+    assert schema.field('阅读数').type == pa.int64()
+    assert pa.types.is_dictionary(schema.field('商品标题').type)
+    assert pa.types.is_dictionary(schema.field('评价类型').type)
+    assert schema.field('评论内容').type == pa.string()
+
+    frame = comments_to_frame(comments)
+    assert table.column('评论内容').to_pylist() == frame['评论内容'].tolist()
+    assert table.column('评论ID').to_pylist() == frame['评论ID'].tolist()
+    assert table.column('商品标题').to_pylist() == frame['商品标题'].tolist()
+    likes = table.column('点赞数').to_pylist()
+    assert likes[0] is None
+    assert likes[1:] == [int(v) for v in frame['点赞数'].tolist()[1:]]
+
+
+def test_dictionary_columns_read_back_as_category(comments, tmp_path):
+    path = str(tmp_path / 'out.parquet')
+    TmallCommentCrawler().save_to_parquet(comments, path)
+    df = pq.read_table(path).to_pandas()
+    assert str(df['商品标题'].dtype) == 'category'
+    assert df['商品标题'].nunique() == 1
+
+
+def test_write_parquet_one_row_group_per_chunk(comments, tmp_path):
+    frame = comments_to_frame(comments)
+    names = list(frame.columns)
+    kinds = [export_column_kind(name) for name in names]
+    chunks = [frame_columns(frame.iloc[:8], names), frame_columns(frame.iloc[8:], names)]
+    path = str(tmp_path / 'chunks.parquet')
+    assert write_parquet(path, names, kinds, chunks) == len(comments)
+    parquet_file = pq.ParquetFile(path)
+    assert parquet_file.num_row_groups == 2
+    assert parquet_file.read().column('评论ID').to_pylist() == frame['评论ID'].tolist()
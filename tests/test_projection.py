@@ -0,0 +1,79 @@
+import pytest
+
+pytest.importorskip('pandas')
+
+from tmall_comment_export import comments_to_frame, parse_field_list
+from tmall_comment_record import CommentRecord, Projection
+from tmall_comment_store import ResponseCache
+
+FIELDS = ['feedback', 'interactInfo.likeCount', 'userNick']
+
+
+def test_projection_keeps_required_keys_and_used_children():
+    projection = Projection(FIELDS + ['feedback'])
+    assert projection.fields == tuple(FIELDS)
+    assert projection.keys == {'id', 'feedback', 'auctionNumId', 'auctionTitle', 'interactInfo', 'userNick'}
+    assert 'interactInfo.likeCount' in projection
+    assert 'interactInfo.readCount' not in projection
+    assert 'auctionTitle' in projection
+    assert 'reply' not in projection
+    with pytest.raises(ValueError):
+        Projection([])
+
+
+def test_apply_drops_unused_fields_and_children():
+    comment = {'id': '1', 'feedback': '好', 'userNick': 'a', 'headPicUrl': 'https://x', 'userTagList': [1, 2],
+               'interactInfo': {'likeCount': '3', 'readCount': '9'}}
+    assert Projection(FIELDS).apply(comment) == {'id': '1', 'feedback': '好', 'userNick': 'a',
+                                                 'interactInfo': {'likeCount': '3'}}
+    # 选了整个父字段时保留全部子键
+    assert Projection(['interactInfo', 'interactInfo.likeCount']).apply(comment)['interactInfo'] == \
+        comment['interactInfo']
+
+
+def test_parse_field_list_rejects_unknown_fields():
+    assert parse_field_list(' feedback, interactInfo.likeCount ,') == ['feedback', 'interactInfo.likeCount']
+    with pytest.raises(ValueError, match='未知字段'):
+        parse_field_list('feedback,nope')
+    with pytest.raises(ValueError):
+        parse_field_list(' , ')
+
+
+@pytest.mark.parametrize('compact', [True, False])
+def test_crawler_keeps_only_projected_fields(fake_server, make_crawler, compact):
+    crawler = make_crawler(fake_server, projection=FIELDS, compact=compact)
+    assert isinstance(crawler.projection, Projection)
+    comments = crawler.get_comments('1', 1, 2)
+    assert len(comments) == 40
+    assert isinstance(comments[0], CommentRecord) == compact
+    for comment in comments:
+        assert set(comment) <= crawler.projection.keys
+        assert comment['interactInfo']['likeCount'] != ''
+    if not compact:
+        # 原始字典连嵌套字段里没用到的子键也丢弃
+        assert comments[0]['interactInfo'].keys() == {'likeCount'}
+    assert comments_to_frame(comments, fields=crawler.projection.fields).columns.tolist() == \
+        ['用户昵称', '评论内容', '点赞数']
+
+
+def test_cache_hits_are_projected(fake_server, make_crawler, tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'))
+    full = make_crawler(fake_server, cache=cache).get_comments('1', 1, 1)
+    assert 'headPicUrl' in full[0]
+
+    fake_server.reset_stats()
+    comments = make_crawler(fake_server, cache=cache, projection=FIELDS).get_comments('1', 1, 1)
+    assert fake_server.stats()['requests'] == 0
+    assert 'headPicUrl' not in comments[0]
+    assert comments[0]['feedback'] == full[0]['feedback']
+    cache.close()
+
+
+def test_saved_file_has_only_projected_columns(fake_server, make_crawler, tmp_path):
+    pd = pytest.importorskip('pandas')
+    pytest.importorskip('openpyxl')
+    crawler = make_crawler(fake_server, projection=FIELDS)
+    path = str(tmp_path / 'out.xlsx')
+    crawler.save_to_excel(crawler.get_comments('1', 1, 1), path)
+    # 列按导出字段的固定顺序排列
+    assert pd.read_excel(path).columns.tolist() == ['用户昵称', '评论内容', '点赞数']
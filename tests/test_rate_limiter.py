@@ -0,0 +1,71 @@
+import pytest
+
+from tmall_comment_crawler_cmd import AdaptiveRateLimiter, RateLimiter, make_rate_limiter
+from tmall_fake_mtop import FakeMtopServer
+
+
+def test_success_increases_rate_additively_up_to_ceiling():
+    limiter = AdaptiveRateLimiter(1.0, min_rate=0.5, max_rate=1.2, increase=0.1)
+    limiter.on_success(0.05)
+    assert limiter.rate == pytest.approx(1.1)
+    for _ in range(5):
+        limiter.on_success(0.05)
+    assert limiter.rate == pytest.approx(1.2)
+
+
+def test_slow_response_pauses_increase():
+    limiter = AdaptiveRateLimiter(1.0, min_rate=0.5, max_rate=5.0, increase=0.1, latency_factor=3.0)
+    limiter.on_success(0.1)
+    rate = limiter.rate
+    limiter.on_success(0.5)  # 超过基线的3倍，视为拥塞
+    assert limiter.rate == rate
+    assert limiter.latency_baseline == pytest.approx(0.1)
+
+
+def test_throttle_and_error_decrease_multiplicatively_down_to_floor():
+    limiter = AdaptiveRateLimiter(2.0, min_rate=0.5, max_rate=4.0, decrease=0.5, error_decrease=0.8, cooldown=0)
+    limiter.on_throttle()
+    assert limiter.rate == pytest.approx(1.0)
+    limiter.on_error()
+    assert limiter.rate == pytest.approx(0.8)
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.rate == pytest.approx(0.5)
+
+
+def test_concurrent_failures_within_cooldown_count_once():
+    limiter = AdaptiveRateLimiter(2.0, min_rate=0.1, max_rate=4.0, decrease=0.5, cooldown=60)
+    for _ in range(3):
+        limiter.on_throttle()
+    assert limiter.rate == pytest.approx(1.0)
+
+
+def test_initial_rate_is_clamped():
+    assert AdaptiveRateLimiter(10.0, min_rate=0.2, max_rate=2.0).rate == 2.0
+    assert AdaptiveRateLimiter(0.01, min_rate=0.2, max_rate=2.0).rate == 0.2
+
+
+def test_make_rate_limiter_bounds():
+    fixed = make_rate_limiter(1.5, adaptive=False)
+    assert type(fixed) is RateLimiter and fixed.rate == 1.5
+    fixed.on_throttle()
+    assert fixed.rate == 1.5
+
+    adaptive = make_rate_limiter(1.5)
+    assert isinstance(adaptive, AdaptiveRateLimiter)
+    assert (adaptive.min_rate, adaptive.max_rate) == (0.2, 4.5)
+    assert make_rate_limiter(0.1).min_rate == 0.1
+    custom = make_rate_limiter(1.0, min_rate=0.5, max_rate=1.5)
+    assert (custom.min_rate, custom.max_rate) == (0.5, 1.5)
+
+
+def test_crawler_backs_off_when_throttled_and_reports_rate(make_crawler):
+    with FakeMtopServer(total_pages=10, throttle_rate=0.3, seed=2) as server:
+        crawler = make_crawler(server, adaptive=True, rate_limit=50, max_rate=50)
+        crawler.rate_limiter.cooldown = 0
+        rates = []
+        comments = crawler.get_comments('1', 1, 10, rate_callback=rates.append)
+    assert len(comments) == 200
+    assert len(rates) == 10
+    assert crawler.rate_limiter.rate < 50
+    assert rates[-1] == crawler.current_rate()
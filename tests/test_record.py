@@ -0,0 +1,77 @@
+import copy
+import json
+import os
+import pickle
+
+import pytest
+
+from tmall_comment_crawler_cmd import parse_jsonp
+from tmall_comment_record import CommentRecord, Projection, ValuePool, to_records
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '响应完整.txt')
+
+
+@pytest.fixture(scope='module')
+def comments():
+    with open(SAMPLE, 'rb') as f:
+        return parse_jsonp(f.read())['data']['rateList']
+
+
+def test_record_has_no_instance_dict(comments):
+    record = CommentRecord.from_dict(comments[0])
+    assert not hasattr(record, '__dict__')
+    with pytest.raises(AttributeError):
+        record.unknown_field = 1
+
+
+def test_record_round_trips_to_the_original_dict(comments):
+    original = copy.deepcopy(comments)
+    original[1]['interactInfo'] = {'likeCount': '7'}  # 键不完整，原样保存
+    original[2]['newField'] = {'a': 1}  # 未知字段
+    records = to_records(original)
+    assert [r.to_dict() for r in records] == original
+    assert [dict(r) for r in records] == original
+    assert pickle.loads(pickle.dumps(records[0])).to_dict() == original[0]
+
+
+def test_id_inside_nested_urls_is_restored(comments):
+    record = CommentRecord.from_dict(comments[0])
+    assert record['share'] == comments[0]['share']
+    assert record.get_path('extraInfoMap.report_url') == comments[0]['extraInfoMap']['report_url']
+
+
+def test_low_cardinality_values_are_interned_per_pool(comments):
+    def fresh(comment):
+        # json往返得到内容相同、对象不同的字符串
+        return json.loads(json.dumps(comment))
+
+    pool = ValuePool()
+    first, second = to_records([fresh(comments[0]), fresh(comments[0])], pool=pool)
+    assert first.auctionTitle is second.auctionTitle
+    assert first.interactInfo is second.interactInfo
+    assert len(pool) > 0
+
+    # 不同的共享表之间不共享
+    other = to_records([fresh(comments[0])])[0]
+    assert other.auctionTitle == first.auctionTitle and other.auctionTitle is not first.auctionTitle
+
+
+def test_pool_capacity_stops_interning(comments):
+    pool = ValuePool(capacity=1)
+    to_records(comments, pool=pool)
+    assert len(pool) == 1
+    value = 'x' * 3
+    assert pool.share(value) is value
+
+
+def test_projection_drops_unused_fields(comments):
+    record = to_records(comments[:1], Projection(['interactInfo.likeCount']))[0]
+    assert set(record) == {'id', 'feedback', 'auctionNumId', 'auctionTitle', 'interactInfo'}
+
+
+def test_crawler_clears_its_pool_after_each_crawl(fake_server, make_crawler):
+    crawler = make_crawler(fake_server)
+    sizes = []
+    crawler.get_comments('1', 1, 2, progress_callback=lambda p: sizes.append(len(crawler.shared_values)))
+    assert max(sizes) > 0
+    assert len(crawler.shared_values) == 0
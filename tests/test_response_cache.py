@@ -0,0 +1,39 @@
+import time
+
+from tmall_comment_store import ResponseCache
+
+
+def test_running_total_matches_table(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'), max_bytes=1000)
+    for i in range(50):
+        cache.put(f"k{i}", b'x' * 100)
+    cache.put('k49', b'y' * 50)
+    assert cache.stats()['bytes'] == cache._total <= 1000
+    assert cache.get('k49') == b'y' * 50
+    assert cache.get('k0') is None
+    cache.close()
+    # 重新打开时从库中加载总大小
+    reopened = ResponseCache(str(tmp_path / 'cache.db'), max_bytes=1000)
+    assert reopened._total == reopened.stats()['bytes']
+    reopened.close()
+
+
+def test_lru_keeps_recently_read_entries(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'), max_bytes=300)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, b'x' * 100)
+        time.sleep(0.01)
+    assert cache.get('a') is not None
+    cache.put('d', b'x' * 100)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    cache.close()
+
+
+def test_expired_entries_are_not_counted(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'), ttl=0.05, max_bytes=1000)
+    cache.put('a', b'x' * 100)
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert cache._total == 0
+    cache.close()
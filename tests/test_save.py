@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from tmall_comment_crawler_cmd import TmallCommentCrawler
+from tmall_comment_record import to_records
+
+openpyxl = pytest.importorskip('openpyxl')
+
+
+def comments(n):
+    return [{'id': str(i), 'feedback': "此用户没有填写评价。" if i % 3 == 0 else f"评论{i}",
+             'auctionNumId': '9', 'auctionTitle': '商品'} for i in range(n)]
+
+
+@pytest.fixture
+def crawler():
+    return TmallCommentCrawler()
+
+
+def test_save_to_excel_writes_in_chunks(tmp_path, crawler, monkeypatch):
+    from tmall_comment_export import XlsxSink
+    pages = []
+    original = XlsxSink.write_page
+    monkeypatch.setattr(XlsxSink, 'write_page', lambda self, page: (pages.append(len(page)), original(self, page)))
+    path = str(tmp_path / 'out.xlsx')
+    crawler._save(to_records(comments(12)), path, True, XlsxSink, chunk_size=5)
+    assert pages == [5, 5, 2]
+    rows = list(openpyxl.load_workbook(path).active.values)
+    assert len(rows) == 1 + 8
+    assert rows[1][rows[0].index('评论ID')] == '1'
+
+
+def test_save_to_file_picks_format_by_extension(tmp_path, crawler):
+    for ext in ('.xlsx', '.csv', '.jsonl', '.parquet', '.xls'):
+        path = str(tmp_path / f"out{ext}")
+        assert crawler.save_to_file(comments(4), path) == path
+        assert os.path.getsize(path) > 0
+
+
+def test_all_filtered_leaves_no_file(tmp_path, crawler):
+    path = str(tmp_path / 'out.xlsx')
+    crawler.save_to_excel(comments(1), path, filter_empty_comments=True)
+    assert not os.listdir(tmp_path)
@@ -0,0 +1,47 @@
+from tmall_comment_crawler_cmd import extract_token, is_token_expired, parse_set_cookie_tokens, set_cookie_value
+from tmall_fake_mtop import FakeMtopServer
+
+
+def test_set_cookie_value_replaces_or_appends():
+    cookie = "a=1; _m_h5_tk=old_1; b=2"
+    assert set_cookie_value(cookie, '_m_h5_tk', 'new_2') == "a=1; _m_h5_tk=new_2; b=2"
+    assert set_cookie_value(cookie, '_m_h5_tk_enc', 'x') == cookie + "; _m_h5_tk_enc=x"
+    assert set_cookie_value("", 'a', '1') == "a=1"
+
+
+def test_parse_set_cookie_tokens():
+    header = "_m_h5_tk=abc_123;Path=/;Domain=.tmall.com, _m_h5_tk_enc=def;Path=/"
+    assert parse_set_cookie_tokens(header) == {'_m_h5_tk': 'abc_123', '_m_h5_tk_enc': 'def'}
+    assert parse_set_cookie_tokens(None) == {}
+
+
+def test_token_expired_ret_codes():
+    assert is_token_expired('FAIL_SYS_TOKEN_EXOIRED::令牌过期')
+    assert is_token_expired('FAIL_SYS_TOKEN_EMPTY::令牌为空')
+    assert not is_token_expired('FAIL_SYS_TRAFFIC_LIMIT::被挤爆啦')
+
+
+def test_stale_token_is_refreshed_and_page_retried(fake_server, make_crawler):
+    crawler = make_crawler(fake_server)
+    crawler.set_cookie(set_cookie_value(fake_server.cookie(), '_m_h5_tk', 'stale_1'))
+    assert crawler.token == 'stale'
+
+    comments = crawler.get_comments('1', 1, 3)
+    assert len(comments) == 60
+    assert crawler.token == fake_server.tokens[0]
+    assert extract_token(crawler.headers['Cookie']) == fake_server.tokens[0]
+    assert crawler.token_refreshes == 1
+    assert crawler.metrics.retries.by_label('reason') == {'token_expired': 1}
+
+
+def test_crawl_survives_token_rotation(make_crawler):
+    with FakeMtopServer(total_pages=10, token_expire_rate=0.3, seed=3) as server:
+        crawler = make_crawler(server, concurrency=3)
+        first_token = crawler.token
+        comments = crawler.get_comments('1', 1, 10)
+        stats = server.stats()
+    assert len(comments) == 200
+    assert crawler.failed_pages == []
+    assert crawler.token_refreshes > 0
+    assert crawler.token != first_token
+    assert stats['pages_unrecovered'] == 0
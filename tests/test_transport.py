@@ -0,0 +1,87 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from tmall_comment_crawler_cmd import HttpTransport
+from tmall_comment_metrics import CrawlMetrics
+
+
+class ScriptedServer:
+    """按顺序返回预设状态码的HTTP服务，用完后一直返回200"""
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.requests += 1
+                status = server.statuses.pop(0) if server.statuses else 200
+                body = b'ok'
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}/"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def transport():
+    transport = HttpTransport(max_retries=3, backoff_factor=0.01, max_backoff=0.05)
+    yield transport
+    transport.close()
+
+
+def test_retries_5xx_then_succeeds(transport):
+    server = ScriptedServer([503, 502])
+    metrics = CrawlMetrics()
+    try:
+        response = transport.get(server.url, metrics=metrics)
+    finally:
+        server.close()
+    assert response.status_code == 200
+    assert server.requests == 3
+    assert metrics.retries.value(reason='network') == 2
+
+
+def test_does_not_retry_client_errors(transport):
+    server = ScriptedServer([404])
+    try:
+        with pytest.raises(requests.HTTPError):
+            transport.get(server.url)
+    finally:
+        server.close()
+    assert server.requests == 1
+
+
+def test_raises_after_retries_are_exhausted(transport):
+    server = ScriptedServer([500] * 10)
+    try:
+        with pytest.raises(requests.HTTPError):
+            transport.get(server.url)
+    finally:
+        server.close()
+    assert server.requests == transport.max_retries + 1
+
+
+def test_backoff_is_exponential_and_capped():
+    transport = HttpTransport(backoff_factor=1.0, max_backoff=5)
+    for attempt in range(6):
+        delay = transport.backoff(attempt)
+        expected = min(5, 2 ** attempt)
+        assert expected * 0.5 <= delay <= expected
+    transport.close()
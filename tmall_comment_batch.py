@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tmall_comment_coverage import CoverageCrawler
+from tmall_comment_crawler_cmd import (EXIT_OK, EXIT_USAGE, TmallCommentCrawler, HttpTransport, build_parser,
+                                       make_rate_limiter)
+from tmall_comment_crawler_cmd import main as cmd_main
+from tmall_comment_export import open_sink
+from tmall_comment_metrics import CrawlMetrics, MetricsRegistry
+
+
+class BatchJob:
+    """
+    单个商品的爬取任务
+    :param item_id: 商品ID
+    :param start_page: 起始页码
+    :param end_page: 结束页码，为"auto"时按商品实际总页数自动分页
+    :param order_type: 排序方式，为空表示默认排序，"feedbackdate"表示按时间排序
+    :param auto_pages: 自动分页模式，end_page作为页数上限
+    """
+    def __init__(self, item_id, start_page=1, end_page=5, order_type="", auto_pages=False):
+        self.item_id = str(item_id).strip()
+        self.start_page = int(start_page)
+        if str(end_page).lower() == 'auto':
+            end_page, auto_pages = None, True
+        self.end_page = int(end_page) if end_page else None
+        self.order_type = order_type or ""
+        self.auto_pages = auto_pages or self.end_page is None
+
+    def __repr__(self):
+        end_page = self.end_page or 'auto'
+        return f"BatchJob({self.item_id}, {self.start_page}-{end_page}, order_type={self.order_type!r})"
+
+
+class BatchResult:
+    """
+    单个商品的爬取结果
+    边爬边写盘时comments为空，评论已写入output，count为获取的评论数
+    """
+    def __init__(self, job, comments=None, failed_pages=None, error="", elapsed=0.0, pages=0, coverage=None,
+                 count=None, output=None, dedup_keys=None):
+        self.job = job
+        self.comments = comments or []
+        self.failed_pages = failed_pages or []
+        self.error = error
+        self.elapsed = elapsed
+        self.pages = pages  # 实际请求的页数
+        self.coverage = coverage  # 分片覆盖爬取的覆盖报告（tmall_comment_coverage），普通任务为None
+        self.count = len(self.comments) if count is None else count  # 获取的评论数
+        self.output = output  # 边爬边写盘时的输出（CommentSink），否则为None
+        # 不写盘时新加入去重索引、尚未提交的评论ID，保存comments后调用DedupIndex.commit提交
+        self.dedup_keys = dedup_keys or []
+
+    @property
+    def ok(self):
+        return not self.error and not self.failed_pages
+
+
+def parse_job_line(line, default_start=1, default_end=5, default_order=""):
+    """
+    解析一行任务描述，格式为 "商品ID [起始页 结束页 [排序方式]]"，字段之间用空格或逗号分隔，
+    结束页写作auto表示自动分页
+    :return: BatchJob，空行和#开头的注释行返回None
+    """
+    line = line.split('#', 1)[0].strip()
+    if not line:
+        return None
+    parts = line.replace(',', ' ').split()
+    start_page = parts[1] if len(parts) > 1 else default_start
+    end_page = parts[2] if len(parts) > 2 else default_end
+    order_type = parts[3] if len(parts) > 3 else default_order
+    return BatchJob(parts[0], start_page, end_page, order_type)
+
+
+def load_jobs(path, default_start=1, default_end=5, default_order=""):
+    """
+    从任务文件加载爬取任务
+    .json文件为任务对象数组，.jsonl文件每行一个任务对象，
+    对象字段为 item_id / start_page / end_page / order_type / auto_pages；
+    其他文件按行解析，见parse_job_line
+    :return: BatchJob列表
+    """
+    jobs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            records = json.load(f)
+        elif path.endswith('.jsonl'):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            for line in f:
+                job = parse_job_line(line, default_start, default_end, default_order)
+                if job:
+                    jobs.append(job)
+            return jobs
+
+    for record in records:
+        jobs.append(BatchJob(
+            record['item_id'],
+            record.get('start_page', default_start),
+            record.get('end_page', default_end),
+            record.get('order_type', default_order),
+            record.get('auto_pages', False),
+        ))
+    return jobs
+
+
+class JobOutputs:
+    """
+    批量任务的增量输出：每个商品一个文件，每页到达即写盘（见BatchCrawler.run的open_output和on_page）
+    未指定输出路径时先写入临时文件名，商品完成后按 商品ID_商品标题_评论数量_日期 重命名
+    :param output: 输出文件路径，可包含{item_id}，为None时在output_dir中自动命名
+    :param output_dir: 自动命名时的输出目录
+    :param ext: 自动命名时的扩展名（.xlsx / .csv / .jsonl / .parquet）
+    :param filter_empty_comments: 是否过滤空评价
+    :param fields: 只输出这些字段路径对应的列，为None时输出全部列
+    """
+    def __init__(self, output=None, output_dir='.', ext='.xlsx', filter_empty_comments=False, fields=None):
+        self.output = output
+        self.output_dir = output_dir
+        self.ext = ext
+        self.filter_empty_comments = filter_empty_comments
+        self.fields = fields
+        self._first = {}  # BatchJob -> 第一条评论，用于生成文件名
+        self._serial = itertools.count(1)
+
+    def open(self, job):
+        """为任务创建输出（在工作线程中调用）"""
+        if self.output:
+            output_file = self.output.replace('{item_id}', job.item_id)
+        else:
+            output_file = os.path.join(self.output_dir, f"{job.item_id}_爬取中_{next(self._serial)}{self.ext}")
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        return open_sink(output_file, self.filter_empty_comments, self.fields)
+
+    def on_page(self, job, page, comments, failed):
+        """记录任务的第一条评论"""
+        if comments:
+            self._first.setdefault(job, comments[0])
+
+    def finish(self, result):
+        """
+        商品完成后整理输出文件：没有写入评论时删除文件，自动命名时按实际内容重命名；
+        爬取中途出错时已写入的页面保留
+        :return: 输出文件路径，没有输出时为None
+        """
+        first = self._first.pop(result.job, None)
+        sink = result.output
+        if sink is None:
+            return None
+        if not sink.rows_written:
+            if os.path.exists(sink.output_file):
+                os.remove(sink.output_file)
+            return None
+        if self.output:
+            return sink.output_file
+        output_file = os.path.join(self.output_dir, TmallCommentCrawler.default_output_file(
+            [first or {'auctionNumId': result.job.item_id}], self.ext, count=sink.rows_written))
+        os.replace(sink.output_file, output_file)
+        return output_file
+
+
+class BatchCrawler:
+    """
+    多商品批量爬取引擎：在有界的工作线程池中调度任务，所有工作线程共享同一个速率预算和连接池
+    :param workers: 同时爬取的商品数
+    :param rate_limit: 所有商品合计的请求速率（次/秒），自适应模式下为初始速率
+    :param page_concurrency: 每个商品同时在途的页面请求数
+    :param cookie: 自定义Cookie，为None时使用爬虫默认Cookie
+    :param transport: 共享的HTTP传输层，为None时自动创建
+    :param store: 共享的本地评论库，为None时不入库
+    :param incremental: 增量模式，遇到已入库的评论即停止（需要store）
+    :param resume: 断点续爬，从每个商品上次完成的页面继续（需要store）
+    :param cache: 共享的响应缓存，为None时不使用缓存
+    :param base_url: 评论接口地址，为None时使用线上接口
+    :param accounts: 共享的多账号池（AccountPool），设置后按各账号的速率预算请求，忽略rate_limit和cookie
+    :param adaptive: 合计速率是否使用AIMD自适应调整，见TmallCommentCrawler
+    :param min_rate: 自适应速率下限
+    :param max_rate: 自适应速率上限
+    :param metrics: 所有商品共享的指标注册表，为None时新建
+    :param projection: 字段投影（字段路径列表或Projection），只保留并导出这些字段，为None时保留全部字段
+    :param dedup: 所有商品共享的评论ID去重索引（DedupIndex），为None时不去重
+    """
+    def __init__(self, workers=4, rate_limit=0.7, page_concurrency=1, cookie=None, transport=None,
+                 store=None, incremental=False, resume=False, cache=None, base_url=None, accounts=None,
+                 adaptive=True, min_rate=None, max_rate=None, metrics=None, projection=None,
+                 dedup=None):
+        self.workers = max(1, int(workers))
+        self.page_concurrency = page_concurrency
+        self.cookie = cookie
+        self.store = store
+        self.incremental = incremental
+        self.resume = resume
+        self.cache = cache
+        self.base_url = base_url
+        self.accounts = accounts
+        self.rate_limiter = make_rate_limiter(rate_limit, adaptive, min_rate, max_rate)
+        self.transport = transport or HttpTransport(pool_size=max(10, self.workers * page_concurrency))
+        self.registry = metrics if metrics is not None else MetricsRegistry()
+        self.metrics = CrawlMetrics(self.registry)
+        self.projection = projection
+        self.dedup = dedup
+
+    def _new_crawler(self, **options):
+        """
+        创建共享速率预算和连接池的爬虫实例，每个任务一个实例以隔离错误状态
+        :param options: 覆盖默认值的TmallCommentCrawler参数，如筛选条件rate_type / expression、去重索引dedup
+        """
+        kwargs = dict(
+            concurrency=self.page_concurrency,
+            transport=self.transport,
+            rate_limiter=self.rate_limiter,
+            store=self.store,
+            cache=self.cache,
+            base_url=self.base_url,
+            accounts=self.accounts,
+            metrics=self.registry,
+            projection=self.projection,
+            dedup=self.dedup,
+        )
+        kwargs.update(options)
+        crawler = TmallCommentCrawler(**kwargs)
+        if self.cookie:
+            crawler.set_cookie(self.cookie)
+        return crawler
+
+    def _run_job(self, job, on_page=None, open_output=None):
+        """
+        爬取一个商品；设置了open_output时每页到达后立即写入其返回的输出，不在内存中累积评论，
+        之后的页面或写盘出错时已写入的页面仍保留在文件中
+        """
+        started = time.monotonic()
+        crawler = self._new_crawler()
+        comments = []
+        count = 0
+        written = []
+        sink = None
+        error = ""
+        pages = None
+        try:
+            sink = open_output(job) if open_output else None
+            pages = crawler.iter_comments(job.item_id, job.start_page, job.end_page, job.order_type,
+                                          auto_pages=job.auto_pages, incremental=self.incremental,
+                                          resume=self.resume)
+            for page, page_comments in pages:
+                if sink is not None:
+                    try:
+                        sink.write_page(page_comments)
+                    except Exception as e:
+                        error = f"保存失败: {e}"
+                        break
+                    written.append(page)
+                else:
+                    comments.extend(page_comments)
+                count += len(page_comments)
+                if on_page:
+                    on_page(job, page, page_comments, page in crawler.failed_pages)
+        except Exception as e:
+            error = str(e)
+        finally:
+            if pages is not None:
+                pages.close()
+            if sink is not None:
+                try:
+                    sink.close()
+                    # 已写入文件的页面提交评论ID，其余撤销
+                    crawler.commit_dedup(written)
+                except Exception as e:
+                    error = error or f"保存失败: {e}"
+                crawler.discard_dedup()
+        if not error and not count:
+            error = crawler.last_error
+        # 未设置输出时评论ID由调用方在保存评论后提交，见BatchResult.dedup_keys
+        dedup_keys = [key for keys in crawler.dedup_keys.values() for key in keys]
+        return BatchResult(job, comments, list(crawler.failed_pages), error, time.monotonic() - started,
+                           crawler.pages_fetched, count=count, output=sink, dedup_keys=dedup_keys)
+
+    def run(self, jobs, on_result=None, on_page=None, open_output=None):
+        """
+        执行批量任务
+        :param jobs: BatchJob列表
+        :param on_result: 每完成一个商品调用一次，参数为BatchResult（在调用线程中依次调用）
+        :param on_page: 每交付一页调用一次，参数为 (BatchJob, 页码, 该页评论列表, 该页是否失败)，在工作线程中调用
+        :param open_output: 为每个任务创建增量输出（tmall_comment_export.CommentSink），参数为BatchJob；
+                            设置后每页到达即写盘，结果中不保留评论（见BatchResult.output）
+        :return: (结果列表（与jobs顺序一致）, 运行汇总字典)
+        """
+        started = time.monotonic()
+        results = [None] * len(jobs)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._run_job, job, on_page, open_output): i for i, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                if on_result:
+                    on_result(result)
+
+        summary = self.summarize(results, time.monotonic() - started)
+        if self.dedup is not None:
+            summary['duplicates'] = self.dedup.duplicates
+            summary['duplicate_rate'] = round(self.dedup.duplicate_rate(), 4)
+        return results, summary
+
+    def run_coverage(self, jobs, on_result=None, on_page=None, open_output=None, **options):
+        """
+        按分片覆盖爬取（tmall_comment_coverage）执行批量任务：商品依次爬取，每个商品同时爬取workers个分片，
+        任务中的页码和排序方式不再使用
+        :param on_result: 每完成一个商品调用一次，参数为BatchResult，其coverage为覆盖报告
+        :param on_page: 同run，每得到一块去重后的新评论调用一次，页码为None
+        :param open_output: 同run，设置后每块新评论到达即写盘
+        :param options: CoverageCrawler的参数，如max_pages、min_new_ratio、max_requests
+        :return: (结果列表（与jobs顺序一致）, 运行汇总字典)
+        """
+        started = time.monotonic()
+        results = []
+        for job in jobs:
+            job_started = time.monotonic()
+            coverage = CoverageCrawler(self, **options)
+            sink = None
+            try:
+                sink = open_output(job) if open_output else None
+                comments = []
+
+                def on_comments(chunk_comments, job=job, sink=sink, comments=comments):
+                    if sink is not None:
+                        sink.write_page(chunk_comments)
+                    else:
+                        comments.extend(chunk_comments)
+                    if on_page:
+                        on_page(job, None, chunk_comments, False)
+
+                _, report = coverage.crawl(job.item_id, on_comments=on_comments)
+                failed_pages = [page for shard in coverage.shards for page in shard.failed_pages]
+                result = BatchResult(job, comments, failed_pages, "", time.monotonic() - job_started,
+                                     report['requests'], report, count=report['distinct'], output=sink)
+            except Exception as e:
+                result = BatchResult(job, error=str(e), elapsed=time.monotonic() - job_started, output=sink)
+            finally:
+                if sink is not None:
+                    try:
+                        sink.close()
+                        coverage.commit_dedup()
+                    except Exception as e:
+                        result.error = result.error or f"保存失败: {e}"
+                    coverage.discard_dedup()
+            if sink is None:
+                result.dedup_keys = coverage.dedup_keys
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+        summary = self.summarize(results, time.monotonic() - started)
+        summary['coverage'] = {r.job.item_id: r.coverage['coverage'] for r in results if r.coverage}
+        if self.dedup is not None:
+            summary['duplicates'] = self.dedup.duplicates
+            summary['duplicate_rate'] = round(self.dedup.duplicate_rate(), 4)
+        return results, summary
+
+    @staticmethod
+    def summarize(results, elapsed):
+        """生成运行汇总"""
+        pages = sum(r.pages for r in results)
+        failed_pages = sum(len(r.failed_pages) for r in results)
+        return {
+            'items': len(results),
+            'succeeded': sum(1 for r in results if r.ok),
+            'partial': sum(1 for r in results if not r.error and r.failed_pages),
+            'failed': sum(1 for r in results if r.error),
+            'comments': sum(r.count for r in results),
+            'pages': pages,
+            'failed_pages': failed_pages,
+            'elapsed': round(elapsed, 2),
+            'pages_per_sec': round((pages - failed_pages) / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+
+
+def main(argv=None):
+    """
+    批量爬取入口，与 tmall_comment_crawler_cmd.py --job-file 相同，只是任务文件作为第一个位置参数，
+    并且默认同时爬取4个商品；其余参数见 tmall_comment_crawler_cmd.py --help
+    :return: 退出码，见tmall_comment_crawler_cmd.EXIT_OK等
+    """
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print("用法: python tmall_comment_batch.py 任务文件 [参数 ...]\n"
+              "任务文件每行: 商品ID [起始页 结束页|auto [排序方式]]，也支持.json/.jsonl\n"
+              "其余参数与 tmall_comment_crawler_cmd.py 相同:\n")
+        build_parser().print_help()
+        return EXIT_OK if argv else EXIT_USAGE
+    return cmd_main(['--workers', '4', '--job-file'] + argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
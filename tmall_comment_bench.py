@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+离线性能基准：使用仓库自带的 响应完整.txt / 响应部分.txt 样本，不发送任何网络请求
+分阶段测量热点路径的耗时和内存峰值：
+  sign     构建请求参数并计算签名（_build_params / _generate_sign）
+  parse    JSONP解析（原正则实现 / 按偏移定位 + json / orjson）
+  flatten  评论展开（逐行按EXPORT_COLUMNS取值 / 列式 comments_to_frame）
+  export   写文件（pandas to_excel 原实现 / 流式xlsx / XlsxSink / Parquet / CSV）
+用法:
+  python tmall_comment_bench.py                                  # 默认规模 10000,100000 行
+  python tmall_comment_bench.py --rows 10000,100000,1000000 --stages flatten,export
+  python tmall_comment_bench.py --json result.json               # 保存机器可读结果
+  python tmall_comment_bench.py --json new.json --compare old.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import tmall_comment_crawler_cmd as crawler_cmd
+from tmall_comment_export import (EXPORT_COLUMNS, USER_TAG_COLUMNS, comments_to_frame, export_column_kind,
+                                  frame_column_chunks, frame_row_chunks, open_sink, write_parquet, write_xlsx)
+from tmall_comment_record import path_getter
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PAYLOAD = os.path.join(BASE_DIR, '响应完整.txt')
+PARTIAL_PAYLOAD = os.path.join(BASE_DIR, '响应部分.txt')
+PAYLOADS = {'完整': DEFAULT_PAYLOAD, '部分': PARTIAL_PAYLOAD}
+STAGES = ('sign', 'parse', 'flatten', 'export')
+
+
+def load_payload(path=DEFAULT_PAYLOAD, compact=True):
+    """
+    读取保存的JSONP响应样本
+    :param compact: 是否压缩为单行（线上接口返回的就是单行JSONP，样本文件是格式化后的）
+    :return: 响应原始字节
+    """
+    with open(path, 'rb') as f:
+        body = f.read()
+    if not compact:
+        return body
+    result = crawler_cmd.parse_jsonp(body)
+    return f"mtopjsonppcdetail22({json.dumps(result, ensure_ascii=False)})".encode('utf-8')
+
+
+def _time_it(func, body, repeat):
+    func(body)  # 预热
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(body)
+    return time.perf_counter() - started
+
+
+def _peak_memory(func, *args):
+    """单独运行一次func，返回tracemalloc记录的内存峰值（MB）"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def parse_regex(body):
+    """原实现：解码为str，正则捕获后再json.loads"""
+    text = body.decode('utf-8')
+    return json.loads(re.search(r'mtopjsonppcdetail\d+\((.*)\)', text).group(1))
+
+
+def parse_offset_stdlib(body):
+    """按偏移定位，使用标准库json"""
+    orjson, crawler_cmd.orjson = crawler_cmd.orjson, None
+    try:
+        return crawler_cmd.parse_jsonp(body)
+    finally:
+        crawler_cmd.orjson = orjson
+
+
+def parse_cases():
+    """JSONP解析的用例：[(名称, 解析函数)]"""
+    cases = [
+        ('regex + json (原实现)', parse_regex),
+        ('offset + json', parse_offset_stdlib),
+    ]
+    if crawler_cmd.orjson is not None:
+        cases.append(('offset + orjson', crawler_cmd.parse_jsonp))
+    return cases
+
+
+def bench_parse(body, repeat):
+    """
+    对比JSONP解析实现的吞吐
+    :return: [(名称, 秒数, 字节/秒)]
+    """
+    results = []
+    for name, func in parse_cases():
+        elapsed = _time_it(func, body, repeat)
+        results.append((name, elapsed, len(body) * repeat / elapsed))
+    return results
+
+
+def replicate_comments(body, rows):
+    """把样本中的评论重复到指定行数（复用同一批字典，只用于测量展开速度）"""
+    comments = crawler_cmd.parse_jsonp(body)['data']['rateList']
+    return (comments * (rows // len(comments) + 1))[:rows]
+
+
+# 逐行基线中各取值方式的转换，与comments_to_frame的整列映射相同
+ROW_CONVERTERS = {
+    'value': lambda v: '' if v is None else v,
+    'count': lambda v: 0 if v is None else v,
+    'flag1': lambda v: "是" if v == "1" else "否",
+    'flag_true': lambda v: "是" if v == "true" else "否",
+    'rate': lambda v: "好评" if v == "1" else ("中评" if v == "0" else "差评"),
+    'sku': lambda v: ', '.join(f"{k}: {x}" for k, x in v.items()) if isinstance(v, dict) and v else '',
+}
+
+
+def flatten_rowwise(comments):
+    """逐行基线（原实现的做法）：每条评论按EXPORT_COLUMNS逐列取值构建行字典，再生成DataFrame"""
+    import pandas as pd
+    columns = [(name, path_getter(path), ROW_CONVERTERS[kind]) for name, path, kind in EXPORT_COLUMNS]
+    rows = []
+    for comment in comments:
+        row = {name: convert(get(comment)) for name, get, convert in columns}
+        for i, tag in enumerate(comment.get('userTagList') or []):
+            for suffix, field in USER_TAG_COLUMNS:
+                row[f'用户标签_{i+1}_{suffix}'] = tag.get(field, '')
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def bench_flatten(comments, repeat=3):
+    """
+    对比逐行展开与列式展开的速度，并校验两者输出一致
+    :return: [(名称, 秒数, 行/秒)]
+    """
+    expected = flatten_rowwise(comments[:200]).astype(str)
+    actual = comments_to_frame(comments[:200]).astype(str)
+    if not expected.equals(actual):
+        raise AssertionError("列式展开与逐行展开的结果不一致")
+
+    results = []
+    for name, func in (('逐行展开 (原实现)', flatten_rowwise), ('列式 comments_to_frame', comments_to_frame)):
+        elapsed = min(_time_it(func, comments, 1) for _ in range(repeat))
+        results.append((name, elapsed, len(comments) / elapsed))
+    return results
+
+
+def _sign_crawler():
+    """创建只用于计算签名的爬虫实例（不发送请求）"""
+    crawler = crawler_cmd.TmallCommentCrawler.__new__(crawler_cmd.TmallCommentCrawler)
+    crawler.token = 'e0a8d2ac8c1d3b7bd07a7b4f1ed2d21a'
+    crawler.rate_type = ''
+    crawler.expression = ''
+    return crawler
+
+
+def export_cases():
+    """
+    导出阶段的用例：(名称, 文件扩展名, 写文件函数(df, 评论列表, 路径), 是否为xlsx)
+    """
+    def pandas_to_excel(df, comments, path):
+        df.to_excel(path, index=False, engine='openpyxl')
+
+    def streaming_xlsx(df, comments, path):
+        write_xlsx(path, df.columns, frame_row_chunks(df))
+
+    def parquet(df, comments, path):
+        write_parquet(path, list(df.columns), [export_column_kind(name) for name in df.columns],
+                      frame_column_chunks(df))
+
+    def xlsx_sink(df, comments, path):
+        # save_to_excel的做法：按块展开后经XlsxSink写入，不构建整张表
+        with open_sink(path) as sink:
+            for start in range(0, len(comments), 5000):
+                sink.write_page(comments[start:start + 5000])
+
+    def csv_sink(df, comments, path):
+        with open_sink(path) as sink:
+            for start in range(0, len(comments), 20):
+                sink.write_page(comments[start:start + 20])
+
+    cases = [
+        ('pandas to_excel (原实现)', '.xlsx', pandas_to_excel, True),
+        ('流式 write_xlsx', '.xlsx', streaming_xlsx, True),
+        ('XlsxSink 分块写入', '.xlsx', xlsx_sink, True),
+        ('CsvSink 逐页写入', '.csv', csv_sink, False),
+    ]
+    try:
+        import pyarrow  # noqa: F401
+        cases.append(('Parquet write_parquet', '.parquet', parquet, False))
+    except ImportError:
+        pass
+    return cases
+
+
+class BenchSuite:
+    """
+    分阶段基准测试，每个用例记录为一条结果字典：
+    stage / case / payload / rows / repeat / seconds / rate / unit / peak_mb（未测内存时为None）
+    :param rows_list: 展开和导出阶段使用的评论行数列表
+    :param repeat: sign和parse阶段每个用例的重复次数
+    :param memory: 是否额外运行一次测量内存峰值（tracemalloc会拖慢运行，计时与测内存分开进行）
+    :param xlsx_max_rows: xlsx导出只在不超过该行数时运行（xlsx写入很慢，且单表上限约104万行）
+    """
+    def __init__(self, rows_list=(10000, 100000), repeat=2000, memory=True, xlsx_max_rows=100000):
+        self.rows_list = list(rows_list)
+        self.repeat = repeat
+        self.memory = memory
+        self.xlsx_max_rows = xlsx_max_rows
+        self.results = []
+        self.out = sys.stdout  # 进度输出，结果JSON输出到标准输出时改为标准错误
+        self.bodies = {name: load_payload(path) for name, path in PAYLOADS.items() if os.path.exists(path)}
+
+    def record(self, stage, case, seconds, count, unit, payload='', rows=0, repeat=1, peak_mb=None):
+        result = {
+            'stage': stage,
+            'case': case,
+            'payload': payload,
+            'rows': rows,
+            'repeat': repeat,
+            'seconds': round(seconds, 6),
+            'rate': round(count / seconds, 3) if seconds > 0 else None,
+            'unit': unit,
+            'peak_mb': round(peak_mb, 3) if peak_mb is not None else None,
+        }
+        self.results.append(result)
+        memory = f"  峰值 {peak_mb:9.2f} MB" if peak_mb is not None else ""
+        label = f"{payload or rows or ''}"
+        print(f"  [{stage}] {case:<28} {label:>8}  {seconds:9.3f} 秒  {result['rate'] or 0:14.1f} {unit}{memory}",
+              file=self.out)
+        return result
+
+    def _measure(self, func, *args):
+        return _peak_memory(func, *args) if self.memory else None
+
+    def run_sign(self):
+        crawler = _sign_crawler()
+        timestamp = int(time.time() * 1000)
+        data_str = json.dumps(crawler._build_data('714871191114', 1))
+        cases = [
+            ('_generate_sign', lambda _: crawler._generate_sign(timestamp, data_str)),
+            ('_build_params (含data序列化)', lambda _: crawler._build_params('714871191114', 1)),
+        ]
+        for name, func in cases:
+            elapsed = _time_it(func, None, self.repeat)
+            self.record('sign', name, elapsed, self.repeat, '次/秒', repeat=self.repeat,
+                        peak_mb=self._measure(func, None))
+
+    def run_parse(self):
+        for payload, body in self.bodies.items():
+            for name, func in parse_cases():
+                elapsed = _time_it(func, body, self.repeat)
+                self.record('parse', name, elapsed, len(body) * self.repeat / 1024 / 1024, 'MB/秒',
+                            payload=payload, repeat=self.repeat, peak_mb=self._measure(func, body))
+
+    def run_flatten(self):
+        body = self.bodies['完整']
+        for rows in self.rows_list:
+            comments = replicate_comments(body, rows)
+            for name, elapsed, _ in bench_flatten(comments, repeat=1 if rows > 100000 else 3):
+                func = flatten_rowwise if name.startswith('逐行') else comments_to_frame
+                self.record('flatten', name, elapsed, rows, '行/秒', rows=rows,
+                            peak_mb=self._measure(func, comments))
+            del comments
+            gc.collect()
+
+    def run_export(self):
+        body = self.bodies['完整']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for rows in self.rows_list:
+                comments = replicate_comments(body, rows)
+                df = comments_to_frame(comments)
+                for name, ext, func, is_xlsx in export_cases():
+                    if is_xlsx and rows > self.xlsx_max_rows:
+                        continue
+                    path = os.path.join(tmp_dir, f'bench{ext}')
+                    started = time.perf_counter()
+                    func(df, comments, path)
+                    elapsed = time.perf_counter() - started
+                    result = self.record('export', name, elapsed, rows, '行/秒', rows=rows,
+                                         peak_mb=self._measure(func, df, comments, path))
+                    result['file_bytes'] = os.path.getsize(path)
+                    os.remove(path)
+                del comments, df
+                gc.collect()
+
+    def run(self, stages=STAGES):
+        for stage in stages:
+            print(f"{stage}:", file=self.out)
+            getattr(self, f'run_{stage}')()
+        return self.results
+
+
+def environment_info():
+    """记录运行环境，便于跨版本比较结果"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    info = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'orjson': crawler_cmd.orjson is not None,
+    }
+    for module in ('pandas', 'numpy', 'openpyxl', 'pyarrow'):
+        try:
+            info[module] = __import__(module).__version__
+        except ImportError:
+            info[module] = None
+    return info
+
+
+def compare_results(old, new):
+    """
+    按 (stage, case, payload, rows) 对比两次运行的吞吐（与重复次数无关）
+    :return: [(键, 单位, 旧吞吐, 新吞吐, 加速比)]
+    """
+    def key(r):
+        return r['stage'], r['case'], r['payload'], r['rows']
+
+    old_by_key = {key(r): r for r in old['results']}
+    rows = []
+    for r in new['results']:
+        before = old_by_key.get(key(r))
+        if before and before['rate'] and r['rate']:
+            rows.append((key(r), r['unit'], before['rate'], r['rate'], r['rate'] / before['rate']))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="天猫评论爬虫离线性能基准")
+    parser.add_argument('--rows', default='10000,100000', help="展开和导出阶段的评论行数，逗号分隔（如 10000,100000,1000000）")
+    parser.add_argument('--stages', default=','.join(STAGES), help=f"要运行的阶段，逗号分隔，可选 {','.join(STAGES)}")
+    parser.add_argument('--repeat', type=int, default=2000, help="sign和parse阶段每个用例的重复次数")
+    parser.add_argument('--xlsx-max-rows', type=int, default=100000, help="xlsx导出用例的最大行数")
+    parser.add_argument('--no-memory', action='store_true', help="不测量内存峰值（tracemalloc较慢）")
+    parser.add_argument('--json', help="把结果写入JSON文件，为 - 时输出到标准输出")
+    parser.add_argument('--compare', help="与之前保存的JSON结果对比")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"未知的阶段: {', '.join(sorted(unknown))}")
+
+    suite = BenchSuite(rows_list=[int(r) for r in args.rows.split(',') if r.strip()], repeat=args.repeat,
+                       memory=not args.no_memory, xlsx_max_rows=args.xlsx_max_rows)
+    if args.json == '-':
+        suite.out = sys.stderr
+    report = {'environment': environment_info(), 'results': suite.run(stages)}
+
+    if args.json == '-':
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.json}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+        print(f"与 {args.compare}（提交 {old['environment'].get('commit') or '未知'}）对比:")
+        for (stage, case, payload, rows), unit, before, after, speedup in compare_results(old, report):
+            label = f"{payload or rows or ''}"
+            print(f"  [{stage}] {case:<28} {label:>8}  {before:14.1f} -> {after:14.1f} {unit}  x{speedup:.2f}")
+
+
+if __name__ == "__main__":
+    main()
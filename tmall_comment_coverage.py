@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+分片覆盖爬取：同一个筛选条件和排序方式最多只能翻到totalPage页（样本中4万条评论只有250页），
+大商品单独按一种排序翻页只能看到一小部分评论
+接口接受评价类型（rateType）和标签（expression）筛选，每个 评价类型 × 标签 × 排序方式 的组合都有自己的页数上限，
+把商品拆成这样的分片分别爬取，按评论ID去重合并，就能覆盖更多的评论
+- 先请求不筛选的第1块，读取feedAllCount和imprItemVOS中的标签，生成分片
+- 每个分片按块（默认10页）爬取，优先爬取最近一块中新评论比例最高的分片，
+  新评论比例低于min_new_ratio或翻到最后一页时停止该分片，把请求花在新评论最多的地方
+- 某个标签的评论数超过该标签分片能翻到的条数时，再按评价类型细分
+- 报告去重后的评论数相对feedAllCount的覆盖率，以及平均每个请求带来的新评论数
+用法:
+  python tmall_comment_coverage.py 714871191114 --cookie-file cookie.txt --output coverage.xlsx
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from tmall_comment_dedup import DedupIndex
+
+logger = logging.getLogger(__name__)
+
+# 评价类型筛选（rateType）：值 -> 名称
+RATE_TYPES = (('1', '好评'), ('0', '中评'), ('-1', '差评'))
+# 排序方式（orderType）：值 -> 名称
+ORDER_TYPES = (('', '默认排序'), ('feedbackdate', '时间排序'))
+# 按标签筛选时expression参数的格式，attribute_id为imprItemVOS中的attributeId
+# 未经线上接口验证：样本请求（请求-默认排序.txt、请求-时间排序.txt）中expression均为空，也没有抓到点击标签时的请求，
+# 这个格式只与本地模拟接口（tmall_fake_mtop）一致。线上接口不认这个格式时会忽略筛选、返回全部评论，
+# 爬取时标签分片的评论数与不筛选时相同会输出警告，见CoverageCrawler._check_tag_filter
+TAG_EXPRESSION_FORMAT = "attributeId:{attribute_id}"
+# 每页评论数，与请求中的pageSize一致
+PAGE_SIZE = 20
+
+
+def tag_expression(attribute_id):
+    """按标签筛选的expression参数"""
+    return TAG_EXPRESSION_FORMAT.format(attribute_id=attribute_id)
+
+
+class Shard:
+    """
+    一个分片：评价类型 × 标签 × 排序方式
+    :param rate_type: 评价类型，为空表示全部
+    :param tag: imprItemVOS中的标签字典，为None表示不按标签筛选
+    :param order_type: 排序方式
+    :param estimate: 探测前估计的评论数，决定未探测分片的先后顺序
+    """
+    def __init__(self, rate_type="", tag=None, order_type="", estimate=0):
+        self.rate_type = rate_type
+        self.tag = tag
+        self.order_type = order_type
+        self.estimate = estimate
+        self.total = None  # 该筛选条件下的评论数（第1页返回的total）
+        self.total_pages = None  # 该筛选条件下可翻的页数（第1页返回的totalPage）
+        self.next_page = 1
+        self.requests = 0
+        self.fetched = 0  # 获取的评论数（去重前）
+        self.new = 0  # 带来的新评论数（去重后）
+        self.last_ratio = 1.0  # 最近一块中新评论的比例
+        self.failed_pages = []
+        self.done = False
+
+    @property
+    def expression(self):
+        return tag_expression(self.tag['attributeId']) if self.tag else ""
+
+    @property
+    def name(self):
+        parts = [dict(RATE_TYPES).get(self.rate_type, '全部评价')]
+        if self.tag:
+            parts.append(f"标签:{self.tag.get('title') or self.tag['attributeId']}")
+        parts.append(dict(ORDER_TYPES).get(self.order_type, self.order_type))
+        return '/'.join(parts)
+
+    @property
+    def capped(self):
+        """评论数是否超过了该分片能翻到的条数"""
+        return self.total is not None and self.total_pages is not None and self.total > self.total_pages * PAGE_SIZE
+
+    def priority(self):
+        """调度优先级：预计的新评论比例（未探测时为1），相同时估计的评论数多的优先"""
+        return self.last_ratio, self.total if self.total is not None else self.estimate
+
+    def to_dict(self):
+        return {
+            'shard': self.name,
+            'rate_type': self.rate_type,
+            'expression': self.expression,
+            'order_type': self.order_type,
+            'total': self.total,
+            'total_pages': self.total_pages,
+            'pages': self.next_page - 1,
+            'requests': self.requests,
+            'fetched': self.fetched,
+            'new': self.new,
+            'failed_pages': len(self.failed_pages),
+        }
+
+    def __repr__(self):
+        return f"Shard({self.name})"
+
+
+class CoverageCrawler:
+    """
+    分片覆盖爬取引擎，分片并发爬取，共享BatchCrawler的速率预算、连接池、账号池和指标
+    :param batch: tmall_comment_batch.BatchCrawler，同时爬取的分片数为batch.workers；
+                  batch.dedup不为None时用它去重（可跨运行），否则每个商品新建一个内存索引
+    :param orders: 参与拆分的排序方式
+    :param rate_types: 参与拆分的评价类型，为空时不按评价类型拆分
+    :param use_tags: 是否按imprItemVOS中的标签拆分
+    :param chunk_pages: 每次为一个分片连续爬取的页数
+    :param max_pages: 每个分片最多爬取的页数，为None时按该分片的totalPage
+    :param min_new_ratio: 一块中新评论的比例低于该值时停止该分片
+    :param max_requests: 请求数预算，用完后不再调度新的块，为None表示不限
+    """
+    def __init__(self, batch, orders=('', 'feedbackdate'), rate_types=('1', '0', '-1'), use_tags=True,
+                 chunk_pages=10, max_pages=None, min_new_ratio=0.05, max_requests=None):
+        self.batch = batch
+        self.orders = tuple(orders) or ('',)
+        self.rate_types = tuple(rate_types)
+        self.use_tags = use_tags
+        self.chunk_pages = max(1, int(chunk_pages))
+        self.max_pages = max_pages
+        self.min_new_ratio = min_new_ratio
+        self.max_requests = max_requests
+        self.shards = []
+        self.index = None
+        self.dedup_keys = []  # 已交付的评论新加入去重索引、尚未提交的ID，见commit_dedup
+        self._tag_filter_warned = False
+
+    def plan(self, page_info):
+        """根据不筛选的第1页中的分页和标签信息生成分片（不含已爬取的第一个分片）"""
+        feed_all = _to_int(page_info.get('feedAllCount') or page_info.get('total'))
+        shards = [Shard("", None, order, feed_all) for order in self.orders[1:]]
+        for rate_type in self.rate_types:
+            shards.extend(Shard(rate_type, None, order) for order in self.orders)
+        if self.use_tags:
+            for tag in page_info.get('imprItemVOS') or []:
+                if tag.get('attributeId'):
+                    shards.extend(Shard("", tag, order, _to_int(tag.get('count'))) for order in self.orders)
+        return shards
+
+    def crawl(self, item_id, on_comments=None):
+        """
+        对一个商品做分片覆盖爬取
+        :param on_comments: 每得到一块去重后的新评论调用一次（在调用线程中），参数为评论列表；
+                            设置后新评论交给回调写盘，不在内存中累积
+        :return: (去重合并后的评论列表（设置on_comments时为空）, 覆盖报告字典)
+        评论保存成功后调用commit_dedup提交去重索引，失败时调用discard_dedup
+        """
+        started = time.monotonic()
+        index = self.index = self.batch.dedup if self.batch.dedup is not None else DedupIndex()
+        self.dedup_keys = []
+        comments = []
+        count = 0
+
+        def deliver(chunk_comments, keys):
+            nonlocal count
+            if on_comments is not None:
+                try:
+                    on_comments(chunk_comments)
+                except Exception:
+                    index.rollback(keys)
+                    raise
+            else:
+                comments.extend(chunk_comments)
+            count += len(chunk_comments)
+            self.dedup_keys.extend(keys)
+
+        # 第一个分片（不筛选、第一种排序）兼做探测，读取评论总数和标签
+        first = Shard("", None, self.orders[0])
+        first_comments, page_info, first_keys = self._crawl_chunk(item_id, first, index)
+        deliver(first_comments, first_keys)
+        feed_all = _to_int(page_info.get('feedAllCount') or page_info.get('total'))
+        self.shards = [first] + self.plan(page_info)
+        logger.info("商品 %s 共 %d 条评论，不筛选时可翻 %s 页，拆分为 %d 个分片",
+                    item_id, feed_all, page_info.get('totalPage', '未知'), len(self.shards))
+
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.batch.workers) as executor:
+            while True:
+                requests = sum(s.requests for s in self.shards)
+                complete = feed_all and count >= feed_all
+                over_budget = self.max_requests is not None and requests >= self.max_requests
+                if not complete and not over_budget:
+                    busy = set(running.values())
+                    ready = [s for s in self.shards if not s.done and s not in busy]
+                    while ready and len(running) < self.batch.workers:
+                        shard = max(ready, key=Shard.priority)
+                        ready.remove(shard)
+                        running[executor.submit(self._crawl_chunk, item_id, shard, index)] = shard
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    shard = running.pop(future)
+                    try:
+                        chunk_comments, _, keys = future.result()
+                    except Exception as e:
+                        shard.done = True
+                        logger.error("分片 %s 爬取出错: %s", shard.name, e)
+                        continue
+                    deliver(chunk_comments, keys)
+                    self._refine(shard)
+                    logger.info("分片 %s: 已爬 %d 页，新评论 %d 条（最近一块 %.0f%%），累计 %d 条，覆盖率 %.1f%%",
+                                shard.name, shard.next_page - 1, shard.new, shard.last_ratio * 100, count,
+                                count / feed_all * 100 if feed_all else 0.0)
+
+        return comments, self.report(item_id, feed_all, count, time.monotonic() - started)
+
+    def _crawl_chunk(self, item_id, shard, index):
+        """
+        为分片爬取下一块页面（在工作线程中执行）
+        :return: (去重后的新评论, 该块起始页返回的分页信息, 新评论加入去重索引的待提交ID)
+        """
+        start = shard.next_page
+        end = start + self.chunk_pages - 1
+        if self.max_pages:
+            end = min(end, self.max_pages)
+        if shard.total_pages is not None:
+            end = min(end, shard.total_pages)
+        crawler = self.batch._new_crawler(rate_type=shard.rate_type, expression=shard.expression, dedup=index)
+        comments = crawler.get_comments(item_id, start, end, shard.order_type, auto_pages=True)
+        info = crawler.page_info
+
+        if shard.total is None:
+            shard.total = _to_int(info.get('total'))
+            shard.total_pages = _to_int(info.get('totalPage'))
+            self._check_tag_filter(shard)
+        shard.requests += crawler.pages_fetched
+        shard.fetched += crawler.dedup_checked
+        shard.new += len(comments)
+        shard.failed_pages.extend(crawler.failed_pages)
+        shard.last_ratio = len(comments) / crawler.dedup_checked if crawler.dedup_checked else 0.0
+        shard.next_page = start + crawler.pages_delivered
+        planned_end = crawler.planned_end_page or end
+        shard.done = (
+            crawler.pages_delivered < planned_end - start + 1  # 遇到最后一页提前停止
+            or shard.next_page > (shard.total_pages or 0)
+            or (self.max_pages and shard.next_page > self.max_pages)
+            or shard.last_ratio < self.min_new_ratio
+        )
+        return comments, info, [key for keys in crawler.dedup_keys.values() for key in keys]
+
+    def _check_tag_filter(self, shard):
+        """标签分片的评论数与不筛选时相同，说明接口很可能忽略了expression（格式未经线上验证），只警告一次"""
+        unfiltered = self.shards[0].total if self.shards else None
+        if shard.tag is None or shard.rate_type or not unfiltered or shard.total < unfiltered:
+            return
+        if not self._tag_filter_warned:
+            self._tag_filter_warned = True
+            logger.warning("分片 %s 的评论数与不筛选时相同（%d 条），标签筛选可能没有生效：expression格式 %r 未经线上接口验证",
+                           shard.name, shard.total, TAG_EXPRESSION_FORMAT)
+
+    def commit_dedup(self):
+        """评论保存成功后调用：提交已交付评论的ID并写回去重索引文件"""
+        if self.index is None:
+            return
+        self.index.commit(self.dedup_keys)
+        self.dedup_keys = []
+        try:
+            self.index.save()
+        except OSError as e:
+            logger.error("保存评论ID索引失败: %s", e)
+
+    def discard_dedup(self):
+        """评论保存失败时调用：撤销已交付评论的ID，下次运行时这些评论仍会输出"""
+        if self.index is not None:
+            self.index.rollback(self.dedup_keys)
+        self.dedup_keys = []
+
+    def _refine(self, shard):
+        """标签分片的评论数超过能翻到的条数时，按评价类型细分该标签"""
+        if shard.tag is None or shard.rate_type or not shard.capped or shard.requests > self.chunk_pages:
+            return
+        for rate_type in self.rate_types:
+            self.shards.append(Shard(rate_type, shard.tag, shard.order_type, shard.total))
+        logger.info("分片 %s 有 %d 条评论，只能翻到 %d 页，按评价类型细分", shard.name, shard.total, shard.total_pages)
+
+    def report(self, item_id, feed_all, distinct, elapsed):
+        """覆盖报告：去重后的评论数、相对feedAllCount的覆盖率、请求数和各分片明细"""
+        requests = sum(s.requests for s in self.shards)
+        fetched = sum(s.fetched for s in self.shards)
+        return {
+            'item_id': str(item_id),
+            'feed_all_count': feed_all,
+            'distinct': distinct,
+            'coverage': round(distinct / feed_all, 4) if feed_all else 0.0,
+            'requests': requests,
+            'fetched': fetched,
+            'duplicates': fetched - distinct,
+            'new_per_request': round(distinct / requests, 2) if requests else 0.0,
+            'failed_pages': sum(len(s.failed_pages) for s in self.shards),
+            'elapsed': round(elapsed, 2),
+            'shards': [s.to_dict() for s in self.shards],
+        }
+
+
+def report_lines(report):
+    """覆盖报告的中文汇总，每项一行"""
+    lines = [
+        f"商品 {report['item_id']}: 去重后 {report['distinct']} 条评论，共 {report['feed_all_count']} 条，"
+        f"覆盖率 {report['coverage'] * 100:.1f}%",
+        f"请求 {report['requests']} 次，获取 {report['fetched']} 条（重复 {report['duplicates']} 条），"
+        f"平均每个请求 {report['new_per_request']} 条新评论，耗时 {report['elapsed']} 秒",
+    ]
+    for shard in sorted(report['shards'], key=lambda s: -s['new']):
+        if shard['requests']:
+            lines.append(f"  {shard['shard']}: 共 {shard['total']} 条 / {shard['total_pages']} 页，"
+                         f"爬取 {shard['pages']} 页，新评论 {shard['new']} 条")
+    return lines
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def main():
+    """
+    单个商品的分片覆盖爬取，批量商品使用 tmall_comment_crawler_cmd.py --coverage
+    :return: 退出码，见tmall_comment_crawler_cmd.EXIT_OK等
+    """
+    from tmall_comment_batch import BatchCrawler
+    from tmall_comment_crawler_cmd import EXIT_FAILED, EXIT_OK, EXIT_PARTIAL, load_cookies, setup_console_logging
+    from tmall_comment_export import SINK_TYPES, open_sink
+
+    parser = argparse.ArgumentParser(description="天猫商品评论分片覆盖爬取（按评价类型、标签和排序方式拆分）")
+    parser.add_argument('item_id', help="商品ID")
+    parser.add_argument('--cookie-file', help="包含Cookie字符串的文本文件，使用其中第一个Cookie")
+    parser.add_argument('--base-url', help="评论接口地址（默认为线上接口，可指向本地模拟接口）")
+    parser.add_argument('--workers', type=int, default=3, help="同时爬取的分片数")
+    parser.add_argument('--rate', type=float, default=0.7, help="合计请求速率（次/秒），自适应模式下为初始速率")
+    parser.add_argument('--chunk-pages', type=int, default=10, help="每次为一个分片连续爬取的页数")
+    parser.add_argument('--max-pages', type=int, help="每个分片最多爬取的页数（默认按totalPage）")
+    parser.add_argument('--min-new-ratio', type=float, default=0.05, help="一块中新评论比例低于该值时停止该分片")
+    parser.add_argument('--max-requests', type=int, help="请求数预算")
+    parser.add_argument('--no-tags', action='store_true', help="不按标签拆分")
+    parser.add_argument('--no-rate-types', action='store_true', help="不按评价类型拆分")
+    parser.add_argument('--output', help="输出文件（.xlsx / .csv / .jsonl / .parquet），新评论边爬边写入")
+    parser.add_argument('--report', help="把覆盖报告写入JSON文件，为 - 时输出到标准输出")
+    args = parser.parse_args()
+    if args.output and os.path.splitext(args.output)[1].lower() not in SINK_TYPES:
+        parser.error(f"不支持的输出格式: {args.output}，可选: {', '.join(SINK_TYPES)}")
+    setup_console_logging()
+
+    cookie = None
+    if args.cookie_file:
+        try:
+            cookie = next(iter(load_cookies(args.cookie_file)), None)
+        except OSError as e:
+            parser.error(f"无法读取Cookie文件: {e}")
+    batch = BatchCrawler(workers=args.workers, rate_limit=args.rate, cookie=cookie, base_url=args.base_url)
+    coverage = CoverageCrawler(batch, rate_types=() if args.no_rate_types else ('1', '0', '-1'),
+                               use_tags=not args.no_tags, chunk_pages=args.chunk_pages, max_pages=args.max_pages,
+                               min_new_ratio=args.min_new_ratio, max_requests=args.max_requests)
+    try:
+        if args.output:
+            with open_sink(args.output) as sink:
+                _, report = coverage.crawl(args.item_id, on_comments=sink.write_page)
+            if not sink.rows_written:
+                os.remove(args.output)
+        else:
+            _, report = coverage.crawl(args.item_id)
+    except Exception as e:
+        logger.error("商品 %s 爬取失败: %s", args.item_id, e)
+        return EXIT_FAILED
+
+    if args.report == '-':
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        for line in report_lines(report):
+            print(line)
+    if args.output and sink.rows_written:
+        print(f"评论数据已保存到 {args.output}，共 {sink.rows_written} 条")
+    if not report['distinct']:
+        return EXIT_FAILED
+    return EXIT_PARTIAL if report['failed_pages'] else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,684 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import argparse
+import asyncio
+import collections
 import hashlib
 import json
+import logging
+import os
+import queue
 import random
 import re
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
-import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 
+from tmall_comment_export import SINK_TYPES, ParquetSink, XlsxSink, open_sink, parse_field_list
+from tmall_comment_metrics import CrawlMetrics
+from tmall_comment_record import Projection, ValuePool, to_records
+
+try:
+    import orjson  # 可选的高性能JSON解析库
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# 表示被限流、可以稍后重试的mtop返回码
+THROTTLE_RET_CODES = (
+    'FAIL_SYS_TRAFFIC_LIMIT',
+    'FAIL_SYS_FLOWLIMIT',
+    'FAIL_SYS_SERVICE_BUSY',
+    'FAIL_SYS_USER_VALIDATE',
+)
+
+
+# 表示令牌（_m_h5_tk）过期或缺失的mtop返回码，服务端会在Set-Cookie中下发新令牌
+# 线上返回的拼写是EXOIRED，这里同时兼容正确拼写
+TOKEN_EXPIRED_RET_CODES = (
+    'FAIL_SYS_TOKEN_EXOIRED',
+    'FAIL_SYS_TOKEN_EXPIRED',
+    'FAIL_SYS_TOKEN_EMPTY',
+    'FAIL_SYS_TOKEN_ILLEGAL',
+)
+
+# 评论接口的默认地址
+DEFAULT_BASE_URL = 'https://h5api.m.tmall.com/h5/mtop.taobao.rate.detaillist.get/6.0/'
+
+# 响应data中与分页相关的字段
+PAGE_INFO_KEYS = ('hasNext', 'totalPage', 'total', 'feedAllCount', 'imprItemVOS', 'skuFilter')
+
+
+def is_throttled(ret):
+    """判断mtop返回码是否表示限流"""
+    return any(code in ret for code in THROTTLE_RET_CODES)
+
+
+def is_token_expired(ret):
+    """判断mtop返回码是否表示令牌过期"""
+    return any(code in ret for code in TOKEN_EXPIRED_RET_CODES)
+
+
+def set_cookie_value(cookie, name, value):
+    """替换Cookie字符串中name的值，不存在时追加"""
+    pattern = re.compile(r'(^|;\s*)' + re.escape(name) + r'=[^;]*')
+    if pattern.search(cookie):
+        return pattern.sub(lambda m: f"{m.group(1)}{name}={value}", cookie, count=1)
+    return f"{cookie.rstrip('; ')}; {name}={value}" if cookie.strip() else f"{name}={value}"
+
+
+def extract_token(cookie):
+    """从Cookie字符串的_m_h5_tk中提取签名用的token，没有时返回空字符串"""
+    m = re.search(r'_m_h5_tk=([^_]+)_', cookie)
+    return m.group(1) if m else ''
+
+
+def parse_set_cookie_tokens(set_cookie):
+    """
+    从响应的Set-Cookie头中取出服务端下发的_m_h5_tk / _m_h5_tk_enc
+    :return: {Cookie名: 值}，没有下发时为空字典
+    """
+    values = {}
+    for name in ('_m_h5_tk', '_m_h5_tk_enc'):
+        m = re.search(r'(?:^|[;,]\s*)' + name + r'=([^;,\s]+)', set_cookie or '')
+        if m:
+            values[name] = m.group(1)
+    return values
+
+
+def ret_code(ret):
+    """mtop返回码去掉"::"之后的说明文字，如 'FAIL_SYS_TRAFFIC_LIMIT::哎哟喂...' -> 'FAIL_SYS_TRAFFIC_LIMIT'"""
+    return ret.split('::', 1)[0] or 'EMPTY'
+
+
+def parse_jsonp(body):
+    """
+    解析mtop的JSONP响应 mtopjsonppcdetailNN({...})
+    直接在原始字节上按偏移定位回调包裹层，不先解码成str、不跑正则；
+    安装了orjson时直接从字节切片解析，否则回退到标准库json
+    :param body: 响应的原始字节（response.content），也接受str
+    :return: 解析后的响应字典
+    """
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    prefix = body.find(b'mtopjsonp')
+    start = body.find(b'(', prefix) if prefix >= 0 else -1
+    end = body.rfind(b')')
+    if start < 0 or end <= start:
+        raise ValueError("响应不是有效的JSONP格式")
+    if orjson is not None:
+        return orjson.loads(memoryview(body)[start + 1:end])
+    return json.loads(body[start + 1:end])
+
+
+class CrawlCancelled(Exception):
+    """爬取被CrawlControl取消"""
+
+
+class CrawlControl:
+    """
+    协作式的暂停、继续和取消控制，可以从其他线程（如界面线程）调用
+    爬虫在每个请求之前检查；速率等待和退避等待期间取消会立即生效，暂停在等待结束后生效
+    """
+    POLL_INTERVAL = 0.1  # 协程中检查状态的间隔（秒）
 
-class TmallCommentCrawler:
     def __init__(self):
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = threading.Event()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # 唤醒暂停中的等待，使其看到取消状态
+        self._running.set()
+
+    def checkpoint(self):
+        """暂停时阻塞到继续为止，已取消时抛出CrawlCancelled"""
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise CrawlCancelled()
+
+    async def checkpoint_async(self):
+        """checkpoint的协程版本"""
+        while not self._running.is_set():
+            await asyncio.sleep(self.POLL_INTERVAL)
+        if self._cancelled.is_set():
+            raise CrawlCancelled()
+
+    def sleep(self, seconds):
+        """可被取消打断的等待"""
+        if self._cancelled.wait(seconds):
+            raise CrawlCancelled()
+        self.checkpoint()
+
+    async def sleep_async(self, seconds):
+        """sleep的协程版本"""
+        deadline = time.monotonic() + seconds
+        while True:
+            if self._cancelled.is_set():
+                raise CrawlCancelled()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(self.POLL_INTERVAL, remaining))
+        await self.checkpoint_async()
+
+
+class RateLimiter:
+    """
+    全局请求速率预算（令牌桶），所有并发请求共享同一个预算
+    :param rate: 每秒允许发出的请求数
+    :param burst: 允许瞬时突发的请求数
+    """
+    def __init__(self, rate=0.7, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """预留一个请求名额，返回发出请求前需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, control=None):
+        """
+        阻塞等待直到可以发出下一个请求
+        :param control: CrawlControl，设置后等待期间可被取消
+        """
+        delay = self.reserve()
+        if delay > 0:
+            if control is not None:
+                control.sleep(delay)
+            else:
+                time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, control=None):
+        """acquire的协程版本，等待期间不阻塞事件循环"""
+        delay = self.reserve()
+        if delay > 0:
+            if control is not None:
+                await control.sleep_async(delay)
+            else:
+                await asyncio.sleep(delay)
+        return delay
+
+    def next_available(self):
+        """不预留名额，返回距离下一个可用名额的秒数"""
+        with self._lock:
+            tokens = min(self.burst, self._tokens + (time.monotonic() - self._last) * self.rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    # 以下为请求结果反馈，固定速率时忽略，由AdaptiveRateLimiter实现
+
+    def on_success(self, latency):
+        """请求成功，latency为响应耗时（秒）"""
+
+    def on_throttle(self):
+        """请求被限流"""
+
+    def on_error(self):
+        """请求出错（网络错误、重试耗尽的5xx等）"""
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    AIMD自适应速率预算：请求成功时速率加性增加，被限流或出错时乘性降低，速率保持在[min_rate, max_rate]之间
+    响应耗时明显高于平时（超过延迟基线的latency_factor倍）时暂停增加，避免把服务端推向拥塞
+    多个并发请求同时失败只算一次拥塞：两次降速之间至少间隔cooldown秒
+    :param rate: 初始速率（次/秒）
+    :param min_rate: 速率下限
+    :param max_rate: 速率上限
+    :param increase: 每个成功请求增加的速率（次/秒）
+    :param decrease: 被限流时速率乘以的系数
+    :param error_decrease: 出错时速率乘以的系数
+    :param latency_factor: 响应耗时超过延迟基线的多少倍时视为拥塞
+    :param cooldown: 两次降速之间的最短间隔（秒）
+    :param name: 日志中显示的名称
+    """
+    def __init__(self, rate=0.7, min_rate=0.2, max_rate=2.0, burst=1, increase=0.05, decrease=0.5,
+                 error_decrease=0.8, latency_factor=3.0, cooldown=2.0, name=""):
+        super().__init__(min(max(rate, min_rate), max_rate), burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.error_decrease = error_decrease
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.name = name
+        self.latency_baseline = None  # 成功请求耗时的指数加权平均
+        self._last_decrease = 0.0
+
+    def _set_rate(self, rate):
+        """在持有锁时更新速率前先按旧速率结算令牌（调用方需持有锁）"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+
+    def on_success(self, latency):
+        with self._lock:
+            congested = (self.latency_baseline is not None
+                         and latency > self.latency_baseline * self.latency_factor)
+            if self.latency_baseline is None:
+                self.latency_baseline = latency
+            elif not congested:
+                self.latency_baseline += 0.1 * (latency - self.latency_baseline)
+            if congested or self.rate >= self.max_rate:
+                return
+            old_rate = self.rate
+            self._set_rate(self.rate + self.increase)
+            rate = self.rate
+        # 每跨过0.5次/秒记录一次提速，避免日志过多
+        if int(rate * 2) > int(old_rate * 2):
+            logger.info("%s请求顺利，速率提高到 %.2f 次/秒", self.name, rate)
+
+    def on_throttle(self):
+        self._back_off(self.decrease, "被限流")
+
+    def on_error(self):
+        self._back_off(self.error_decrease, "请求出错")
+
+    def _back_off(self, factor, reason):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown or self.rate <= self.min_rate:
+                return
+            self._last_decrease = now
+            self._set_rate(self.rate * factor)
+            rate = self.rate
+        logger.warning("%s%s，速率降低到 %.2f 次/秒", self.name, reason, rate)
+
+
+def make_rate_limiter(rate, adaptive=True, min_rate=None, max_rate=None):
+    """
+    创建速率预算：adaptive为True时为AIMD自适应速率，否则为固定速率
+    :param min_rate: 自适应速率下限，默认为min(0.2, rate)
+    :param max_rate: 自适应速率上限，默认为rate的3倍
+    """
+    if not adaptive:
+        return RateLimiter(rate)
+    return AdaptiveRateLimiter(rate,
+                               min_rate if min_rate is not None else min(0.2, rate),
+                               max_rate if max_rate is not None else rate * 3)
+
+
+def run_coroutine(coro):
+    """
+    在同步代码中运行协程并返回其结果：当前线程没有运行中的事件循环时直接asyncio.run；
+    已在事件循环中调用（Qt/异步宿主、Jupyter）时asyncio.run会抛出RuntimeError，改为在新线程中运行，
+    调用方的事件循环会被阻塞到协程结束，在协程中应直接await对应的异步接口（如get_comments_async）
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    logger.warning("在运行中的事件循环里调用了同步接口，已改在工作线程中运行；在协程中请使用get_comments_async")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+class _CrawlStopped(Exception):
+    """流式消费者提前结束时用于中止后台抓取"""
+
+
+class HttpTransport:
+    """
+    基于requests.Session的HTTP传输层：连接池复用TCP/TLS连接，统一超时设置，
+    网络错误和429/5xx响应按指数退避重试
+    :param pool_size: 连接池大小，应不小于并发数
+    :param timeout: (连接超时, 读取超时)，单位秒
+    :param max_retries: 单个请求的最大重试次数
+    :param backoff_factor: 退避基数，第n次重试前等待约 backoff_factor * 2^n 秒
+    :param max_backoff: 单次退避等待的上限（秒）
+    """
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_size=10, timeout=(5, 20), max_retries=3, backoff_factor=1.0, max_backoff=30):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def backoff(self, attempt):
+        """第attempt次（从0开始）重试前需要等待的秒数，带随机抖动避免并发请求同时重试"""
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def get(self, url, params=None, headers=None, metrics=None, control=None):
+        """
+        发送GET请求，重试耗尽后抛出最后一次的异常
+        :param metrics: CrawlMetrics，设置后记录网络重试次数和退避等待时间
+        :param control: CrawlControl，设置后退避等待期间可被取消（抛出CrawlCancelled）
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+                if response.status_code in self.RETRY_STATUS and attempt < self.max_retries:
+                    raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+                response.raise_for_status()
+                return response
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                status = e.response.status_code if e.response is not None else None
+                retryable = status is None or status in self.RETRY_STATUS
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                wait = self.backoff(attempt)
+                logger.warning("请求失败(%s)，%.1f 秒后进行第 %d 次重试...", e, wait, attempt + 1)
+                if metrics is not None:
+                    metrics.retries.inc(reason='network')
+                    metrics.sleep_seconds.inc(wait, reason='network_backoff')
+                if control is not None:
+                    control.sleep(wait)
+                else:
+                    time.sleep(wait)
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+
+class Account:
+    """
+    账号池中的一个账号：独立的Cookie、token和请求速率预算
+    :param cookie: Cookie字符串，需要包含_m_h5_tk
+    :param rate: 该账号的请求速率上限（次/秒）
+    :param name: 账号名称，用于日志，默认取Cookie中的tracknick
+    :param rate_limiter: 该账号的速率预算，为None时按rate创建固定速率预算
+    """
+    def __init__(self, cookie, rate=0.7, name=None, rate_limiter=None):
+        self.cookie = cookie
+        self.token = extract_token(cookie)
+        m = re.search(r'(?:^|;\s*)tracknick=([^;]+)', cookie)
+        self.name = name or (m.group(1) if m else self.token[:8] or '未知账号')
+        self.rate_limiter = rate_limiter or RateLimiter(rate)
+        self.requests = 0
+        self.throttled = 0
+        self.auth_failures = 0
+        self.token_refreshes = 0
+        self.consecutive_failures = 0
+        self.quarantines = 0
+        self.quarantined_until = 0.0
+        self._lock = threading.Lock()
+
+    def is_available(self, now=None):
+        """是否未处于隔离期且有token"""
+        return bool(self.token) and (now or time.monotonic()) >= self.quarantined_until
+
+    def refresh_token(self, set_cookie, used_token):
+        """
+        用响应Set-Cookie中下发的新令牌更新该账号的Cookie和token
+        :param used_token: 发出该请求时使用的token
+        :return: 是否已有可用的新token
+        """
+        values = parse_set_cookie_tokens(set_cookie)
+        with self._lock:
+            if self.token != used_token:
+                return True
+            if '_m_h5_tk' not in values:
+                return False
+            cookie = self.cookie
+            for name, value in values.items():
+                cookie = set_cookie_value(cookie, name, value)
+            token = extract_token(cookie)
+            if not token or token == self.token:
+                return False
+            self.cookie, self.token = cookie, token
+            self.token_refreshes += 1
+            return True
+
+
+def load_cookies(path):
+    """
+    从文本文件读取Cookie，每行一个，空行和#开头的行会被忽略
+    :return: Cookie字符串列表
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+class AccountPool:
+    """
+    多账号池：每个账号有独立的速率预算，页面请求分摊到未被隔离的账号上，总速率约为 账号数 × rate
+    账号连续被限流max_failures次、或鉴权失败（令牌无法刷新、非法访问）时自动隔离一段时间，
+    隔离时长随该账号被隔离的次数翻倍；同一个实例可以在多个线程间共享
+    :param cookies: Cookie字符串列表，每个对应一个账号
+    :param rate: 每个账号的请求速率上限（次/秒）
+    :param max_failures: 连续被限流多少次后隔离
+    :param throttle_quarantine: 因限流隔离的基础时长（秒）
+    :param auth_quarantine: 因鉴权失败隔离的基础时长（秒）
+    :param adaptive: 每个账号是否使用AIMD自适应速率（初始为rate，在[min_rate, max_rate]之间调整）
+    :param max_quarantine_wait: 所有账号都被隔离时，最多等待多少秒让最早的账号解除隔离，超过后才放弃该页
+    """
+    def __init__(self, cookies, rate=0.7, max_failures=3, throttle_quarantine=60, auth_quarantine=600,
+                 adaptive=True, min_rate=None, max_rate=None, max_quarantine_wait=300):
+        self.accounts = []
+        for cookie in cookies:
+            if cookie.strip():
+                account = Account(cookie, rate, rate_limiter=make_rate_limiter(rate, adaptive, min_rate, max_rate))
+                if adaptive:
+                    account.rate_limiter.name = f"账号 {account.name} "
+                self.accounts.append(account)
+        if not self.accounts:
+            raise ValueError("账号池中至少需要一个Cookie")
+        self.max_failures = max_failures
+        self.throttle_quarantine = throttle_quarantine
+        self.auth_quarantine = auth_quarantine
+        self.max_quarantine_wait = max_quarantine_wait
+        self._lock = threading.Lock()
+        for account in self.accounts:
+            if not account.token:
+                logger.warning("账号 %s 的Cookie中没有_m_h5_tk，已跳过", account.name)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """从文本文件加载账号池，每行一个Cookie，见load_cookies"""
+        return cls(load_cookies(path), **kwargs)
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def _reserve(self, exclude=None):
+        """
+        选出最早有空闲名额的可用账号并预留一个名额，返回 (账号, 需要等待的秒数)
+        所有账号都被隔离时返回 (None, 距最早解除隔离的秒数)，没有带token的账号时返回 (None, None)
+        """
+        with self._lock:
+            now = time.monotonic()
+            available = [a for a in self.accounts if a.is_available(now)]
+            if exclude is not None and len(available) > 1:
+                available = [a for a in available if a is not exclude]
+            if not available:
+                releases = [a.quarantined_until for a in self.accounts if a.token]
+                return None, (max(0.0, min(releases) - now) if releases else None)
+            account = min(available, key=lambda a: a.rate_limiter.next_available())
+            delay = account.rate_limiter.reserve()
+            account.requests += 1
+        return account, delay
+
+    def acquire(self, exclude=None, control=None):
+        """
+        阻塞等待并返回下一个可用账号；所有账号都被隔离时等到最早的账号解除隔离，
+        累计等待超过max_quarantine_wait或没有带token的账号时返回None
+        :param exclude: 尽量不选的账号（例如刚被限流的账号）
+        :param control: CrawlControl，设置后等待期间可被取消
+        """
+        waited = 0.0
+        while True:
+            account, delay = self._reserve(exclude)
+            if account is None and not self._should_wait(delay, waited):
+                return None
+            if delay > 0:
+                if control is not None:
+                    control.sleep(delay)
+                else:
+                    time.sleep(delay)
+            if account is not None:
+                return account
+            waited += delay
+
+    async def acquire_async(self, exclude=None, control=None):
+        """acquire的协程版本，等待期间不阻塞事件循环"""
+        waited = 0.0
+        while True:
+            account, delay = self._reserve(exclude)
+            if account is None and not self._should_wait(delay, waited):
+                return None
+            if delay > 0:
+                if control is not None:
+                    await control.sleep_async(delay)
+                else:
+                    await asyncio.sleep(delay)
+            if account is not None:
+                return account
+            waited += delay
+
+    def _should_wait(self, delay, waited):
+        """所有账号都被隔离时，是否继续等待最早的账号解除隔离"""
+        if delay is None or waited + delay > self.max_quarantine_wait:
+            logger.error("所有账号均被隔离，已等待 %.0f 秒，放弃本页", waited)
+            return False
+        logger.warning("所有账号均被隔离，等待 %.1f 秒后重试", delay)
+        return True
+
+    def report_success(self, account):
+        with self._lock:
+            account.consecutive_failures = 0
+
+    def report_throttled(self, account):
+        """记录一次限流，连续次数达到上限时隔离该账号"""
+        with self._lock:
+            account.throttled += 1
+            account.consecutive_failures += 1
+            if account.consecutive_failures >= self.max_failures:
+                self._quarantine(account, self.throttle_quarantine, "连续被限流")
+
+    def report_auth_failure(self, account):
+        """记录一次鉴权失败并立即隔离该账号"""
+        with self._lock:
+            account.auth_failures += 1
+            self._quarantine(account, self.auth_quarantine, "鉴权失败")
+
+    def _quarantine(self, account, base, reason):
+        """隔离账号（调用方需持有锁）"""
+        seconds = base * (2 ** min(account.quarantines, 5))
+        account.quarantines += 1
+        account.consecutive_failures = 0
+        account.quarantined_until = time.monotonic() + seconds
+        logger.warning("账号 %s %s，隔离 %.0f 秒", account.name, reason, seconds)
+
+    def current_rate(self):
+        """未被隔离账号的速率之和（次/秒）"""
+        now = time.monotonic()
+        return sum(a.rate_limiter.rate for a in self.accounts if a.is_available(now))
+
+    def available_count(self):
+        """当前未被隔离的账号数"""
+        now = time.monotonic()
+        return sum(1 for a in self.accounts if a.is_available(now))
+
+    def stats(self):
+        """每个账号的请求统计"""
+        now = time.monotonic()
+        return [{
+            'name': a.name,
+            'requests': a.requests,
+            'throttled': a.throttled,
+            'auth_failures': a.auth_failures,
+            'token_refreshes': a.token_refreshes,
+            'quarantines': a.quarantines,
+            'rate': round(a.rate_limiter.rate, 3),
+            'available': a.is_available(now),
+        } for a in self.accounts]
+
+
+class TmallCommentCrawler:
+    def __init__(self, concurrency=3, rate_limit=0.7, transport=None, rate_limiter=None, store=None,
+                 cache=None, base_url=None, accounts=None, adaptive=True, min_rate=None, max_rate=None,
+                 metrics=None, compact=True, projection=None, dedup=None, rate_type="", expression=""):
+        """
+        :param concurrency: 同时在途的最大页面请求数
+        :param rate_limit: 全局请求速率（次/秒），替代原来每页固定的随机休眠；自适应模式下为初始速率
+        :param transport: HTTP传输层，为None时创建默认的HttpTransport；多个爬虫实例可共享同一个传输层
+        :param rate_limiter: 共享的速率预算，提供时忽略rate_limit，用于多个爬虫实例共用一个预算
+        :param store: 本地评论库（tmall_comment_store.CommentStore），设置后每页评论都会入库并记录断点
+        :param cache: 响应缓存（tmall_comment_store.ResponseCache），命中时既不请求网络也不占用速率预算
+        :param base_url: 评论接口地址，为None时使用线上接口；可指向本地模拟接口（tmall_fake_mtop）做测试
+        :param accounts: 多账号池（AccountPool），设置后每个请求从池中选账号签名，
+                         请求节奏由各账号自己的速率预算控制，不再使用rate_limit和默认Cookie
+        :param adaptive: 使用AIMD自适应速率：请求顺利时逐步提速，被限流或出错时减半
+        :param min_rate: 自适应速率下限，默认为min(0.2, rate_limit)
+        :param max_rate: 自适应速率上限，默认为rate_limit的3倍
+        :param metrics: 指标注册表（tmall_comment_metrics.MetricsRegistry），为None时新建；
+                        多个爬虫实例可共享同一个注册表，指标合并累计
+        :param compact: 解析后立即把评论转换为紧凑的CommentRecord（tmall_comment_record），
+                        常驻内存约为原始字典的十分之一；为False时保留接口返回的原始字典
+        :param projection: 字段投影（tmall_comment_record.Projection或字段路径列表），设置后解析时只保留这些字段，
+                           导出时也只输出这些字段；设置了store时入库的也是投影后的评论
+        :param dedup: 评论ID去重索引（tmall_comment_dedup.DedupIndex），设置后每页到达时丢弃已见过的评论，
+                      同一个索引可在多次爬取（如两种排序方式）和多个爬虫实例之间共享；为None时不去重。
+                      新评论的ID在入库或调用commit_dedup后才写入索引文件
+        :param rate_type: 评价类型筛选（tmall_comment_coverage.RATE_TYPES中的值，如"1"为好评），为空表示全部
+        :param expression: 标签筛选表达式（见tmall_comment_coverage.tag_expression），为空表示不按标签筛选；
+                           设置筛选条件后每个组合各有自己的页数上限，分片覆盖爬取见tmall_comment_coverage
+        """
+        self.concurrency = max(1, int(concurrency))
+        if rate_limiter is None:
+            rate_limiter = make_rate_limiter(rate_limit, adaptive, min_rate, max_rate)
+        self.rate_limiter = rate_limiter
+        self.transport = transport or HttpTransport(pool_size=max(10, self.concurrency))
+        self.failed_pages = []  # 最近一次爬取中重试后仍失败的页码
+        self.pages_fetched = 0  # 最近一次爬取中请求的页数
+        self.dedup_keys = {}  # 页码 -> 该页新加入去重索引、尚未提交的评论ID，见commit_dedup
+        self.store = store
+        self.cache = cache
+        self.accounts = accounts
+        self.metrics = CrawlMetrics(metrics)
+        self.compact = compact
+        self.shared_values = ValuePool()  # 本次爬取中记录共享的低基数值，爬取结束时清空
+        if projection is not None and not isinstance(projection, Projection):
+            projection = Projection(projection)
+        self.projection = projection
+        self.dedup = dedup
+        self.rate_type = rate_type or ""
+        self.expression = expression or ""
+        self.control = CrawlControl()  # 暂停、继续和取消，可以从其他线程调用
+        self.cancelled = False  # 最近一次爬取是否被取消
         self.headers = {
             'Accept-Encoding': 'gzip, deflate, br',
             'Cache-Control': 'no-cache',
@@ -30,161 +696,689 @@ class TmallCommentCrawler:
             'sec-fetch-site': 'same-site',
             'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36 Edg/136.0.0.0'
         }
-        self.base_url = 'https://h5api.m.tmall.com/h5/mtop.taobao.rate.detaillist.get/6.0/'
+        self.set_base_url(base_url or DEFAULT_BASE_URL)
         self.last_error = ""  # 存储最后一次错误信息
+        self.token_refreshes = 0  # 根据响应自动刷新令牌的次数
+        self._token_lock = threading.Lock()
         
         # 从Cookie中提取token进行签名计算
         self._extract_token_from_cookie()
         
+    def set_base_url(self, base_url):
+        """设置评论接口地址，Host请求头随之更新"""
+        self.base_url = base_url
+        self.headers['Host'] = urlparse(base_url).netloc
+
+    def set_cookie(self, cookie):
+        """使用自定义Cookie替换默认Cookie，并重新提取token"""
+        self.headers['Cookie'] = cookie
+        self._extract_token_from_cookie()
+
     def _extract_token_from_cookie(self):
         """从Cookie中提取token用于签名计算"""
-        cookie_str = self.headers['Cookie']
-        self.token = ''
-        
         # 尝试提取_m_h5_tk
-        m = re.search(r'_m_h5_tk=([^_]+)_', cookie_str)
-        if m:
-            self.token = m.group(1)
-            print(f"已从Cookie中提取token: {self.token}")
+        self.token = extract_token(self.headers['Cookie'])
+        if self.token:
+            logger.info("已从Cookie中提取token: %s", self.token)
         else:
-            print("警告: 无法从Cookie中提取token，签名可能无效")
+            logger.warning("无法从Cookie中提取token，签名可能无效")
+
+    def _refresh_token(self, response, used_token):
+        """
+        令牌过期时，用响应Set-Cookie中下发的_m_h5_tk / _m_h5_tk_enc更新Cookie和token
+        :param used_token: 发出该请求时使用的token
+        :return: 是否已有可用的新token（本次更新的，或其他并发请求已经更新过的）
+        """
+        values = parse_set_cookie_tokens(response.headers.get('Set-Cookie', ''))
+        with self._token_lock:
+            if self.token != used_token:
+                # 其他并发请求已经刷新过令牌
+                return True
+            if '_m_h5_tk' not in values:
+                return False
+            cookie = self.headers['Cookie']
+            for name, value in values.items():
+                cookie = set_cookie_value(cookie, name, value)
+            self.headers['Cookie'] = cookie
+            old_token = self.token
+            self._extract_token_from_cookie()
+            if self.token == old_token:
+                return False
+            self.token_refreshes += 1
+            return True
         
-    def get_comments(self, item_id, start_page=1, end_page=5, order_type="", progress_callback=None):
+    def get_comments(self, item_id, start_page=1, end_page=5, order_type="", progress_callback=None,
+                     auto_pages=False, plan_callback=None, incremental=False, resume=False, rate_callback=None,
+                     page_callback=None):
         """
-        获取商品评论
+        获取商品评论（同步接口，内部使用异步并发抓取）
         :param item_id: 商品ID
         :param start_page: 起始页码，默认为第1页
-        :param end_page: 结束页码，默认为第5页
+        :param end_page: 结束页码，默认为第5页；自动分页模式下作为页数上限，为None表示不设上限
         :param order_type: 排序方式，为空表示默认排序，"feedbackdate"表示按时间排序
         :param progress_callback: 进度回调函数，接收一个0-100的整数参数
-        :return: 评论数据列表
+        :param auto_pages: 自动分页模式，先读取起始页返回的totalPage确定实际页数，
+                           遇到hasNext为"false"或空的rateList时停止，不再请求多余的页面
+        :param plan_callback: 自动分页模式下确定实际结束页码后调用，参数为结束页码
+        :param incremental: 增量模式（需要设置store），强制按时间排序，遇到已入库的评论即停止，
+                            只返回新增评论
+        :param resume: 断点续爬（需要设置store），已完成的页面从本地库读取，从断点的下一页继续请求
+        :param rate_callback: 每完成一页调用一次，参数为当前请求速率（次/秒），与progress_callback同时调用
+        :param page_callback: 按页码顺序每交付一页调用一次，参数为 (页码, 该页评论列表)，用于边爬边显示
+        :return: 评论数据列表；通过control取消时为取消前已交付页面的评论
+        已有运行中的事件循环时（如在协程中调用）在工作线程中运行，见run_coroutine
+        """
+        return run_coroutine(self.get_comments_async(
+            item_id, start_page, end_page, order_type, progress_callback,
+            auto_pages=auto_pages, plan_callback=plan_callback, incremental=incremental, resume=resume,
+            rate_callback=rate_callback, page_callback=page_callback
+        ))
+
+    async def get_comments_async(self, item_id, start_page=1, end_page=5, order_type="", progress_callback=None,
+                                 **options):
+        """
+        并发获取商品评论，同时在途的页面数由concurrency控制，请求节奏由全局速率预算控制
+        参数含义与get_comments相同，返回的评论按页码顺序排列
         """
         all_comments = []
-        total_pages = end_page - start_page + 1
-        
-        for i, page in enumerate(range(start_page, end_page + 1)):
-            # 更新进度
-            if progress_callback:
-                progress = int((i / total_pages) * 100)
-                progress_callback(progress)
-            
-            print(f"正在爬取第 {page} 页评论...")
-            
-            # 构建API请求参数
-            timestamp = int(time.time() * 1000)
-            
-            data = {
-                "showTrueCount": False,
-                "auctionNumId": str(item_id),
-                "pageNo": page,
-                "pageSize": 20,
-                "rateType": "",
-                "searchImpr": "-8",
-                "orderType": order_type,
-                "expression": "",
-                "rateSrc": "pc_rate_list"
-            }
-            
-            # 使用正确的方式生成签名
-            data_str = json.dumps(data)
-            sign = self._generate_sign(timestamp, data_str)
-            
-            # 设置最后一次错误为空
-            self.last_error = ""
-            
-            params = {
-                'jsv': '2.7.4',
-                'appKey': '12574478',
-                't': timestamp,
-                'sign': sign,
-                'api': 'mtop.taobao.rate.detaillist.get',
-                'v': '6.0',
-                'isSec': 0,
-                'ecode': 1,
-                'timeout': 20000,
-                'type': 'jsonp',
-                'dataType': 'jsonp',
-                'jsonpIncPrefix': 'pcdetail',
-                'callback': f'mtopjsonppcdetail{random.randint(10, 99)}',
-                'data': data_str
-            }
-            
+        await self._crawl_pages_async(
+            item_id, start_page, end_page, order_type, progress_callback,
+            on_page=lambda page, comments: all_comments.extend(comments), **options
+        )
+        return all_comments
+
+    def iter_comments(self, item_id, start_page=1, end_page=5, order_type="", progress_callback=None, **options):
+        """
+        流式获取商品评论，每抓完一页就按页码顺序产出一次，不在内存中累积全部评论
+        抓取在后台线程中进行，消费者处理过慢时后台会暂停调度新的页面
+        参数含义与get_comments相同
+        :return: 生成器，每次产出 (页码, 该页评论列表)
+        """
+        pages = queue.Queue(maxsize=self.concurrency)
+        stopped = threading.Event()
+        done = object()
+        errors = []
+
+        def on_page(page, comments):
+            # 消费者处理不过来时在这里阻塞，从而限制内存中的页面数
+            while not stopped.is_set():
+                try:
+                    pages.put((page, comments), timeout=0.2)
+                    return
+                except queue.Full:
+                    continue
+            raise _CrawlStopped()
+
+        def produce():
             try:
-                response = requests.get(self.base_url, params=params, headers=self.headers)
-                response.raise_for_status()
-                
-                # 解析JSONP响应
+                run_coroutine(self._crawl_pages_async(
+                    item_id, start_page, end_page, order_type, progress_callback, on_page, **options
+                ))
+            except _CrawlStopped:
+                pass
+            except Exception as e:
+                errors.append(e)
+            finally:
+                pages.put(done)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = pages.get()
+                if item is done:
+                    break
+                yield item
+        finally:
+            # 消费者提前结束时通知后台线程停止
+            stopped.set()
+            while producer.is_alive():
                 try:
-                    json_str = re.search(r'mtopjsonppcdetail\d+\((.*)\)', response.text).group(1)
-                    result = json.loads(json_str)
-                    
-                    # 检查API调用是否成功
-                    if "SUCCESS" in result.get('ret', [''])[0]:
-                        # 提取评论数据
-                        if 'data' in result and 'rateList' in result['data']:
-                            comments = result['data']['rateList']
-                            all_comments.extend(comments)
-                            print(f"成功获取第 {page} 页的 {len(comments)} 条评论")
-                        else:
-                            print(f"第 {page} 页没有找到评论数据")
+                    pages.get(timeout=0.2)
+                except queue.Empty:
+                    pass
+            producer.join()
+        if errors:
+            raise errors[0]
+
+    def crawl_to_file(self, item_id, output_file, start_page=1, end_page=5, order_type="",
+                      progress_callback=None, filter_empty_comments=False, **options):
+        """
+        边爬取边写盘，每页评论到达后立即追加到文件（.csv / .jsonl / .parquet / .xlsx，见open_sink），
+        内存峰值只与单页大小有关，中途崩溃时已写入的页面也不会丢失（xlsx在关闭时才生成，崩溃时只留下临时文件）
+        其余参数含义与get_comments相同
+        :return: 写入的评论行数
+        """
+        fields = self.projection.fields if self.projection is not None else None
+        sink = open_sink(output_file, filter_empty_comments, fields)
+        written = []
+        pages = self.iter_comments(item_id, start_page, end_page, order_type, progress_callback, **options)
+        try:
+            for page, comments in pages:
+                sink.write_page(comments)
+                written.append(page)
+        finally:
+            # 先停止后台爬取，不再有新交付的页面；中途出错时已写入的页面仍在文件中，提交它们的评论ID，
+            # 文件未能正常关闭时全部撤销
+            pages.close()
+            try:
+                sink.close()
+            except BaseException:
+                self.discard_dedup()
+                raise
+            self.commit_dedup(written)
+            self.discard_dedup()
+        logger.info("评论数据已保存到 %s，共 %d 条", output_file, sink.rows_written)
+        if filter_empty_comments and sink.filtered_count > 0:
+            logger.info("已过滤 %d 条空评价", sink.filtered_count)
+        return sink.rows_written
+
+    async def _crawl_pages_async(self, item_id, start_page, end_page, order_type="", progress_callback=None,
+                                 on_page=None, auto_pages=False, plan_callback=None, incremental=False, resume=False,
+                                 rate_callback=None, page_callback=None):
+        """
+        并发抓取引擎：按页码顺序对每一页调用on_page(页码, 评论列表)
+        只提前调度有限个页面（滑动窗口），已完成但尚未交付的页面数量有上限
+        通过self.control取消时停止调度，已交付的页面保留，未交付的页面不入库也不推进断点
+        """
+        self.last_error = ""
+        self.cancelled = False
+        self.failed_pages = []
+        self.page_info = {}
+        self.pages_fetched = 0
+        self.pages_delivered = 0  # 已按页码顺序交付的页数
+        self.dedup_checked = 0  # 经过去重索引检查的评论数
+        self.duplicates = 0  # 去重索引丢弃的重复评论数
+        self.dedup_keys = {}
+        self.planned_end_page = end_page
+
+        if (incremental or resume) and self.store is None:
+            raise ValueError("增量模式和断点续爬需要先设置store（本地评论库）")
+        if incremental and order_type != "feedbackdate":
+            logger.info("增量模式需要按时间排序，已切换为时间排序")
+            order_type = "feedbackdate"
+        store_order = self._store_order(order_type)
+
+        if resume:
+            # 断点之前的页面直接从本地库还原，不再请求
+            last_page = self.store.get_checkpoint(item_id, store_order)
+            if last_page >= start_page:
+                restore_end = min(last_page, end_page) if end_page else last_page
+                restored = 0
+                for page, comments in self.store.iter_pages(item_id, store_order, start_page, restore_end):
+                    comments = self._to_comments(comments)
+                    restored += len(comments)
+                    if self.dedup is not None:
+                        # 还原的页面已在上次去重过，只把ID加入索引，供之后的页面和排序方式去重
+                        for comment in comments:
+                            self.dedup.add(comment.get('id', ''))
+                    if on_page:
+                        on_page(page, comments)
+                logger.info("从断点续爬：第 %d - %d 页已完成（%d 条评论）", start_page, restore_end, restored)
+                start_page = restore_end + 1
+                if end_page and start_page > end_page:
+                    if progress_callback:
+                        progress_callback(100)
+                    return
+        elif self.store is not None:
+            self.store.set_checkpoint(item_id, store_order, start_page - 1)
+
+        checkpoint_ok = True
+
+        def deliver(page, comments):
+            """入库并交付一页，返回是否应停止翻页"""
+            nonlocal checkpoint_ok
+            stop = False
+            failed = page in self.failed_pages
+            if self.store is not None and incremental and not failed:
+                known = self.store.known_ids(item_id, [c.get('id') for c in comments])
+                if known:
+                    comments = [c for c in comments if str(c.get('id')) not in known]
+                    logger.info("第 %d 页遇到已入库的评论，增量爬取结束", page)
+                    stop = True
+            if self.dedup is not None and comments:
+                # 增量判断之后再去重，否则已见过的评论被提前丢弃，增量模式无法停止
+                added = []
+                kept = self.dedup.filter(comments, added)
+                if added:
+                    self.dedup_keys[page] = added
+                self.dedup_checked += len(comments)
+                if len(kept) < len(comments):
+                    self.duplicates += len(comments) - len(kept)
+                    self.metrics.duplicates.inc(len(comments) - len(kept))
+                    logger.debug("第 %d 页丢弃 %d 条重复评论", page, len(comments) - len(kept))
+                comments = kept
+            if self.store is not None:
+                # 出现失败页后断点不再前进，保证断点之前的页面都完整
+                checkpoint_ok = checkpoint_ok and not failed
+                self.store.add_page(item_id, store_order, page, comments, checkpoint_ok)
+                if self.dedup is not None:
+                    # 已入库即已提交
+                    self.dedup.commit(self.dedup_keys.pop(page, ()))
+            # 去重和入库之后计数，取消时未交付的页面不计入
+            self.metrics.comments.inc(len(comments))
+            if on_page:
+                on_page(page, comments)
+            if page_callback:
+                page_callback(page, comments)
+            self.pages_delivered += 1
+            return stop
+
+        if progress_callback:
+            progress_callback(0)
+
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        window = self.concurrency * 2
+        # 增量模式需要最新数据，不读缓存
+        use_cache = self.cache is not None and not incremental
+        total_pages = max(1, (end_page or start_page) - start_page + 1)
+        finished = 0
+        metrics = self.metrics
+        control = self.control
+
+        async def fetch(page):
+            nonlocal finished
+            async with semaphore:
+                await control.checkpoint_async()
+                cached = self._load_cached_page(item_id, page, order_type) if use_cache else None
+                if cached is not None:
+                    comments, data = cached
+                else:
+                    waited = time.monotonic()
+                    if self.accounts is not None:
+                        # 多账号模式：由账号池选出最早有空闲名额的账号
+                        account = await self.accounts.acquire_async(control=control)
                     else:
-                        error_msg = f"API调用失败: {result.get('ret')}"
-                        print(error_msg)
-                        print(f"响应内容: {response.text[:200]}...")
-                        self.last_error = error_msg
-                        
-                        # 如果是鉴权问题，尝试更新Cookie
-                        if "FAIL_SYS_TOKEN_EMPTY" in response.text or "FAIL_SYS_ILLEGAL_ACCESS" in response.text:
-                            auth_error = "鉴权失败，请更新Cookie和token"
-                            print(auth_error)
-                            self.last_error = auth_error
-                        
-                except Exception as e:
-                    error_msg = f"解析第 {page} 页响应时出错: {e}"
-                    print(error_msg)
-                    print(f"响应内容: {response.text[:200]}...")
-                    self.last_error = error_msg
-                
-                # 防止请求过快
-                time.sleep(random.uniform(1, 2))
-                
-            except Exception as e:
-                error_msg = f"爬取第 {page} 页评论时出错: {e}"
-                print(error_msg)
-                self.last_error = error_msg
-                continue
-        
+                        account = None
+                        await self.rate_limiter.acquire_async(control)
+                    metrics.sleep_seconds.inc(time.monotonic() - waited, reason='rate_limit')
+                    if self.accounts is not None and account is None:
+                        comments, data = self._page_failed(page, "所有账号均已被隔离，无法继续请求")
+                    else:
+                        metrics.inflight.inc()
+                        try:
+                            comments, data = await loop.run_in_executor(
+                                executor, self._fetch_page, item_id, page, order_type, account
+                            )
+                        finally:
+                            metrics.inflight.dec()
+            finished += 1
+            self.pages_fetched = finished
+            status = 'cached' if cached is not None else 'failed' if page in self.failed_pages else 'ok'
+            metrics.pages.inc(status=status)
+            metrics.rate.set(self.current_rate())
+            if progress_callback:
+                progress_callback(min(100, int((finished / total_pages) * 100)))
+            if rate_callback:
+                rate_callback(self.current_rate())
+            return comments, data
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                if auto_pages:
+                    # 先单独请求起始页，根据其中的分页信息规划实际页数
+                    comments, data = await fetch(start_page)
+                    self.page_info = {key: data.get(key) for key in PAGE_INFO_KEYS if key in data}
+                    end_page = self._plan_end_page(start_page, end_page, data)
+                    self.planned_end_page = end_page
+                    total_pages = end_page - start_page + 1
+                    logger.info("评论总数 %s，共 %s 页，计划爬取第 %d - %d 页",
+                                data.get('total', '未知'), data.get('totalPage', '未知'), start_page, end_page)
+                    if plan_callback:
+                        plan_callback(end_page)
+                    if deliver(start_page, comments) or self._is_last_page(start_page, comments, data):
+                        end_page = start_page
+                    start_page += 1
+
+                pages = list(range(start_page, (end_page or 0) + 1))
+                pending = collections.deque()
+                next_index = 0
+                try:
+                    while next_index < len(pages) or pending:
+                        while next_index < len(pages) and len(pending) < window:
+                            page = pages[next_index]
+                            pending.append((page, asyncio.ensure_future(fetch(page))))
+                            next_index += 1
+                        # 按页码顺序交付，保证评论仍按页码排列
+                        page, task = pending.popleft()
+                        comments, data = await task
+                        if deliver(page, comments):
+                            break
+                        if auto_pages and self._is_last_page(page, comments, data):
+                            logger.info("第 %d 页已是最后一页，停止翻页", page)
+                            break
+                finally:
+                    for _, task in pending:
+                        task.cancel()
+                    # 取回已结束任务的异常（如CrawlCancelled），避免"exception was never retrieved"警告
+                    await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+        except CrawlCancelled:
+            # 取消时尚未交付的页面已在上面的finally中取消
+            self.cancelled = True
+            logger.info("爬取已取消，已交付 %d 页", self.pages_delivered)
+            return
+        finally:
+            self._finish_dedup()
+            self.shared_values.clear()
+
         # 完成所有爬取后，将进度设置为100%
         if progress_callback:
             progress_callback(100)
-            
-        return all_comments
+
+    def _finish_dedup(self):
+        """报告本次爬取的重复率；已入库页面的评论ID已提交，把它们写回索引文件"""
+        if self.dedup is None:
+            return
+        if self.dedup_checked:
+            logger.info("去重: 本次 %d 条评论中重复 %d 条（%.1f%%），索引中共 %d 个评论ID", self.dedup_checked,
+                        self.duplicates, self.duplicates / self.dedup_checked * 100, len(self.dedup))
+        if self.store is not None:
+            self._save_dedup()
+
+    def _save_dedup(self):
+        try:
+            self.dedup.save()
+        except OSError as e:
+            logger.error("保存评论ID索引失败: %s", e)
+
+    def commit_dedup(self, pages=None):
+        """
+        评论写入输出文件后调用：提交这些页面新加入去重索引的评论ID并写回索引文件，
+        之后的运行不再输出这些评论。get_comments / iter_comments的调用方在保存成功后调用，
+        保存失败时调用discard_dedup
+        :param pages: 已写入的页码，为None时为本次爬取交付的全部页面
+        """
+        if self.dedup is None:
+            return
+        pages = list(self.dedup_keys) if pages is None else pages
+        self.dedup.commit([key for page in pages for key in self.dedup_keys.pop(page, ())])
+        self._save_dedup()
+
+    def discard_dedup(self):
+        """撤销尚未提交的页面新加入去重索引的评论ID，下次运行时这些评论仍会输出"""
+        if self.dedup is None:
+            return
+        self.dedup.rollback([key for keys in self.dedup_keys.values() for key in keys])
+        self.dedup_keys = {}
+
+    def current_rate(self):
+        """当前请求速率（次/秒），多账号模式下为可用账号的速率之和"""
+        if self.accounts is not None:
+            return self.accounts.current_rate()
+        return self.rate_limiter.rate
+
+    @staticmethod
+    def _plan_end_page(start_page, end_page, data):
+        """根据起始页返回的totalPage规划结束页码，end_page为上限（None表示不限）"""
+        try:
+            total_page = int(data.get('totalPage'))
+        except (TypeError, ValueError):
+            # 起始页失败或没有分页信息时，无法规划页数
+            return end_page or start_page
+        if end_page:
+            return max(start_page, min(total_page, end_page))
+        return max(start_page, total_page)
+
+    def _is_last_page(self, page, comments, data):
+        """成功返回的页面中hasNext为"false"或rateList为空时视为最后一页"""
+        if page in self.failed_pages:
+            return False
+        return data.get('hasNext') == 'false' or not comments
+
+    def _store_order(self, order_type):
+        """本地库中页面和断点按排序方式区分，设置了筛选条件时附加筛选条件，避免与不筛选的页面混在一起"""
+        if not self.rate_type and not self.expression:
+            return order_type
+        return f"{order_type}|rateType={self.rate_type}|expression={self.expression}"
+
+    def _build_data(self, item_id, page, order_type=""):
+        """构建单页请求的data参数，包含爬虫的评价类型和标签筛选条件"""
+        return {
+            "showTrueCount": False,
+            "auctionNumId": str(item_id),
+            "pageNo": page,
+            "pageSize": 20,
+            "rateType": self.rate_type,
+            "searchImpr": "-8",
+            "orderType": order_type,
+            "expression": self.expression,
+            "rateSrc": "pc_rate_list"
+        }
+
+    def _build_params(self, item_id, page, order_type="", token=None):
+        """
+        构建单页请求的API参数，并使用_generate_sign签名
+        :param token: 签名用的token，为None时使用当前Cookie的token
+        """
+        timestamp = int(time.time() * 1000)
+        data = self._build_data(item_id, page, order_type)
+
+        # 使用正确的方式生成签名
+        data_str = json.dumps(data)
+        sign = self._generate_sign(timestamp, data_str, token)
+
+        return {
+            'jsv': '2.7.4',
+            'appKey': '12574478',
+            't': timestamp,
+            'sign': sign,
+            'api': 'mtop.taobao.rate.detaillist.get',
+            'v': '6.0',
+            'isSec': 0,
+            'ecode': 1,
+            'timeout': 20000,
+            'type': 'jsonp',
+            'dataType': 'jsonp',
+            'jsonpIncPrefix': 'pcdetail',
+            'callback': f'mtopjsonppcdetail{random.randint(10, 99)}',
+            'data': data_str
+        }
+
+    def _fetch_page(self, item_id, page, order_type="", account=None):
+        """
+        请求并解析单页评论，网络错误和限流按退避策略重试，最终失败时记录last_error并返回空列表
+        :param account: 多账号模式下本次请求使用的账号，被限流或鉴权失败时换用池中的其他账号重试
+        :return: (该页的评论数据列表, 响应中的data字典)，失败时data为空字典
+        """
+        logger.debug("正在爬取第 %d 页评论...", page)
+        metrics = self.metrics
+
+        for attempt in range(self.transport.max_retries + 1):
+            # 暂停时在这里等待，取消时抛出CrawlCancelled
+            self.control.checkpoint()
+            # 每次重试都重新生成时间戳和签名
+            if account is not None:
+                used_token, headers = account.token, dict(self.headers, Cookie=account.cookie)
+                limiter = account.rate_limiter
+            else:
+                used_token, headers = self.token, self.headers
+                limiter = self.rate_limiter
+            params = self._build_params(item_id, page, order_type, used_token)
+            can_retry = attempt < self.transport.max_retries
+
+            started = time.monotonic()
+            try:
+                response = self.transport.get(self.base_url, params=params, headers=headers, metrics=metrics,
+                                              control=self.control)
+            except CrawlCancelled:
+                raise
+            except Exception as e:
+                metrics.requests.inc(ret='NETWORK_ERROR')
+                metrics.request_seconds.observe(time.monotonic() - started)
+                limiter.on_error()
+                error_msg = f"爬取第 {page} 页评论时出错: {e}"
+                logger.error(error_msg)
+                self.last_error = error_msg
+                break
+            latency = time.monotonic() - started
+            metrics.request_seconds.observe(latency)
+            metrics.response_bytes.inc(len(response.content))
+            metrics.response_size.observe(len(response.content))
+
+            # 解析JSONP响应
+            try:
+                parse_started = time.monotonic()
+                try:
+                    result = parse_jsonp(response.content)
+                except Exception:
+                    metrics.requests.inc(ret='PARSE_ERROR')
+                    raise
+                finally:
+                    metrics.parse_seconds.observe(time.monotonic() - parse_started)
+                ret = result.get('ret', [''])[0]
+                metrics.requests.inc(ret=ret_code(ret))
+
+                # 检查API调用是否成功
+                if "SUCCESS" in ret:
+                    limiter.on_success(latency)
+                    if account is not None:
+                        self.accounts.report_success(account)
+                    if self.cache is not None:
+                        self.cache.put(self.cache.make_key(self._build_data(item_id, page, order_type)),
+                                       response.content)
+                    data = result.get('data') or {}
+                    # 提取评论数据
+                    if 'rateList' in data:
+                        comments = self._to_comments(data['rateList'])
+                        logger.info("成功获取第 %d 页的 %d 条评论", page, len(comments))
+                        return comments, data
+                    logger.warning("第 %d 页没有找到评论数据", page)
+                    return [], data
+
+                # 令牌过期时从响应中更新令牌，重新签名后立即重试同一页
+                if is_token_expired(ret) and can_retry:
+                    if account is not None:
+                        refreshed = account.refresh_token(response.headers.get('Set-Cookie', ''), used_token)
+                    else:
+                        refreshed = self._refresh_token(response, used_token)
+                    if refreshed:
+                        logger.info("第 %d 页令牌过期(%s)，已更新令牌，重新签名后重试...", page, ret)
+                        metrics.retries.inc(reason='token_expired')
+                        continue
+
+                # 被限流时降低速率，退避后重试同一页
+                if is_throttled(ret):
+                    limiter.on_throttle()
+                if is_throttled(ret) and can_retry:
+                    if account is not None:
+                        # 多账号模式：优先换用其他账号立即重试
+                        self.accounts.report_throttled(account)
+                        next_account = self.accounts.acquire(exclude=account, control=self.control)
+                        if next_account is None:
+                            self.last_error = "所有账号均已被隔离，无法继续请求"
+                            logger.error(self.last_error)
+                            break
+                        if next_account is not account:
+                            logger.warning("第 %d 页账号 %s 被限流(%s)，换用账号 %s 重试...", page, account.name, ret,
+                                           next_account.name)
+                            metrics.retries.inc(reason='account_switch')
+                            account = next_account
+                            continue
+                    wait = self.transport.backoff(attempt)
+                    logger.warning("第 %d 页被限流(%s)，%.1f 秒后重试...", page, ret, wait)
+                    metrics.retries.inc(reason='throttled')
+                    metrics.sleep_seconds.inc(wait, reason='throttle_backoff')
+                    self.control.sleep(wait)
+                    if account is None:
+                        # 重试同样占用速率预算
+                        waited = time.monotonic()
+                        limiter.acquire(self.control)
+                        metrics.sleep_seconds.inc(time.monotonic() - waited, reason='rate_limit')
+                    continue
+
+                error_msg = f"API调用失败: {result.get('ret')}"
+                logger.error(error_msg)
+                logger.debug("响应内容: %s...", response.text[:200])
+                self.last_error = error_msg
+
+                # 如果是鉴权问题，尝试更新Cookie
+                if is_token_expired(ret) or "FAIL_SYS_ILLEGAL_ACCESS" in ret:
+                    if account is not None:
+                        # 多账号模式：隔离该账号，换用其他账号重试
+                        self.accounts.report_auth_failure(account)
+                        next_account = None
+                        if can_retry:
+                            next_account = self.accounts.acquire(exclude=account, control=self.control)
+                        if next_account is not None and next_account is not account:
+                            logger.warning("第 %d 页账号 %s 鉴权失败，换用账号 %s 重试...", page, account.name,
+                                           next_account.name)
+                            metrics.retries.inc(reason='auth_failure')
+                            account = next_account
+                            continue
+                    auth_error = "鉴权失败，请更新Cookie和token"
+                    logger.error(auth_error)
+                    self.last_error = auth_error
+
+            except CrawlCancelled:
+                # 限流退避和换账号等待期间被取消，不是解析错误
+                raise
+            except Exception as e:
+                error_msg = f"解析第 {page} 页响应时出错: {e}"
+                logger.error(error_msg)
+                logger.debug("响应内容: %s...", response.text[:200])
+                self.last_error = error_msg
+            break
+
+        # 记录失败页码，便于只补抓这些页而不必整体重爬
+        self.failed_pages.append(page)
+        return [], {}
+
+    def _page_failed(self, page, error_msg):
+        """不发请求直接把一页记为失败"""
+        logger.error("第 %d 页未请求: %s", page, error_msg)
+        self.last_error = error_msg
+        self.failed_pages.append(page)
+        return [], {}
     
-    def _generate_sign(self, timestamp, data_str):
+    def _to_comments(self, comments):
+        """compact模式下把一页评论字典转换为CommentRecord列表，设置了字段投影时只保留投影的字段"""
+        if self.compact:
+            return to_records(comments, self.projection, self.shared_values)
+        if self.projection is not None:
+            return [self.projection.apply(c) for c in comments]
+        return comments
+
+    def _load_cached_page(self, item_id, page, order_type=""):
+        """
+        从响应缓存读取一页
+        :return: (该页的评论数据列表, 响应中的data字典)，未命中时返回None
+        """
+        body = self.cache.get(self.cache.make_key(self._build_data(item_id, page, order_type)))
+        if body is None:
+            return None
+        try:
+            data = parse_jsonp(body).get('data') or {}
+        except Exception:
+            return None
+        comments = self._to_comments(data.get('rateList', []))
+        logger.info("第 %d 页命中缓存，%d 条评论", page, len(comments))
+        return comments, data
+
+    def _generate_sign(self, timestamp, data_str, token=None):
         """
         根据天猫的签名算法生成正确的sign
         签名公式: md5(token + "&" + timestamp + "&" + appKey + "&" + data)
+        :param token: 签名用的token，为None时使用当前Cookie的token
         """
-        if not self.token:
+        token = self.token if token is None else token
+        if not token:
             # 如果没有token，返回一个随机签名（将无法正常工作）
             return hashlib.md5(str(random.random()).encode('utf-8')).hexdigest()
             
         # 正确的签名计算
-        sign_str = f"{self.token}&{timestamp}&12574478&{data_str}"
+        sign_str = f"{token}&{timestamp}&12574478&{data_str}"
         return hashlib.md5(sign_str.encode('utf-8')).hexdigest()
     
-    def save_to_excel(self, comments, output_file=None, filter_empty_comments=False):
+    @staticmethod
+    def default_output_file(comments, ext='.xlsx', count=None):
         """
-        将评论数据保存到Excel文件
-        :param comments: 评论数据列表
-        :param output_file: 输出文件名，若为None则自动生成
-        :param filter_empty_comments: 是否过滤掉空评价（"此用户没有填写评价。"）
+        根据爬取内容生成输出文件名：商品ID_商品标题_评论数量_日期+扩展名
+        :param comments: 评论数据列表，边爬边写盘时可以只传第一条评论
+        :param ext: 文件扩展名
+        :param count: 评论数量，为None时为len(comments)
         """
-        # 提取所有可能的字段
-        data = []
-        
-        # 如果未指定输出文件名，则根据爬取内容自动生成
-        if output_file is None and comments:
+        if comments:
             # 获取商品ID和商品标题
             item_id = comments[0].get('auctionNumId', '')
             item_title = comments[0].get('auctionTitle', '')
@@ -197,129 +1391,327 @@ class TmallCommentCrawler:
                 if len(item_title) > 30:
                     item_title = item_title[:30] + '...'
             
-            # 生成文件名：商品ID_商品标题_评论数量_日期.xlsx
             current_date = time.strftime("%Y%m%d_%H%M%S", time.localtime())
-            output_file = f"{item_id}_{item_title}_{len(comments)}条评论_{current_date}.xlsx"
-        
-        # 如果仍然没有文件名（如评论为空），使用默认文件名
-        if not output_file:
-            output_file = f"天猫商品评论_{time.strftime('%Y%m%d%H%M%S', time.localtime())}.xlsx"
-        
-        # 记录过滤掉的空评价数量
-        filtered_count = 0
-        
-        for comment in comments:
-            try:
-                # 获取评论内容
-                feedback = comment.get('feedback', '')
-                
-                # 如果启用了空评价过滤，且评论内容为"此用户没有填写评价。"，则跳过
-                if filter_empty_comments and feedback == "此用户没有填写评价。":
-                    filtered_count += 1
-                    continue
-                
-                # 创建一个全面的评论数据字典
-                item = {
-                    # 基本信息
-                    '用户昵称': comment.get('userNick', ''),
-                    '评论内容': feedback,
-                    '评论时间': comment.get('createTime', ''),
-                    '评论时间间隔': comment.get('createTimeInterval', ''),
-                    '评价日期': comment.get('feedbackDate', ''),
-                    '评论ID': comment.get('id', ''),
-                    '商品ID': comment.get('auctionNumId', ''),
-                    '商品标题': comment.get('auctionTitle', ''),
-                    'SKUID': comment.get('skuId', ''),
-                    
-                    # 商品规格
-                    '商品规格': ', '.join([f"{k}: {v}" for k, v in comment.get('skuMap', {}).items()]) if comment.get('skuMap') else '',
-                    '规格字符串': comment.get('skuValueStr', ''),
-                    
-                    # 评价相关
-                    '评价类型': "好评" if comment.get('rateType') == "1" else ("中评" if comment.get('rateType') == "0" else "差评"),
-                    '是否匿名': "是" if comment.get('annoy') == "1" else "否",
-                    '是否置顶': "是" if comment.get('topRate') == "1" else "否",
-                    '是否有详情': "是" if comment.get('hasDetail') == "1" else "否",
-                    '是否复购': "是" if comment.get('repeatBusiness') == "1" else "否",
-                    '是否金牌用户': "是" if comment.get('goldUser') == "1" else "否",
-                    '是否黑名单用户': "是" if comment.get('formalBlackUser') == "true" else "否",
-                    '是否复制': "是" if comment.get('copy') == "true" else "否",
-                    '是否本人': "是" if comment.get('own') == "true" else "否",
-                    '结构标签结束大小': comment.get('structTagEndSize', ''),
-                    
-                    # 互动信息
-                    '点赞数': comment.get('interactInfo', {}).get('likeCount', 0),
-                    '评论数': comment.get('interactInfo', {}).get('commentCount', 0),
-                    '阅读数': comment.get('interactInfo', {}).get('readCount', 0),
-                    '是否已点赞': "是" if comment.get('interactInfo', {}).get('alreadyLike') == "true" else "否",
-                    '可否评论': "是" if comment.get('interactInfo', {}).get('enableComment') == "true" else "否",
-                    '可否点赞': "是" if comment.get('interactInfo', {}).get('enableLike') == "true" else "否",
-                    '可否分享': "是" if comment.get('interactInfo', {}).get('enableShare') == "true" else "否",
-                    
-                    # 商家回复
-                    '商家回复': comment.get('reply', ''),
-                    
-                    # 用户信息
-                    '用户ID': comment.get('userId', ''),
-                    '用户信用等级': comment.get('creditLevel', ''),
-                    '用户星级': comment.get('userStar', ''),
-                    '用户头像URL': comment.get('headPicUrl', ''),
-                    '用户头像框URL': comment.get('headFrameUrl', ''),
-                    '用户主页URL': comment.get('userIndexURL', ''),
-                    '用户标记': comment.get('userMark', ''),
-                    '减少用户昵称': comment.get('reduceUserNick', ''),
-                    
-                    # 分享信息
-                    '分享URL': comment.get('share', {}).get('shareURL', ''),
-                    '详情URL': comment.get('share', {}).get('detailUrl', ''),
-                    '详情分享URL': comment.get('share', {}).get('detailShareUrl', ''),
-                    '支持分享': "是" if comment.get('share', {}).get('shareSupport') == "true" else "否",
-                    
-                    # 添加购物车URL
-                    '添加购物车URL': comment.get('addCartUrl', ''),
-                    
-                    # 权限信息
-                    '允许评论': "是" if comment.get('allowComment') == "true" else "否",
-                    '允许互动': "是" if comment.get('allowInteract') == "true" else "否",
-                    '允许笔记': "是" if comment.get('allowNote') == "true" else "否",
-                    '允许举报评论': "是" if comment.get('allowReportReview') == "true" else "否",
-                    '允许举报用户': "是" if comment.get('allowReportUser') == "true" else "否",
-                    '允许屏蔽评论': "是" if comment.get('allowShieldReview') == "true" else "否",
-                    '允许屏蔽用户': "是" if comment.get('allowShieldUser') == "true" else "否",
-                    
-                    # 额外信息
-                    '用户等级': comment.get('extraInfoMap', {}).get('userGrade', ''),
-                    '举报URL': comment.get('extraInfoMap', {}).get('report_url', ''),
-                }
-                
-                # 用户标签列表
-                if 'userTagList' in comment and comment['userTagList']:
-                    for i, tag in enumerate(comment['userTagList']):
-                        item[f'用户标签_{i+1}_代码'] = tag.get('tagCode', '')
-                        item[f'用户标签_{i+1}_描述'] = tag.get('tagDesc', '')
-                        item[f'用户标签_{i+1}_图标'] = tag.get('tagIconPic', '')
-                
-                data.append(item)
-            except Exception as e:
-                print(f"处理评论数据时出错: {e}")
-                continue
+            count = len(comments) if count is None else count
+            return f"{item_id}_{item_title}_{count}条评论_{current_date}{ext}"
         
-        # 创建DataFrame并保存
-        if data:
-            df = pd.DataFrame(data)
-            df.to_excel(output_file, index=False)
-            print(f"评论数据已保存到 {output_file}")
-            
-            # 显示过滤信息
-            if filter_empty_comments and filtered_count > 0:
-                print(f"已过滤 {filtered_count} 条空评价")
-        else:
-            print("没有评论数据可以保存")
-            if filter_empty_comments and filtered_count > 0:
-                print(f"所有 {filtered_count} 条评论均为空评价，已全部过滤")
+        # 评论为空时使用默认文件名
+        return f"天猫商品评论_{time.strftime('%Y%m%d%H%M%S', time.localtime())}{ext}"
+    
+    def save_to_excel(self, comments, output_file=None, filter_empty_comments=False):
+        """
+        将评论数据保存到Excel文件，按块展开后经XlsxSink写入，内存中不会构建整张表
+        :param comments: 评论数据列表
+        :param output_file: 输出文件名，若为None则自动生成
+        :param filter_empty_comments: 是否过滤掉空评价（"此用户没有填写评价。"）
+        """
+        self._save(comments, output_file or self.default_output_file(comments, '.xlsx'), filter_empty_comments,
+                   XlsxSink)
+    
+    def save_to_parquet(self, comments, output_file=None, filter_empty_comments=False):
+        """
+        将评论数据保存到Parquet文件（需要安装pyarrow）
+        互动计数按整数存储，商品标题、规格、等级、"是"/"否"标记等低基数列按字典编码存储
+        :param comments: 评论数据列表
+        :param output_file: 输出文件名，若为None则自动生成
+        :param filter_empty_comments: 是否过滤掉空评价（"此用户没有填写评价。"）
+        """
+        self._save(comments, output_file or self.default_output_file(comments, '.parquet'), filter_empty_comments,
+                   ParquetSink)
+    
+    def save_to_file(self, comments, output_file=None, filter_empty_comments=False, output_format='xlsx'):
+        """
+        按输出文件的扩展名保存评论（.xlsx / .parquet / .csv / .jsonl，见open_sink），其他扩展名按xlsx保存
+        :param output_file: 输出文件名，若为None则按output_format自动生成
+        :param output_format: 自动生成文件名时使用的格式（xlsx / parquet / csv / jsonl）
+        :return: 实际的输出文件名
+        """
+        output_file = output_file or self.default_output_file(comments, f'.{output_format}')
+        ext = os.path.splitext(output_file)[1].lower()
+        self._save(comments, output_file, filter_empty_comments, SINK_TYPES.get(ext, XlsxSink))
+        return output_file
 
-def main():
-    # 使用示例
+    def _save(self, comments, output_file, filter_empty_comments, sink_type, chunk_size=5000):
+        """
+        过滤空评价后按块写入sink_type（tmall_comment_export中的CommentSink子类），
+        每块单独列式展开，内存中只有当前块展开后的数据
+        """
+        if not comments:
+            logger.warning("没有评论数据可以保存")
+            return
+        started = time.monotonic()
+        fields = self.projection.fields if self.projection is not None else None
+        with sink_type(output_file, filter_empty_comments, fields) as sink:
+            for start in range(0, len(comments), chunk_size):
+                sink.write_page(comments[start:start + chunk_size])
+        if not sink.rows_written:
+            # 全部被过滤时不保留只有表头的文件
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            logger.warning("所有 %d 条评论均为空评价，已全部过滤", sink.filtered_count)
+            return
+        self.metrics.export_seconds.observe(time.monotonic() - started,
+                                            format=os.path.splitext(output_file)[1].lstrip('.'))
+        logger.info("评论数据已保存到 %s，共 %d 条", output_file, sink.rows_written)
+        # 显示过滤信息
+        if filter_empty_comments and sink.filtered_count > 0:
+            logger.info("已过滤 %d 条空评价", sink.filtered_count)
+
+def setup_console_logging(level=logging.INFO):
+    """命令行工具的日志输出：只输出消息本身，与原来的print一致"""
+    logging.basicConfig(level=level, format="%(message)s")
+
+
+# 命令行退出码
+EXIT_OK = 0  # 全部商品爬取成功
+EXIT_FAILED = 1  # 没有商品爬取成功
+EXIT_USAGE = 2  # 参数错误
+EXIT_PARTIAL = 3  # 部分商品失败，或有页面重试后仍失败
+
+ORDER_CHOICES = {'default': "", 'time': "feedbackdate"}
+OUTPUT_FORMATS = ('xlsx', 'parquet', 'csv', 'jsonl')
+
+
+def exit_code(results):
+    """
+    根据批量结果（tmall_comment_batch.BatchResult列表）确定退出码
+    """
+    if all(r.ok for r in results):
+        return EXIT_OK
+    if not any(r.count for r in results):
+        return EXIT_FAILED
+    return EXIT_PARTIAL
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="天猫商品评论爬取。不带商品ID和任务文件、且在终端中运行时进入交互模式",
+        epilog=f"退出码: {EXIT_OK} 全部成功，{EXIT_FAILED} 全部失败，{EXIT_USAGE} 参数错误，"
+               f"{EXIT_PARTIAL} 部分商品失败或有失败页",
+    )
+    parser.add_argument('item_ids', nargs='*', help="商品ID，可指定多个")
+    parser.add_argument('-j', '--job-file',
+                        help="任务文件（每行: 商品ID [起始页 结束页|auto [排序方式]]，也支持.json/.jsonl），"
+                             "未写明的页码和排序方式使用命令行参数")
+    parser.add_argument('--start-page', type=int, default=1, help="起始页码")
+    pages = parser.add_mutually_exclusive_group()
+    pages.add_argument('--end-page', type=int, help="结束页码（默认第5页）")
+    pages.add_argument('-p', '--pages', type=int, help="从起始页开始爬取的页数（每页20条评论）")
+    parser.add_argument('--auto', action='store_true',
+                        help="自动分页：按商品实际总页数爬取，指定结束页码时作为页数上限；对任务文件中的任务同样生效")
+    parser.add_argument('--order', choices=list(ORDER_CHOICES), default='default', help="排序方式")
+    parser.add_argument('--workers', type=int, default=1, help="同时爬取的商品数（--coverage时为同时爬取的分片数）")
+    parser.add_argument('-c', '--concurrency', type=int, default=3, help="每个商品同时在途的页面请求数")
+    parser.add_argument('--rate', type=float, default=0.7,
+                        help="合计请求速率（次/秒），自适应模式下为初始速率；多账号时为每个账号的速率")
+    parser.add_argument('--account-rate', type=float, help="多账号模式下每个账号的请求速率（次/秒），默认同--rate")
+    parser.add_argument('--min-rate', type=float, help="自适应速率下限（默认 min(0.2, rate)）")
+    parser.add_argument('--max-rate', type=float, help="自适应速率上限（默认 rate 的3倍）")
+    parser.add_argument('--fixed-rate', action='store_true', help="使用固定速率，不根据限流情况自动调整")
+    parser.add_argument('--cookie', help="Cookie字符串，也可通过环境变量TMALL_COOKIE提供")
+    parser.add_argument('--cookie-file', help="包含Cookie字符串的文本文件，每行一个Cookie，多行时启用多账号池")
+    parser.add_argument('--base-url', help="评论接口地址（默认为线上接口，可指向本地模拟接口）")
+    parser.add_argument('-o', '--output',
+                        help="输出文件路径，格式按扩展名确定；多个商品时路径中需包含{item_id}。默认在--output-dir中自动命名")
+    parser.add_argument('--output-dir', default='.', help="自动命名时的输出目录")
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS,
+                        help="自动命名时的输出格式，默认xlsx；parquet需要安装pyarrow")
+    parser.add_argument('--filter-empty', action='store_true', help="过滤空评价（\"此用户没有填写评价。\"）")
+    parser.add_argument('--fields', help="只保留并导出这些字段，逗号分隔的字段路径（如 feedback,createTime,interactInfo.likeCount）")
+
+    storage = parser.add_argument_group("本地库、缓存和去重")
+    storage.add_argument('--db', help="本地评论库路径（SQLite），用于增量爬取和断点续爬")
+    storage.add_argument('--incremental', action='store_true', help="增量模式：按时间排序，遇到已入库的评论即停止")
+    storage.add_argument('--resume', action='store_true', help="从上次中断的页面继续")
+    storage.add_argument('--cache', help="响应缓存路径（SQLite），命中时不请求网络")
+    storage.add_argument('--cache-ttl', type=float, default=6 * 3600, help="缓存有效期（秒）")
+    storage.add_argument('--dedup', action='store_true',
+                         help="按评论ID去重：同一商品的多个任务（如两种排序方式）和错位的页面中重复的评论只保留一条")
+    storage.add_argument('--dedup-index', help="评论ID索引文件，多次运行之间共享，已爬过的评论不再输出（隐含 --dedup）")
+    storage.add_argument('--bloom', action='store_true', help="去重索引使用布隆过滤器，用于数百万评论ID，内存占用约为精确模式的1/35")
+    storage.add_argument('--bloom-capacity', type=int, default=5000000, help="布隆过滤器的设计容量（评论ID数）")
+
+    coverage = parser.add_argument_group("分片覆盖爬取")
+    coverage.add_argument('--coverage', action='store_true',
+                          help="按评价类型、标签和排序方式拆分，突破单一排序的页数上限，页码和排序方式不再使用")
+    coverage.add_argument('--shard-pages', type=int, help="每个分片最多爬取的页数（默认按totalPage）")
+    coverage.add_argument('--min-new-ratio', type=float, default=0.05, help="一块页面中新评论的比例低于该值即停止该分片")
+    coverage.add_argument('--max-requests', type=int, help="每个商品的请求数预算")
+
+    monitoring = parser.add_argument_group("日志和指标")
+    monitoring.add_argument('--metrics-file', help="运行指标的Prometheus文本文件，每完成一个商品更新一次")
+    monitoring.add_argument('--metrics-port', type=int, help="在本地该端口开启Prometheus指标HTTP端点")
+    monitoring.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                            help="日志级别，DEBUG时输出每个请求的详细信息")
+    output = monitoring.add_mutually_exclusive_group()
+    output.add_argument('-q', '--quiet', action='store_true', help="只输出警告和错误")
+    output.add_argument('--json', action='store_true',
+                        help="标准输出改为JSON Lines：每交付一页一行（page），每完成一个商品一行（item），"
+                             "最后一行为运行汇总（summary）；日志仍输出到标准错误")
+    return parser
+
+
+def main(argv=None):
+    """
+    命令行入口，适合在定时任务和批处理流水线中无人值守运行
+    :return: 退出码，见EXIT_OK等
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.item_ids and not args.job_file:
+        if sys.stdin.isatty():
+            setup_console_logging()
+            return interactive_main()
+        parser.error("请指定商品ID或 --job-file")
+    setup_console_logging(logging.WARNING if args.quiet else args.log_level)
+    if (args.incremental or args.resume) and not args.db:
+        parser.error("--incremental 和 --resume 需要同时指定 --db")
+    if args.coverage and (args.incremental or args.resume):
+        parser.error("--coverage 不能与 --incremental 或 --resume 同时使用")
+
+    # 批量引擎依赖本模块，在这里导入
+    from tmall_comment_batch import BatchCrawler, BatchJob, JobOutputs, load_jobs
+    from tmall_comment_coverage import report_lines
+    from tmall_comment_dedup import DedupIndex
+    from tmall_comment_store import CommentStore, ResponseCache
+
+    end_page = args.end_page if args.end_page is not None else 5
+    if args.pages is not None:
+        end_page = args.start_page + args.pages - 1
+    if args.start_page < 1 or end_page < args.start_page:
+        parser.error("页码范围无效：起始页必须大于0，且不大于结束页")
+    if args.auto and args.end_page is None and args.pages is None:
+        end_page = None
+    order_type = ORDER_CHOICES[args.order]
+
+    jobs = [BatchJob(item_id, args.start_page, end_page, order_type, args.auto) for item_id in args.item_ids]
+    if args.job_file:
+        try:
+            jobs.extend(load_jobs(args.job_file, args.start_page, end_page or 'auto', order_type))
+        except (OSError, ValueError, KeyError) as e:
+            parser.error(f"无法加载任务文件 {args.job_file}: {e}")
+    if args.auto:
+        for job in jobs:
+            job.auto_pages = True
+    if not jobs:
+        parser.error("没有需要爬取的商品")
+    if args.output and len(jobs) > 1 and '{item_id}' not in args.output:
+        parser.error("多个商品时 --output 中需包含{item_id}")
+    if args.output and os.path.splitext(args.output)[1].lower() not in SINK_TYPES:
+        parser.error(f"不支持的输出格式: {args.output}，可选: {', '.join(SINK_TYPES)}")
+
+    projection = None
+    if args.fields:
+        try:
+            projection = Projection(parse_field_list(args.fields))
+        except ValueError as e:
+            parser.error(str(e))
+
+    cookie = args.cookie or os.environ.get('TMALL_COOKIE')
+    accounts = None
+    if args.cookie_file:
+        try:
+            cookies = load_cookies(args.cookie_file)
+        except OSError as e:
+            parser.error(f"无法读取Cookie文件: {e}")
+        if len(cookies) > 1:
+            account_rate = args.account_rate or args.rate
+            accounts = AccountPool(cookies, rate=account_rate, adaptive=not args.fixed_rate)
+            logger.info("已启用多账号池，共 %d 个账号，每个账号 %s 次/秒", len(accounts), account_rate)
+        elif cookies:
+            cookie = cookies[0]
+
+    dedup = None
+    if args.dedup or args.dedup_index:
+        try:
+            dedup = DedupIndex(args.dedup_index, bloom=args.bloom, capacity=args.bloom_capacity)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    batch = BatchCrawler(workers=args.workers, rate_limit=args.rate, page_concurrency=args.concurrency,
+                         cookie=cookie, base_url=args.base_url, accounts=accounts, adaptive=not args.fixed_rate,
+                         min_rate=args.min_rate, max_rate=args.max_rate, projection=projection, dedup=dedup,
+                         store=CommentStore(args.db) if args.db else None,
+                         incremental=args.incremental, resume=args.resume,
+                         cache=ResponseCache(args.cache, ttl=args.cache_ttl) if args.cache else None)
+    outputs = JobOutputs(args.output, args.output_dir, f'.{args.format or "xlsx"}', args.filter_empty,
+                         projection.fields if projection is not None else None)
+    if args.metrics_port is not None:
+        port = batch.registry.serve(args.metrics_port)
+        logger.info("指标端点: http://127.0.0.1:%d/metrics", port)
+
+    emit_lock = threading.Lock()
+
+    def emit(event):
+        # 页面事件来自工作线程，加锁保证每个事件占完整的一行
+        with emit_lock:
+            print(json.dumps(event, ensure_ascii=False), flush=True)
+
+    def on_page(job, page, comments, failed):
+        outputs.on_page(job, page, comments, failed)
+        if args.json:
+            emit({'event': 'page', 'item_id': job.item_id, 'page': page, 'comments': len(comments),
+                  'failed': failed})
+
+    def save_result(result):
+        # 评论已在爬取过程中逐页写入文件，这里只整理文件名
+        try:
+            output_file = outputs.finish(result)
+        except OSError as e:
+            logger.error("商品 %s 的输出文件整理失败: %s", result.job.item_id, e)
+            result.error = result.error or f"保存失败: {e}"
+            output_file = result.output.output_file if result.output is not None else None
+        if args.json:
+            event = {
+                'event': 'item',
+                'item_id': result.job.item_id,
+                'ok': result.ok,
+                'comments': result.count,
+                'pages': result.pages,
+                'failed_pages': result.failed_pages,
+                'error': result.error,
+                'output': output_file,
+                'elapsed': round(result.elapsed, 2),
+            }
+            if result.coverage:
+                event['coverage'] = {k: v for k, v in result.coverage.items() if k != 'shards'}
+            emit(event)
+        elif not args.quiet:
+            status = "成功" if result.ok else f"失败页 {result.failed_pages} {result.error}"
+            print(f"商品 {result.job.item_id}: {result.count} 条评论，耗时 {result.elapsed:.1f} 秒，{status}")
+            for line in report_lines(result.coverage) if result.coverage else ():
+                print(line)
+        if args.metrics_file:
+            batch.registry.write_prometheus(args.metrics_file)
+
+    if args.coverage:
+        results, summary = batch.run_coverage(jobs, on_result=save_result, on_page=on_page, open_output=outputs.open,
+                                              max_pages=args.shard_pages, min_new_ratio=args.min_new_ratio,
+                                              max_requests=args.max_requests)
+    else:
+        results, summary = batch.run(jobs, on_result=save_result, on_page=on_page, open_output=outputs.open)
+    code = exit_code(results)
+    summary['exit_code'] = code
+    if args.json:
+        emit({'event': 'summary', **summary})
+    elif not args.quiet:
+        print(f"爬取完成: {json.dumps(summary, ensure_ascii=False)}")
+        if accounts is not None:
+            for account in accounts.stats():
+                print(f"账号 {account['name']}: {json.dumps(account, ensure_ascii=False)}")
+        for line in batch.metrics.summary_lines():
+            print(line)
+    if args.metrics_file:
+        batch.registry.write_prometheus(args.metrics_file)
+    batch.registry.close()
+    return code
+
+
+def interactive_main():
+    """
+    交互模式：逐项询问商品ID、页数、是否过滤空评价和导出格式
+    :return: 退出码，与非交互模式相同
+    """
+    from tmall_comment_batch import BatchJob, BatchResult
     crawler = TmallCommentCrawler()
     
     # 请输入商品ID
@@ -338,17 +1730,37 @@ def main():
     # 询问用户是否过滤空评价
     filter_empty = input("是否过滤空评价 (\"此用户没有填写评价。\") (y/n, 默认n): ").lower() == 'y'
     
+    # 询问导出格式
+    export_format = (input("导出格式 (xlsx/parquet, 默认xlsx): ").strip().lower() or 'xlsx')
+    if export_format not in ('xlsx', 'parquet'):
+        print("输入无效，已设置为默认格式xlsx")
+        export_format = 'xlsx'
+    
     print(f"即将爬取{page_num}页，共{page_num*20}条评论...")
     if filter_empty:
         print("已启用空评价过滤")
     
     # 获取评论
-    comments = crawler.get_comments(item_id, page_num)
+    comments = crawler.get_comments(item_id, 1, page_num)
     
-    # 保存到Excel，使用自动生成的文件名
-    crawler.save_to_excel(comments, filter_empty_comments=filter_empty)
+    error = crawler.last_error if not comments else ""
+    
+    # 保存到文件，使用自动生成的文件名
+    try:
+        if export_format == 'parquet':
+            crawler.save_to_parquet(comments, filter_empty_comments=filter_empty)
+        else:
+            crawler.save_to_excel(comments, filter_empty_comments=filter_empty)
+    except Exception as e:
+        logger.error("评论保存失败: %s", e)
+        error = f"保存失败: {e}"
     
     print(f"共获取 {len(comments)} 条评论")
+    for line in crawler.metrics.summary_lines():
+        print(line)
+    result = BatchResult(BatchJob(item_id, 1, page_num), comments, list(crawler.failed_pages), error)
+    return exit_code([result])
+
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main()) 
\ No newline at end of file
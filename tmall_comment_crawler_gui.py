@@ -1,21 +1,29 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import collections
+import logging
 import os
 import sys
 import time
 from functools import partial
 
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSize
+from PyQt5.QtCore import (Qt, QThread, QTimer, pyqtSignal, QSize, QAbstractTableModel, QModelIndex,
+                          QSortFilterProxyModel)
 from PyQt5.QtGui import QIcon, QFont, QPixmap, QColor
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QLineEdit, QPushButton, QSpinBox, QProgressBar, 
-                            QTextEdit, QCheckBox, QGroupBox, QScrollArea, QFileDialog,
+                            QTextEdit, QPlainTextEdit, QCheckBox, QGroupBox, QScrollArea, QFileDialog,
                             QMessageBox, QFrame, QSplitter, QTabWidget, QGridLayout,
-                            QRadioButton, QButtonGroup)
+                            QRadioButton, QButtonGroup, QTableView, QHeaderView, QComboBox)
 
 # 导入爬虫核心类
-from tmall_comment_crawler_cmd import TmallCommentCrawler
+from tmall_comment_crawler_cmd import AccountPool, TmallCommentCrawler, HttpTransport
+from tmall_comment_dedup import DedupIndex
+from tmall_comment_export import (EMPTY_FEEDBACK, column_extractor, field_accessor, parquet_column_kind,
+                                  sanitize_column, write_parquet, write_xlsx)
+from tmall_comment_record import Projection
+from tmall_comment_store import ResponseCache
 
 # 定义样式表
 STYLE = """
@@ -91,7 +99,7 @@ QProgressBar::chunk {
     width: 10px;
     margin: 0.5px;
 }
-QTextEdit {
+QTextEdit, QPlainTextEdit {
     border: 1px solid #dcdde1;
     border-radius: 3px;
     background-color: #f8f9fa;
@@ -116,26 +124,72 @@ QRadioButton::indicator {
 }
 """
 
+# 日志区最多保留的行数，超出后自动丢弃最早的行
+LOG_MAX_LINES = 10000
+# 日志批量刷新到界面的间隔（毫秒）
+LOG_FLUSH_INTERVAL = 200
+
+
+class BufferedLogHandler(logging.Handler):
+    """
+    把日志记录缓存在内存中，由界面线程的定时器批量取出显示，
+    爬虫线程记录日志时不直接操作界面，日志再多也不会逐条触发重新排版
+    :param max_lines: 缓存的最大行数，界面来不及刷新时丢弃最早的记录
+    """
+    def __init__(self, max_lines=LOG_MAX_LINES):
+        super().__init__()
+        self.buffer = collections.deque(maxlen=max_lines)
+        self.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", "%H:%M:%S"))
+
+    def emit(self, record):
+        try:
+            self.buffer.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def append(self, message):
+        """直接追加一行已格式化的文本"""
+        self.buffer.append(message)
+
+    def drain(self):
+        """取出并清空当前缓存的所有行"""
+        lines = []
+        while True:
+            try:
+                lines.append(self.buffer.popleft())
+            except IndexError:
+                return lines
+
+
 class CrawlerThread(QThread):
     """爬虫线程类，避免界面卡顿"""
     update_signal = pyqtSignal(str)  # 日志信号
     progress_signal = pyqtSignal(int)  # 进度信号
-    finished_signal = pyqtSignal(list)  # 完成信号，传递爬取的评论列表
+    plan_signal = pyqtSignal(int)  # 自动分页模式下规划出的结束页码
+    cookie_signal = pyqtSignal(str)  # 令牌自动刷新后的新Cookie
+    rate_signal = pyqtSignal(float)  # 自适应调整后的当前请求速率（次/秒）
+    # 每交付一页发送一次：(页码, 该页评论列表)；用object类型按引用传递，不转换为QVariant
+    page_signal = pyqtSignal(int, object)
+    finished_signal = pyqtSignal(bool)  # 完成信号，参数为是否被取消，评论已通过page_signal逐页送达
     
-    def __init__(self, item_id, start_page, end_page, cookie=None, order_type=""):
+    def __init__(self, item_id, start_page, end_page, cookie=None, order_type="", transport=None, auto_pages=False,
+                 cache=None, accounts=None, projection=None):
         super().__init__()
         self.item_id = item_id
         self.start_page = start_page
         self.end_page = end_page
         self.cookie = cookie
         self.order_type = order_type
-        self.crawler = TmallCommentCrawler()
+        self.auto_pages = auto_pages
+        # 共享传输层，使多次爬取复用同一个连接池；多账号时并发数随账号数增加
+        concurrency = max(3, len(accounts)) if accounts is not None else 3
+        # 按评论ID去重，翻页期间有新评论插入导致页面错位时不会出现重复的评论
+        self.crawler = TmallCommentCrawler(concurrency=concurrency, transport=transport, cache=cache,
+                                           accounts=accounts, projection=projection, dedup=DedupIndex())
         
         # 如果提供了自定义Cookie，则更新爬虫的Cookie
-        if self.cookie:
-            self.crawler.headers['Cookie'] = self.cookie
-            # 重新提取token
-            self.crawler._extract_token_from_cookie()
+        if self.cookie and accounts is None:
+            self.crawler.set_cookie(self.cookie)
         
     def run(self):
         self.update_signal.emit(f"开始爬取评论数据，页码范围：{self.start_page} - {self.end_page}...")
@@ -151,10 +205,38 @@ class CrawlerThread(QThread):
                 self.start_page, 
                 self.end_page, 
                 self.order_type,
-                progress_callback=update_progress
+                progress_callback=update_progress,
+                auto_pages=self.auto_pages,
+                plan_callback=self.plan_signal.emit,
+                rate_callback=self.rate_signal.emit,
+                page_callback=self.page_signal.emit
             )
             
-            if all_comments:
+            accounts = self.crawler.accounts
+            if accounts is not None:
+                for account in accounts.stats():
+                    self.update_signal.emit(
+                        f"账号 {account['name']}: 请求 {account['requests']} 次，被限流 {account['throttled']} 次，"
+                        f"鉴权失败 {account['auth_failures']} 次，隔离 {account['quarantines']} 次"
+                    )
+                refreshes = sum(a.token_refreshes for a in accounts.accounts)
+                if refreshes:
+                    self.update_signal.emit(f"令牌已过期并自动刷新 {refreshes} 次")
+                    self.cookie_signal.emit('\n'.join(a.cookie for a in accounts.accounts))
+            elif self.crawler.token_refreshes:
+                self.update_signal.emit(f"令牌已过期并自动刷新 {self.crawler.token_refreshes} 次")
+                self.cookie_signal.emit(self.crawler.headers['Cookie'])
+            
+            if self.crawler.cache is not None:
+                stats = self.crawler.cache.stats()
+                self.update_signal.emit(f"缓存命中 {stats['hits']} 次，未命中 {stats['misses']} 次")
+            
+            for line in self.crawler.metrics.summary_lines():
+                self.update_signal.emit(line)
+            
+            if self.crawler.cancelled:
+                self.update_signal.emit(f"爬取已取消，已获取 {len(all_comments)} 条评论，可以直接导出")
+            elif all_comments:
                 self.update_signal.emit(f"爬取完成，共获取 {len(all_comments)} 条评论")
             else:
                 # 检查爬虫对象中是否有错误信息
@@ -169,72 +251,87 @@ class CrawlerThread(QThread):
             # 如果是API错误，显示更详细的信息
             if "API调用失败" in error_msg:
                 self.update_signal.emit(f"API错误详情: {error_msg}")
-            all_comments = []
         
-        self.finished_signal.emit(all_comments)
+        self.finished_signal.emit(self.crawler.cancelled)
+    
+    def pause(self):
+        """暂停爬取，正在进行的请求完成后不再发出新请求"""
+        self.crawler.control.pause()
+    
+    def resume(self):
+        """继续爬取"""
+        self.crawler.control.resume()
+    
+    def cancel(self):
+        """取消爬取，已送达的页面保留"""
+        self.crawler.control.cancel()
 
 class SaveThread(QThread):
     """保存数据线程类"""
     update_signal = pyqtSignal(str)
     finished_signal = pyqtSignal(bool, str)
     
-    def __init__(self, comments, selected_fields, output_file, filter_empty_comments=False):
+    def __init__(self, comments, selected_fields, output_file, filter_empty_comments=False, chunk_size=5000):
         super().__init__()
         self.comments = comments
         self.selected_fields = selected_fields
+        # 字段路径只编译一次为按列取值的函数，逐块取值时不再拆分路径
+        self.extractors = [column_extractor(field) for field in selected_fields]
         self.output_file = output_file
         self.filter_empty_comments = filter_empty_comments
-        self.crawler = TmallCommentCrawler()
+        self.chunk_size = chunk_size  # 每次处理并写入的行数
+        self.filtered_count = 0
+        
+    def iter_column_chunks(self, sanitize=True):
+        """按块生成要写入的列值列表，sanitize为True时清洗Excel不允许的控制字符"""
+        for start in range(0, len(self.comments), self.chunk_size):
+            chunk = self.comments[start:start + self.chunk_size]
+            
+            # 如果启用了空评价过滤，去掉空评价
+            if self.filter_empty_comments:
+                kept = [comment for comment in chunk if comment.get('feedback', '') != EMPTY_FEEDBACK]
+                self.filtered_count += len(chunk) - len(kept)
+                chunk = kept
+            if not chunk:
+                continue
+            
+            columns = [extract(chunk) for extract in self.extractors]
+            yield [sanitize_column(values) for values in columns] if sanitize else columns
+    
+    def iter_row_chunks(self):
+        """按块生成要写入的行：先按列取值并清洗控制字符，再组装为行"""
+        for columns in self.iter_column_chunks():
+            yield list(zip(*columns))
+    
+    def write_file(self):
+        """按输出文件扩展名写入xlsx或parquet，返回写入的行数"""
+        header = list(self.selected_fields.values())
+        if self.output_file.lower().endswith('.parquet'):
+            kinds = [parquet_column_kind(field) for field in self.selected_fields]
+            return write_parquet(self.output_file, header, kinds, self.iter_column_chunks(sanitize=False))
+        return write_xlsx(self.output_file, header, self.iter_row_chunks())
         
     def run(self):
         try:
             self.update_signal.emit(f"正在将数据保存到 {self.output_file}...")
             
-            # 筛选字段并保存
-            import pandas as pd
-            
-            data = []
-            filtered_count = 0
-            
-            for comment in self.comments:
-                # 如果启用了空评价过滤，检查评论内容
-                feedback = comment.get('feedback', '')
-                if self.filter_empty_comments and feedback == "此用户没有填写评价。":
-                    filtered_count += 1
-                    continue
-                    
-                item = {}
-                for field, field_name in self.selected_fields.items():
-                    # 处理嵌套字段，如 interactInfo.likeCount
-                    if '.' in field:
-                        parts = field.split('.')
-                        value = comment
-                        for part in parts:
-                            value = value.get(part, {}) if isinstance(value, dict) else {}
-                        item[field_name] = value or ''
-                    else:
-                        # 获取原始值
-                        value = comment.get(field, '')
-                        # 处理字符串值，移除Excel不允许的字符
-                        if isinstance(value, str):
-                            # Excel中不允许使用的字符：0x00-0x1F（控制字符）
-                            # 替换为空格
-                            value = ''.join(c if ord(c) >= 32 else ' ' for c in value)
-                        item[field_name] = value
-                data.append(item)
+            # 筛选字段并逐块写入，内存占用与总行数无关
+            self.filtered_count = 0
+            written = self.write_file()
             
             # 显示过滤信息
-            if self.filter_empty_comments and filtered_count > 0:
-                self.update_signal.emit(f"已过滤 {filtered_count} 条空评价")
+            if self.filter_empty_comments and self.filtered_count > 0:
+                self.update_signal.emit(f"已过滤 {self.filtered_count} 条空评价")
                 
-            if data:
-                df = pd.DataFrame(data)
-                df.to_excel(self.output_file, index=False)
+            if written:
                 self.update_signal.emit(f"数据已成功保存到 {self.output_file}")
                 self.finished_signal.emit(True, self.output_file)
             else:
-                if self.filter_empty_comments and filtered_count > 0:
-                    msg = f"所有 {filtered_count} 条评论均为空评价，已全部过滤，没有数据可保存"
+                # 没有数据时删除只有表头的文件
+                if os.path.exists(self.output_file):
+                    os.remove(self.output_file)
+                if self.filter_empty_comments and self.filtered_count > 0:
+                    msg = f"所有 {self.filtered_count} 条评论均为空评价，已全部过滤，没有数据可保存"
                     self.update_signal.emit(msg)
                     self.finished_signal.emit(False, msg)
                 else:
@@ -246,13 +343,174 @@ class SaveThread(QThread):
             self.update_signal.emit(error_msg)
             self.finished_signal.emit(False, error_msg)
 
+class CommentTableModel(QAbstractTableModel):
+    """
+    评论结果表格的数据模型，直接引用评论列表，不复制数据
+    单元格只在表格显示到时才取值，滚动20万行也不会一次性构造所有单元格
+    排序在模型内按预先算好的排序键重排行序，比由代理模型逐次调用data()比较快得多
+    :param fields: [(接口字段名, 显示名称)] 列表，决定表格的列
+    """
+    def __init__(self, fields, parent=None):
+        super().__init__(parent)
+        self.fields = list(fields)
+        self.accessors = [field_accessor(field) for field, _ in self.fields]
+        self.comments = []
+        self.order = []  # 显示顺序中第i行对应的评论下标
+        self._search_columns = {}  # 列号 -> 小写文本列表，按评论下标排列，过滤时按需构建
+    
+    def set_comments(self, comments):
+        """替换全部评论数据"""
+        self.beginResetModel()
+        self.comments = comments
+        self.order = list(range(len(comments)))
+        self._search_columns = {}
+        self.endResetModel()
+    
+    def append_comments(self, comments):
+        """在末尾追加一页评论（追加到set_comments传入的同一个列表），已构建的过滤文本列随之扩展"""
+        if not comments:
+            return
+        first = len(self.order)
+        start = len(self.comments)
+        self.beginInsertRows(QModelIndex(), first, first + len(comments) - 1)
+        self.comments.extend(comments)
+        self.order.extend(range(start, len(self.comments)))
+        for column, values in self._search_columns.items():
+            accessor = self.accessors[column]
+            values.extend(str(accessor(c)).lower() for c in comments)
+        self.endInsertRows()
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.fields)
+    
+    def comment_at(self, row):
+        """第row行（显示顺序）对应的评论"""
+        return self.comments[self.order[row]]
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            value = self.accessors[index.column()](self.comment_at(index.row()))
+            text = '' if value is None else str(value)
+            if role == Qt.ToolTipRole:
+                # 只为显示不全的长文本提供提示
+                return text if len(text) > 30 else None
+            return text
+        return None
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.fields[section][1]
+        return str(section + 1)
+    
+    def sort_key(self, column):
+        """列的排序键函数：互动计数按整数比较（缺失的排在最前），其他列按文本比较"""
+        accessor = self.accessors[column]
+        if parquet_column_kind(self.fields[column][0]) == 'int':
+            def key(comment):
+                try:
+                    return int(accessor(comment))
+                except (TypeError, ValueError):
+                    return -1
+            return key
+        return lambda comment: str(accessor(comment))
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        if not 0 <= column < len(self.fields):
+            return
+        self.layoutAboutToBeChanged.emit()
+        key = self.sort_key(column)
+        comments = self.comments
+        self.order.sort(key=lambda i: key(comments[i]), reverse=order == Qt.DescendingOrder)
+        self.layoutChanged.emit()
+    
+    def search_column(self, column):
+        """某列的小写文本（按评论下标排列），首次过滤该列时构建并缓存"""
+        if column not in self._search_columns:
+            accessor = self.accessors[column]
+            self._search_columns[column] = [str(accessor(c)).lower() for c in self.comments]
+        return self._search_columns[column]
+
+
+class CommentFilterProxyModel(QSortFilterProxyModel):
+    """
+    评论表格的过滤代理：按关键词过滤某一列或所有列（不区分大小写）
+    过滤结果一次性算成布尔列表，filterAcceptsRow只做查表；排序转交源模型完成
+    过滤条件变化时整体重置而不是invalidateFilter，后者对分散的增删行逐段发信号，20万行时要数秒
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._accepted = None  # 按评论下标排列的布尔列表，None表示不过滤
+        self._text = ''
+        self._columns = []
+    
+    def set_filter(self, text, column=-1):
+        """
+        :param text: 关键词，为空时显示全部
+        :param column: 过滤的列号，-1表示任意一列包含关键词即可
+        """
+        model = self.sourceModel()
+        self._text = text.strip().lower()
+        self._columns = list(range(model.columnCount())) if column < 0 else [column]
+        self.beginResetModel()
+        if self._text:
+            self._accepted = []
+            self._extend_accepted()
+        else:
+            self._accepted = None
+        self.endResetModel()
+    
+    def _extend_accepted(self):
+        """为尚未计算的评论（如新追加的页面）补算过滤结果"""
+        model = self.sourceModel()
+        start = len(self._accepted)
+        accepted = [False] * (len(model.comments) - start)
+        for column in self._columns:
+            values = model.search_column(column)[start:]
+            accepted = [hit or self._text in value for hit, value in zip(accepted, values)]
+        self._accepted.extend(accepted)
+    
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self._accepted is None:
+            return True
+        index = self.sourceModel().order[source_row]
+        if index >= len(self._accepted):
+            self._extend_accepted()
+        return self._accepted[index]
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        # 源模型用排序键整体重排，代理保持源模型的行序
+        self.sourceModel().sort(column, order)
+    
+    def clear_filter_cache(self):
+        """源数据替换后清除过滤结果"""
+        self._accepted = None
+
+
 class TmallCommentCrawlerGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.comments = []  # 存储爬取的评论数据
         self.field_mappings = {}  # 存储字段映射
         self.default_filename = ""  # 存储默认文件名
+        self.transport = HttpTransport()  # 所有爬取线程共享的HTTP连接池
+        self.response_cache = None  # 本地响应缓存，勾选后首次爬取时创建
+        self.crawl_projection = None  # 最近一次爬取使用的字段投影，为None时保留了全部字段
+        # 爬虫各模块通过logging输出日志，缓存后由定时器批量显示
+        self.log_handler = BufferedLogHandler()
+        root_logger = logging.getLogger()
+        root_logger.addHandler(self.log_handler)
+        root_logger.setLevel(logging.INFO)
         self.setup_ui()
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.flush_logs)
+        self.log_timer.start(LOG_FLUSH_INTERVAL)
         
     def setup_ui(self):
         """设置UI界面"""
@@ -310,7 +568,8 @@ class TmallCommentCrawlerGUI(QMainWindow):
         cookie_label = QLabel("Cookie:")
         cookie_label.setFont(QFont("Microsoft YaHei", 9))
         self.cookie_input = QTextEdit()
-        self.cookie_input.setPlaceholderText("必须提供天猫网站的Cookie，从浏览器开发者工具中复制，包含_m_h5_tk字段")
+        self.cookie_input.setPlaceholderText("必须提供天猫网站的Cookie，从浏览器开发者工具中复制，包含_m_h5_tk字段；"
+                                             "每行一个Cookie，填写多行时启用多账号轮换")
         self.cookie_input.setFont(QFont("Microsoft YaHei", 9))
         self.cookie_input.setMaximumHeight(80)
         settings_layout.addWidget(cookie_label, 1, 0)
@@ -342,6 +601,12 @@ class TmallCommentCrawlerGUI(QMainWindow):
         page_range_layout.addWidget(range_label)
         page_range_layout.addWidget(self.end_page_spin)
         
+        # 自动分页：根据第一页返回的总页数确定实际页数，结束页作为上限
+        self.auto_pages_check = QCheckBox("自动识别总页数")
+        self.auto_pages_check.setFont(QFont("Microsoft YaHei", 9))
+        self.auto_pages_check.setToolTip("根据第一页返回的总页数确定实际爬取页数，结束页作为上限")
+        page_range_layout.addWidget(self.auto_pages_check)
+        
         settings_layout.addWidget(page_label, 2, 0)
         settings_layout.addLayout(page_range_layout, 2, 1)
         
@@ -351,11 +616,23 @@ class TmallCommentCrawlerGUI(QMainWindow):
         page_tip.setStyleSheet("color: #7f8c8d;")
         settings_layout.addWidget(page_tip, 2, 2)
         
-        # 开始爬取按钮
+        # 开始、暂停/继续和取消按钮
         self.start_btn = QPushButton("开始爬取")
         self.start_btn.setFont(QFont("Microsoft YaHei", 9, QFont.Bold))
         self.start_btn.clicked.connect(self.start_crawling)
-        settings_layout.addWidget(self.start_btn, 2, 3)
+        self.pause_btn = QPushButton("暂停")
+        self.pause_btn.setFont(QFont("Microsoft YaHei", 9))
+        self.pause_btn.setEnabled(False)
+        self.pause_btn.clicked.connect(self.toggle_pause)
+        self.cancel_btn = QPushButton("取消")
+        self.cancel_btn.setFont(QFont("Microsoft YaHei", 9))
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_crawling)
+        crawl_btn_layout = QHBoxLayout()
+        crawl_btn_layout.addWidget(self.start_btn)
+        crawl_btn_layout.addWidget(self.pause_btn)
+        crawl_btn_layout.addWidget(self.cancel_btn)
+        settings_layout.addLayout(crawl_btn_layout, 2, 3)
         
         # 添加排序选项
         sort_label = QLabel("评论排序:")
@@ -381,6 +658,19 @@ class TmallCommentCrawlerGUI(QMainWindow):
         
         settings_layout.addLayout(sort_layout, 3, 1, 1, 3)
         
+        # 其他选项
+        options_label = QLabel("其他选项:")
+        options_label.setFont(QFont("Microsoft YaHei", 9))
+        settings_layout.addWidget(options_label, 4, 0)
+        
+        self.cache_check = QCheckBox("使用本地响应缓存（6小时内重复爬取同一页时不再请求）")
+        self.cache_check.setFont(QFont("Microsoft YaHei", 9))
+        settings_layout.addWidget(self.cache_check, 4, 1, 1, 3)
+        
+        self.projection_check = QCheckBox("只保留“字段选择与导出”中选中的字段（节省内存，未选中的字段爬取后无法再导出）")
+        self.projection_check.setFont(QFont("Microsoft YaHei", 9))
+        settings_layout.addWidget(self.projection_check, 5, 1, 1, 3)
+        
         crawler_layout.addWidget(settings_group)
         
         # 进度条
@@ -402,8 +692,10 @@ class TmallCommentCrawlerGUI(QMainWindow):
         log_layout = QVBoxLayout(log_group)
         log_layout.setContentsMargins(15, 20, 15, 15)
         
-        self.log_text = QTextEdit()
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(LOG_MAX_LINES)
+        self.log_text.setUndoRedoEnabled(False)
         self.log_text.setFont(QFont("Consolas", 9))
         self.log_text.setStyleSheet("color: #2d3436;")
         log_layout.addWidget(self.log_text)
@@ -475,6 +767,29 @@ class TmallCommentCrawlerGUI(QMainWindow):
         export_settings_layout.addWidget(self.export_path_input, 0, 1)
         export_settings_layout.addWidget(browse_btn, 0, 2)
         
+        # 导出格式
+        format_label = QLabel("导出格式:")
+        format_layout = QHBoxLayout()
+        self.format_btn_group = QButtonGroup()
+        
+        self.xlsx_format_btn = QRadioButton("Excel (.xlsx)")
+        self.xlsx_format_btn.setFont(QFont("Microsoft YaHei", 9))
+        self.xlsx_format_btn.setChecked(True)
+        self.format_btn_group.addButton(self.xlsx_format_btn, 1)
+        
+        self.parquet_format_btn = QRadioButton("Parquet (.parquet)")
+        self.parquet_format_btn.setFont(QFont("Microsoft YaHei", 9))
+        self.parquet_format_btn.setToolTip("列式存储，文件更小、pandas读取更快，需要安装pyarrow")
+        self.format_btn_group.addButton(self.parquet_format_btn, 2)
+        self.format_btn_group.buttonClicked.connect(self.on_export_format_changed)
+        
+        format_layout.addWidget(self.xlsx_format_btn)
+        format_layout.addWidget(self.parquet_format_btn)
+        format_layout.addStretch()
+        
+        export_settings_layout.addWidget(format_label, 1, 0)
+        export_settings_layout.addLayout(format_layout, 1, 1)
+        
         # 导出按钮
         self.export_btn = QPushButton("导出到Excel")
         self.export_btn.setEnabled(False)  # 初始状态禁用，等爬取完成后启用
@@ -487,6 +802,9 @@ class TmallCommentCrawlerGUI(QMainWindow):
         # 添加导出选项卡
         tabs.addTab(export_tab, "字段选择与导出")
         
+        # 创建评论浏览选项卡，列与导出字段一致
+        tabs.addTab(self.setup_results_tab(), "评论浏览")
+        
         main_layout.addWidget(tabs)
         
         # 状态栏
@@ -589,6 +907,84 @@ class TmallCommentCrawlerGUI(QMainWindow):
                 col = 0
                 row += 1
     
+    def setup_results_tab(self):
+        """创建评论浏览选项卡：可排序、可按关键词过滤的评论表格"""
+        results_tab = QWidget()
+        results_layout = QVBoxLayout(results_tab)
+        results_layout.setContentsMargins(10, 10, 10, 10)
+        
+        # 过滤栏
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("过滤:"))
+        self.filter_column_combo = QComboBox()
+        self.filter_column_combo.addItem("全部列", -1)
+        for column, display_name in enumerate(self.field_mappings.values()):
+            self.filter_column_combo.addItem(display_name, column)
+        # 默认按评论内容过滤，全部列过滤在数据量大时较慢
+        feedback_index = self.filter_column_combo.findText(self.field_mappings.get('feedback', ''))
+        if feedback_index >= 0:
+            self.filter_column_combo.setCurrentIndex(feedback_index)
+        self.filter_column_combo.currentIndexChanged.connect(self.apply_results_filter)
+        filter_layout.addWidget(self.filter_column_combo)
+        
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("输入关键词过滤评论")
+        # 输入停顿后再过滤，避免每敲一个字都重新过滤
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(300)
+        self.filter_timer.timeout.connect(self.apply_results_filter)
+        self.filter_input.textChanged.connect(self.filter_timer.start)
+        filter_layout.addWidget(self.filter_input, 1)
+        
+        self.results_count_label = QLabel("共 0 条")
+        filter_layout.addWidget(self.results_count_label)
+        results_layout.addLayout(filter_layout)
+        
+        # 表格
+        self.results_model = CommentTableModel(self.field_mappings.items(), self)
+        self.results_proxy = CommentFilterProxyModel(self)
+        self.results_proxy.setSourceModel(self.results_model)
+        
+        self.results_view = QTableView()
+        self.results_view.setModel(self.results_proxy)
+        self.results_view.setSortingEnabled(True)
+        self.results_view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.results_view.setWordWrap(False)
+        self.results_view.setAlternatingRowColors(True)
+        self.results_view.setSelectionBehavior(QTableView.SelectRows)
+        self.results_view.setEditTriggers(QTableView.NoEditTriggers)
+        # 固定行高和列宽，避免按内容计算尺寸时遍历所有行
+        self.results_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.results_view.verticalHeader().setDefaultSectionSize(24)
+        self.results_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.results_view.horizontalHeader().setDefaultSectionSize(120)
+        feedback_column = list(self.field_mappings).index('feedback') if 'feedback' in self.field_mappings else -1
+        if feedback_column >= 0:
+            self.results_view.setColumnWidth(feedback_column, 360)
+        results_layout.addWidget(self.results_view)
+        
+        return results_tab
+    
+    def show_results(self, comments):
+        """把评论显示到浏览表格"""
+        self.results_proxy.clear_filter_cache()
+        self.results_model.set_comments(comments)
+        self.results_view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        if self.filter_input.text().strip():
+            self.apply_results_filter()
+        self.update_results_count()
+    
+    def apply_results_filter(self):
+        """按过滤栏的关键词和列过滤表格"""
+        self.results_proxy.set_filter(self.filter_input.text(), self.filter_column_combo.currentData())
+        self.update_results_count()
+    
+    def update_results_count(self):
+        total = self.results_model.rowCount()
+        shown = self.results_proxy.rowCount()
+        self.results_count_label.setText(f"共 {total} 条" if shown == total else f"显示 {shown} / {total} 条")
+    
     def toggle_all_fields(self, state):
         """全选或取消全选所有字段"""
         for checkbox in self.field_checkboxes.values():
@@ -625,28 +1021,56 @@ class TmallCommentCrawlerGUI(QMainWindow):
             current_filename = os.path.basename(current_path) if current_path else ""
             initial_dir = os.path.dirname(current_path) if current_path else ""
         
+        ext = self.export_extension()
         options = QFileDialog.Options()
         file_path, _ = QFileDialog.getSaveFileName(
             self, "选择保存位置", 
             os.path.join(initial_dir, current_filename),  # 使用当前文件名作为默认
-            "Excel文件 (*.xlsx);;所有文件 (*)", 
+            "Parquet文件 (*.parquet);;所有文件 (*)" if ext == '.parquet' else "Excel文件 (*.xlsx);;所有文件 (*)", 
             options=options
         )
         
         if file_path:
-            if not file_path.endswith('.xlsx'):
-                file_path += '.xlsx'
+            if not file_path.endswith(ext):
+                file_path += ext
             self.export_path_input.setText(file_path)
     
+    def export_extension(self):
+        """当前选择的导出文件扩展名"""
+        return '.parquet' if self.parquet_format_btn.isChecked() else '.xlsx'
+    
+    def on_export_format_changed(self, _button=None):
+        """切换导出格式时同步更新按钮文字、默认文件名和导出路径的扩展名"""
+        ext = self.export_extension()
+        self.export_btn.setText("导出到Parquet" if ext == '.parquet' else "导出到Excel")
+        if self.default_filename:
+            self.default_filename = os.path.splitext(self.default_filename)[0] + ext
+        current_path = self.export_path_input.text().strip()
+        if current_path:
+            self.export_path_input.setText(os.path.splitext(current_path)[0] + ext)
+    
     def log(self, message):
-        """添加日志信息"""
+        """添加日志信息，由定时器批量显示"""
         timestamp = time.strftime("%H:%M:%S", time.localtime())
-        log_msg = f"[{timestamp}] {message}"
-        self.log_text.append(log_msg)
-        # 滚动到底部
-        self.log_text.verticalScrollBar().setValue(
-            self.log_text.verticalScrollBar().maximum()
-        )
+        self.log_handler.append(f"[{timestamp}] {message}")
+    
+    def flush_logs(self):
+        """把缓存的日志一次性追加到日志区"""
+        lines = self.log_handler.drain()
+        if not lines:
+            return
+        scroll_bar = self.log_text.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum() - 2
+        self.log_text.appendPlainText('\n'.join(lines))
+        # 用户向上翻看历史日志时不强制滚动到底部
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
+    
+    def closeEvent(self, event):
+        """关闭窗口时移除日志处理器"""
+        self.log_timer.stop()
+        logging.getLogger().removeHandler(self.log_handler)
+        super().closeEvent(event)
     
     def start_crawling(self):
         """开始爬取评论"""
@@ -655,6 +1079,7 @@ class TmallCommentCrawlerGUI(QMainWindow):
         start_page = self.start_page_spin.value()
         end_page = self.end_page_spin.value()
         cookie = self.cookie_input.toPlainText().strip()
+        auto_pages = self.auto_pages_check.isChecked()
         
         # 获取排序方式
         order_type = "feedbackdate" if self.time_sort_btn.isChecked() else ""
@@ -674,6 +1099,15 @@ class TmallCommentCrawlerGUI(QMainWindow):
             QMessageBox.warning(self, "参数错误", "起始页不能大于结束页")
             return
         
+        # 字段投影：解析时只保留选中的字段
+        projection = None
+        if self.projection_check.isChecked():
+            fields = self.selected_export_fields()
+            if not fields:
+                QMessageBox.warning(self, "参数错误", "请先在“字段选择与导出”中选择要保留的字段")
+                return
+            projection = Projection(fields)
+        
         # 禁用开始按钮，避免重复点击
         self.start_btn.setEnabled(False)
         self.progress_bar.setValue(0)
@@ -683,24 +1117,115 @@ class TmallCommentCrawlerGUI(QMainWindow):
         sort_type = "时间排序" if order_type == "feedbackdate" else "默认排序"
         self.log(f"使用排序方式: {sort_type}")
         
-        self.log("使用自定义Cookie进行爬取")
+        # 多行Cookie启用多账号池，每个账号独立的速率预算
+        accounts = None
+        cookies = [line.strip() for line in cookie.splitlines() if line.strip()]
+        if len(cookies) > 1:
+            try:
+                accounts = AccountPool(cookies)
+            except ValueError as e:
+                QMessageBox.warning(self, "参数错误", str(e))
+                self.start_btn.setEnabled(True)
+                return
+            self.log(f"使用多账号池进行爬取，共 {len(accounts)} 个账号")
+        else:
+            self.log("使用自定义Cookie进行爬取")
+        if projection is not None:
+            self.log(f"只保留选中的 {len(projection.fields)} 个字段")
+        
+        cache = None
+        if self.cache_check.isChecked():
+            if self.response_cache is None:
+                self.response_cache = ResponseCache(os.path.join(self.get_app_dir(), 'tmall_response_cache.db'))
+            cache = self.response_cache
+            self.log(f"已启用本地响应缓存: {self.response_cache.path}")
+        
+        # 清空上次的结果，本次的评论逐页追加
+        self.comments = []
+        self.crawl_projection = projection
+        self.show_results(self.comments)
+        # 隐藏投影后没有值的列
+        for column, field in enumerate(self.field_mappings):
+            self.results_view.setColumnHidden(column, projection is not None and field not in projection)
+        self.export_btn.setEnabled(False)
+        self.pause_btn.setText("暂停")
+        self.pause_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(True)
         
         # 创建并启动爬虫线程
-        self.crawler_thread = CrawlerThread(item_id, start_page, end_page, cookie, order_type)
+        self.crawler_thread = CrawlerThread(item_id, start_page, end_page, cookie, order_type, self.transport, auto_pages,
+                                            cache, accounts, projection)
         self.crawler_thread.update_signal.connect(self.log)
         self.crawler_thread.progress_signal.connect(self.progress_bar.setValue)
+        self.crawler_thread.plan_signal.connect(self.on_pages_planned)
+        self.crawler_thread.cookie_signal.connect(self.on_cookie_refreshed)
+        self.crawler_thread.rate_signal.connect(self.on_rate_changed)
+        self.crawler_thread.page_signal.connect(self.on_page_fetched)
         self.crawler_thread.finished_signal.connect(self.on_crawl_finished)
         self.crawler_thread.start()
     
-    def on_crawl_finished(self, comments):
-        """爬取完成后的处理"""
-        self.comments = comments
+    def get_app_dir(self):
+        """获取应用程序所在目录"""
+        if getattr(sys, 'frozen', False):
+            # 如果是打包后的exe，使用可执行文件所在目录
+            return os.path.dirname(sys.executable)
+        # 否则使用脚本所在目录
+        return os.path.dirname(os.path.abspath(__file__))
+    
+    def on_pages_planned(self, end_page):
+        """自动分页模式下，根据实际页数更新结束页"""
+        self.end_page_spin.setValue(end_page)
+        self.log(f"自动识别页数，实际爬取页码范围: {self.start_page_spin.value()} - {end_page}")
+    
+    def on_rate_changed(self, rate):
+        """在状态栏显示当前自适应请求速率"""
+        self.statusBar().showMessage(f"正在爬取... 当前请求速率 {rate:.2f} 次/秒")
+    
+    def on_cookie_refreshed(self, cookie):
+        """爬取过程中令牌自动刷新后，把新Cookie写回输入框，下次爬取直接使用"""
+        self.cookie_input.setPlainText(cookie)
+        self.log("已将刷新后的Cookie更新到输入框")
+    
+    def toggle_pause(self):
+        """暂停或继续爬取"""
+        if self.crawler_thread.crawler.control.paused:
+            self.crawler_thread.resume()
+            self.pause_btn.setText("暂停")
+            self.log("继续爬取")
+            self.statusBar().showMessage("正在爬取...")
+        else:
+            self.crawler_thread.pause()
+            self.pause_btn.setText("继续")
+            self.log("已暂停，正在进行的请求完成后不再发出新请求")
+            self.statusBar().showMessage("已暂停")
+    
+    def cancel_crawling(self):
+        """取消爬取，已获取的页面可以直接导出"""
+        self.crawler_thread.cancel()
+        self.pause_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(False)
+        self.log("正在取消爬取...")
+    
+    def on_page_fetched(self, page, comments):
+        """每收到一页评论就追加到结果表格"""
+        self.results_model.append_comments(comments)
+        self.update_results_count()
+    
+    def on_crawl_finished(self, cancelled):
+        """爬取完成或取消后的处理，评论已逐页追加到self.comments"""
+        comments = self.comments
         self.start_btn.setEnabled(True)
+        self.pause_btn.setText("暂停")
+        self.pause_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(False)
         
         if comments:
             self.export_btn.setEnabled(True)
             comment_count = len(comments)
-            self.statusBar().showMessage(f"爬取完成，共获取 {comment_count} 条评论数据")
+            if cancelled:
+                self.statusBar().showMessage(f"爬取已取消，已获取 {comment_count} 条评论数据，可以导出")
+            else:
+                self.statusBar().showMessage(f"爬取完成，共获取 {comment_count} 条评论数据")
             
             # 自动生成默认文件名
             if comments:
@@ -713,23 +1238,20 @@ class TmallCommentCrawlerGUI(QMainWindow):
                         item_title = item_title[:30] + '...'
                 
                 current_date = time.strftime("%Y%m%d_%H%M%S", time.localtime())
-                self.default_filename = f"{item_id}_{item_title}_{len(comments)}条评论_{current_date}.xlsx"
-                
-                # 获取应用程序所在目录
-                if getattr(sys, 'frozen', False):
-                    # 如果是打包后的exe，使用可执行文件所在目录
-                    app_dir = os.path.dirname(sys.executable)
-                else:
-                    # 否则使用脚本所在目录
-                    app_dir = os.path.dirname(os.path.abspath(__file__))
+                self.default_filename = f"{item_id}_{item_title}_{len(comments)}条评论_{current_date}{self.export_extension()}"
                 
-                default_path = os.path.join(app_dir, self.default_filename)
+                default_path = os.path.join(self.get_app_dir(), self.default_filename)
                 self.export_path_input.setText(default_path)
         else:
             self.statusBar().showMessage("爬取完成，但未获取到评论数据")
     
+    def selected_export_fields(self):
+        """选中的字段，返回 {字段路径: 显示名称}"""
+        return {api_field: self.field_mappings[api_field]
+                for api_field, checkbox in self.field_checkboxes.items() if checkbox.isChecked()}
+    
     def export_to_excel(self):
-        """导出评论数据到Excel"""
+        """导出评论数据到Excel或Parquet文件（按导出路径的扩展名）"""
         if not self.comments:
             QMessageBox.warning(self, "导出错误", "没有可导出的评论数据")
             return
@@ -741,15 +1263,17 @@ class TmallCommentCrawlerGUI(QMainWindow):
             return
         
         # 获取选中的字段
-        selected_fields = {}
-        for api_field, checkbox in self.field_checkboxes.items():
-            if checkbox.isChecked():
-                selected_fields[api_field] = self.field_mappings[api_field]
+        selected_fields = self.selected_export_fields()
         
         if not selected_fields:
             QMessageBox.warning(self, "导出错误", "请至少选择一个要导出的字段")
             return
         
+        if self.crawl_projection is not None:
+            missing = [name for field, name in selected_fields.items() if field not in self.crawl_projection]
+            if missing:
+                self.log(f"以下字段在爬取时未保留，导出为空: {', '.join(missing)}")
+        
         # 询问是否过滤空评价
         reply = QMessageBox.question(self, "过滤空评价", 
                                    "是否过滤空评价（\"此用户没有填写评价。\"）？",
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+按评论ID去重的索引：同一商品按默认排序和时间排序各爬一遍，或翻页期间有新评论插入导致页面错位时，
+同一条评论会出现多次，在页面到达时用索引丢弃重复的评论
+- 精确模式：评论ID存为整数集合，每个ID约占65字节
+- 布隆过滤器模式：用于数百万ID的长期运行，每个ID约占1.8字节（误判率0.1%时），
+  误判会把极少数新评论当作重复丢弃，不会漏掉重复
+指定path时索引保存到文件，多次运行之间共享
+爬取时新评论的ID先作为待提交的ID参与去重，评论写入输出文件或本地库后再commit，
+save()只写入已提交的ID；输出失败时rollback，下次运行时这些评论仍会输出
+用法:
+  index = DedupIndex('tmall_comment_ids.idx')
+  crawler = TmallCommentCrawler(dedup=index)
+"""
+
+import array
+import hashlib
+import logging
+import math
+import os
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+SET_MAGIC = b'TMIDSET1'
+BLOOM_MAGIC = b'TMBLOOM1'
+BLOOM_HEADER = struct.Struct('<QQQQd')  # 位数, 哈希函数个数, 已加入的ID数, 设计容量, 设计误判率
+
+_INT64_MAX = (1 << 63) - 1
+_MASK64 = (1 << 64) - 1
+
+
+def id_key(comment_id):
+    """
+    评论ID转换为64位整数键：纯数字的ID直接转换，其余ID取哈希值
+    """
+    text = str(comment_id)
+    if text.isdigit() and not text.startswith('0') and int(text) <= _INT64_MAX:
+        return int(text)
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def _mix64(x):
+    """splitmix64混合函数，把相邻的整数ID打散为均匀分布的64位哈希值"""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+class BloomFilter:
+    """
+    布隆过滤器，位数组按设计容量和误判率计算，超过设计容量后误判率逐渐上升
+    :param capacity: 设计容量（ID数）
+    :param error_rate: 达到设计容量时的误判率
+    """
+    def __init__(self, capacity=5000000, error_rate=0.001):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # 双重哈希：由两个64位哈希值得到k个位置
+        h1 = _mix64(key & _MASK64)
+        h2 = _mix64(h1) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key):
+        """加入一个键，返回加入前是否（可能）已存在"""
+        bits = self.bits
+        existed = True
+        for p in self._positions(key):
+            mask = 1 << (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                existed = False
+        if not existed:
+            self.count += 1
+        return existed
+
+    def __len__(self):
+        return self.count
+
+    def to_bytes(self):
+        return BLOOM_HEADER.pack(self.size, self.hashes, self.count, self.capacity, self.error_rate) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        size, hashes, count, capacity, error_rate = BLOOM_HEADER.unpack_from(data)
+        bloom = cls.__new__(cls)
+        bloom.size, bloom.hashes, bloom.count = size, hashes, count
+        bloom.capacity, bloom.error_rate = capacity, error_rate
+        bloom.bits = bytearray(data[BLOOM_HEADER.size:])
+        if len(bloom.bits) != (size + 7) // 8:
+            raise ValueError("布隆过滤器文件已损坏")
+        return bloom
+
+
+class DedupIndex:
+    """
+    评论ID去重索引，线程安全，可在多个爬虫实例和多个商品之间共享
+    :param path: 索引文件路径，为None时只在内存中；文件存在时加载，save()时写回
+    :param bloom: 使用布隆过滤器而不是精确的整数集合
+    :param capacity: 布隆过滤器的设计容量（ID数）
+    :param error_rate: 布隆过滤器的设计误判率
+    """
+    def __init__(self, path=None, bloom=False, capacity=5000000, error_rate=0.001):
+        self.path = path
+        self.seen = 0  # 本次运行检查过的评论数
+        self.duplicates = 0  # 本次运行丢弃的重复评论数
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._warned_capacity = False
+        self._keys = None
+        self._bloom = None
+        self._pending = set()  # 已参与去重、尚未提交的ID
+        if path and os.path.exists(path):
+            self._load(path, bloom)
+        elif bloom:
+            self._bloom = BloomFilter(capacity, error_rate)
+        else:
+            self._keys = set()
+
+    @property
+    def bloom(self):
+        return self._bloom is not None
+
+    def _load(self, path, bloom):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, body = data[:8], data[8:]
+        if magic == SET_MAGIC:
+            keys = array.array('q')
+            keys.frombytes(body)
+            self._keys = set(keys)
+            if bloom:
+                # 精确索引可以转换为布隆过滤器，反之不行
+                self._bloom = BloomFilter(max(len(self._keys) * 2, 1000000))
+                for key in self._keys:
+                    self._bloom.add(key)
+                self._keys = None
+                self._dirty = True
+        elif magic == BLOOM_MAGIC:
+            if not bloom:
+                raise ValueError(f"{path} 是布隆过滤器索引，无法作为精确索引加载")
+            self._bloom = BloomFilter.from_bytes(body)
+        else:
+            raise ValueError(f"{path} 不是评论ID索引文件")
+        logger.info("已加载评论ID索引 %s，共 %d 个ID", path, len(self))
+
+    def __len__(self):
+        with self._lock:
+            return (len(self._bloom) if self._bloom is not None else len(self._keys)) + len(self._pending)
+
+    def __contains__(self, comment_id):
+        key = id_key(comment_id)
+        with self._lock:
+            return self._contains(key)
+
+    def _contains(self, key):
+        return key in self._pending or key in (self._bloom if self._bloom is not None else self._keys)
+
+    def add(self, comment_id):
+        """直接提交一个评论ID，返回是否为新ID；ID为空时不加入索引，视为新ID"""
+        if not comment_id:
+            return True
+        key = id_key(comment_id)
+        with self._lock:
+            if key in self._pending:
+                return False
+            return self._add(key)
+
+    def _add(self, key):
+        if self._bloom is not None:
+            if self._bloom.add(key):
+                return False
+            if self._bloom.count > self._bloom.capacity and not self._warned_capacity:
+                self._warned_capacity = True
+                logger.warning("评论ID布隆过滤器已超过设计容量 %d，误判率将逐渐上升", self._bloom.capacity)
+        else:
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+        self._dirty = True
+        return True
+
+    def filter(self, comments, added=None):
+        """
+        丢弃已见过的评论（包括同一页内重复的和待提交的），新评论的ID加入索引；没有ID的评论无法判断，原样保留
+        :param added: 为列表时新ID只作为待提交的ID，并追加到该列表，之后用commit / rollback处理；
+                      为None时直接提交
+        :return: 去重后的评论列表
+        """
+        keys = [id_key(c['id']) if c.get('id') else None for c in comments]
+        with self._lock:
+            kept = []
+            for c, key in zip(comments, keys):
+                if key is not None:
+                    if key in self._pending:
+                        continue
+                    if added is None:
+                        if not self._add(key):
+                            continue
+                    elif self._contains(key):
+                        continue
+                    else:
+                        self._pending.add(key)
+                        added.append(key)
+                kept.append(c)
+            self.seen += len(comments)
+            self.duplicates += len(comments) - len(kept)
+        return kept
+
+    def commit(self, keys):
+        """评论已写入输出或本地库：提交filter(added=...)得到的ID，之后save()会写入这些ID"""
+        with self._lock:
+            for key in keys:
+                if key in self._pending:
+                    self._pending.discard(key)
+                    self._add(key)
+
+    def rollback(self, keys):
+        """输出失败：撤销filter(added=...)得到的待提交ID，这些评论下次仍视为新评论"""
+        with self._lock:
+            self._pending.difference_update(keys)
+
+    def duplicate_rate(self):
+        """本次运行的重复率（0-1）"""
+        with self._lock:
+            return self.duplicates / self.seen if self.seen else 0.0
+
+    def save(self, path=None):
+        """写回索引文件（只包含已提交的ID），先写临时文件再替换；内容没有变化时不写"""
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            if not self._dirty and path == self.path and os.path.exists(path):
+                return
+            if self._bloom is not None:
+                data = BLOOM_MAGIC + self._bloom.to_bytes()
+            else:
+                data = SET_MAGIC + array.array('q', self._keys).tobytes()
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._dirty = False
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+端到端吞吐测试：启动本地模拟接口（tmall_fake_mtop），用真实的爬虫代码抓取，
+报告页/秒、请求数、各返回码次数以及出错页面的恢复情况，不访问线上接口
+用法:
+  python tmall_comment_e2e.py --concurrency 1,3,8 --rate 20 --pages 50 --latency 0.05
+  python tmall_comment_e2e.py --throttle 0.1 --token-expire 0.02 --illegal-access 0.01 --json -
+"""
+
+import argparse
+import json
+import time
+
+from tmall_comment_batch import BatchCrawler, BatchJob
+from tmall_comment_crawler_cmd import AccountPool, HttpTransport
+from tmall_fake_mtop import FakeMtopServer
+
+
+def run_e2e(server, concurrency=3, rate=10.0, items=1, pages=None, workers=1, backoff_factor=0.05,
+            max_retries=3, accounts=0, adaptive=True, max_rate=None):
+    """
+    对模拟接口运行一次完整的批量爬取
+    :param server: 已启动的FakeMtopServer
+    :param concurrency: 每个商品同时在途的页面请求数
+    :param rate: 合计请求速率上限（次/秒）
+    :param items: 商品数
+    :param pages: 每个商品爬取的页数，为None时按totalPage自动分页
+    :param workers: 同时爬取的商品数
+    :param backoff_factor: 重试退避基数，测试时取较小值以免等待过久
+    :param accounts: 多账号模式的账号数，为0时使用单个Cookie；多账号时rate为每个账号的速率
+    :param adaptive: 是否使用AIMD自适应速率，rate为初始速率
+    :param max_rate: 自适应速率上限，默认为rate的3倍
+    :return: 运行报告字典
+    """
+    server.reset_stats()
+    transport = HttpTransport(pool_size=max(10, concurrency * workers), max_retries=max_retries,
+                              backoff_factor=backoff_factor, max_backoff=2)
+    pool = None
+    if accounts:
+        pool = AccountPool([server.cookie(i) for i in range(accounts)], rate=rate, throttle_quarantine=1,
+                           auth_quarantine=5, adaptive=adaptive, max_rate=max_rate)
+    batch = BatchCrawler(workers=workers, rate_limit=rate, page_concurrency=concurrency,
+                         cookie=server.cookie(), transport=transport, base_url=server.url, accounts=pool,
+                         adaptive=adaptive, max_rate=max_rate)
+    jobs = [BatchJob(f"{9000000 + i}", 1, pages or 'auto') for i in range(items)]
+
+    started = time.monotonic()
+    _, summary = batch.run(jobs)
+    elapsed = time.monotonic() - started
+    transport.close()
+
+    stats = server.stats()
+    latency = batch.metrics.request_seconds
+    return {
+        'concurrency': concurrency,
+        'workers': workers,
+        'rate_limit': rate,
+        'accounts': accounts,
+        'adaptive': adaptive,
+        'final_rate': round(pool.current_rate() if pool else batch.rate_limiter.rate, 3),
+        'items': items,
+        'pages': summary['pages'],
+        'comments': summary['comments'],
+        'failed_pages': summary['failed_pages'],
+        'elapsed': round(elapsed, 3),
+        'pages_per_sec': round((summary['pages'] - summary['failed_pages']) / elapsed, 3) if elapsed > 0 else 0.0,
+        'requests': stats['requests'],
+        'ret_counts': stats['ret_counts'],
+        'pages_with_errors': stats['pages_with_errors'],
+        'pages_recovered': stats['pages_recovered'],
+        'pages_unrecovered': stats['pages_unrecovered'],
+        'latency_p50': round(latency.quantile(0.5), 4),
+        'latency_p95': round(latency.quantile(0.95), 4),
+        'retries': batch.metrics.retries.by_label('reason'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基于本地模拟接口的端到端吞吐测试")
+    parser.add_argument('--concurrency', default='1,3,8', help="每个商品的并发页面数，逗号分隔，逐个测试")
+    parser.add_argument('--rate', type=float, default=20.0, help="请求速率上限（次/秒），多账号时为每个账号的速率")
+    parser.add_argument('--accounts', default='0', help="账号数，逗号分隔逐个测试，0表示单个Cookie")
+    parser.add_argument('--fixed-rate', action='store_true', help="使用固定速率，不做AIMD自适应调整")
+    parser.add_argument('--max-rate', type=float, help="自适应速率上限（默认为 --rate 的3倍）")
+    parser.add_argument('--items', type=int, default=1, help="商品数")
+    parser.add_argument('--workers', type=int, default=1, help="同时爬取的商品数")
+    parser.add_argument('--pages', type=int, default=30, help="模拟接口每个商品的总页数（按totalPage自动分页）")
+    parser.add_argument('--latency', type=float, default=0.05, help="模拟接口每个请求的延迟（秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="额外的随机延迟上限（秒）")
+    parser.add_argument('--throttle', type=float, default=0.0, help="随机限流的概率")
+    parser.add_argument('--max-qps', type=float, help="模拟接口每秒请求数上限")
+    parser.add_argument('--token-expire', type=float, default=0.0, help="随机令牌过期的概率")
+    parser.add_argument('--illegal-access', type=float, default=0.0, help="随机非法访问错误的概率")
+    parser.add_argument('--backoff', type=float, default=0.05, help="重试退避基数（秒）")
+    parser.add_argument('--seed', type=int, default=1, help="随机数种子")
+    parser.add_argument('--json', help="把报告写入JSON文件，为 - 时输出到标准输出")
+    args = parser.parse_args()
+
+    reports = []
+    account_counts = [int(a) for a in args.accounts.split(',') if a.strip()]
+    with FakeMtopServer(total_pages=args.pages, latency=args.latency, jitter=args.jitter,
+                        throttle_rate=args.throttle, max_qps=args.max_qps, token_expire_rate=args.token_expire,
+                        illegal_access_rate=args.illegal_access, seed=args.seed,
+                        accounts=max([1, *account_counts])) as server:
+        for accounts in account_counts:
+            for concurrency in [int(c) for c in args.concurrency.split(',') if c.strip()]:
+                report = run_e2e(server, concurrency=concurrency, rate=args.rate, items=args.items,
+                                 workers=args.workers, backoff_factor=args.backoff, accounts=accounts,
+                                 adaptive=not args.fixed_rate, max_rate=args.max_rate)
+                reports.append(report)
+
+    if args.json == '-':
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+        return
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+    print("账号  并发  页数  失败页   耗时(秒)   页/秒  最终速率  p50(秒)  p95(秒)  请求数  出错页  已恢复  未恢复  返回码")
+    for r in reports:
+        print(f"{r['accounts']:>4}  {r['concurrency']:>4}  {r['pages']:>4}  {r['failed_pages']:>6}  {r['elapsed']:>9.2f}  "
+              f"{r['pages_per_sec']:>6.1f}  {r['final_rate']:>8.2f}  {r['latency_p50']:>7.3f}  {r['latency_p95']:>7.3f}  "
+              f"{r['requests']:>6}  {r['pages_with_errors']:>6}  {r['pages_recovered']:>6}  {r['pages_unrecovered']:>6}  "
+              f"{r['ret_counts']}")
+
+
+if __name__ == "__main__":
+    main()
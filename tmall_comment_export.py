@@ -0,0 +1,610 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import os
+import pickle
+
+from tmall_comment_record import as_dict, field_columns, path_getter
+
+EMPTY_FEEDBACK = "此用户没有填写评价。"
+
+
+# 导出列定义：(列名, 字段路径, 取值方式)，comments_to_frame和各增量输出都按这里展开
+# 取值方式: value 原值（缺失为''）；count 计数（缺失为0）；flag1 值为"1"时为"是"；
+#          flag_true 值为"true"时为"是"；rate 评价类型；sku 商品规格
+EXPORT_COLUMNS = [
+    # 基本信息
+    ('用户昵称', 'userNick', 'value'),
+    ('评论内容', 'feedback', 'value'),
+    ('评论时间', 'createTime', 'value'),
+    ('评论时间间隔', 'createTimeInterval', 'value'),
+    ('评价日期', 'feedbackDate', 'value'),
+    ('评论ID', 'id', 'value'),
+    ('商品ID', 'auctionNumId', 'value'),
+    ('商品标题', 'auctionTitle', 'value'),
+    ('SKUID', 'skuId', 'value'),
+    # 商品规格
+    ('商品规格', 'skuMap', 'sku'),
+    ('规格字符串', 'skuValueStr', 'value'),
+    # 评价相关
+    ('评价类型', 'rateType', 'rate'),
+    ('是否匿名', 'annoy', 'flag1'),
+    ('是否置顶', 'topRate', 'flag1'),
+    ('是否有详情', 'hasDetail', 'flag1'),
+    ('是否复购', 'repeatBusiness', 'flag1'),
+    ('是否金牌用户', 'goldUser', 'flag1'),
+    ('是否黑名单用户', 'formalBlackUser', 'flag_true'),
+    ('是否复制', 'copy', 'flag_true'),
+    ('是否本人', 'own', 'flag_true'),
+    ('结构标签结束大小', 'structTagEndSize', 'value'),
+    # 互动信息
+    ('点赞数', 'interactInfo.likeCount', 'count'),
+    ('评论数', 'interactInfo.commentCount', 'count'),
+    ('阅读数', 'interactInfo.readCount', 'count'),
+    ('是否已点赞', 'interactInfo.alreadyLike', 'flag_true'),
+    ('可否评论', 'interactInfo.enableComment', 'flag_true'),
+    ('可否点赞', 'interactInfo.enableLike', 'flag_true'),
+    ('可否分享', 'interactInfo.enableShare', 'flag_true'),
+    # 商家回复
+    ('商家回复', 'reply', 'value'),
+    # 用户信息
+    ('用户ID', 'userId', 'value'),
+    ('用户信用等级', 'creditLevel', 'value'),
+    ('用户星级', 'userStar', 'value'),
+    ('用户头像URL', 'headPicUrl', 'value'),
+    ('用户头像框URL', 'headFrameUrl', 'value'),
+    ('用户主页URL', 'userIndexURL', 'value'),
+    ('用户标记', 'userMark', 'value'),
+    ('减少用户昵称', 'reduceUserNick', 'value'),
+    # 分享信息
+    ('分享URL', 'share.shareURL', 'value'),
+    ('详情URL', 'share.detailUrl', 'value'),
+    ('详情分享URL', 'share.detailShareUrl', 'value'),
+    ('支持分享', 'share.shareSupport', 'flag_true'),
+    # 添加购物车URL
+    ('添加购物车URL', 'addCartUrl', 'value'),
+    # 权限信息
+    ('允许评论', 'allowComment', 'flag_true'),
+    ('允许互动', 'allowInteract', 'flag_true'),
+    ('允许笔记', 'allowNote', 'flag_true'),
+    ('允许举报评论', 'allowReportReview', 'flag_true'),
+    ('允许举报用户', 'allowReportUser', 'flag_true'),
+    ('允许屏蔽评论', 'allowShieldReview', 'flag_true'),
+    ('允许屏蔽用户', 'allowShieldUser', 'flag_true'),
+    # 额外信息
+    ('用户等级', 'extraInfoMap.userGrade', 'value'),
+    ('举报URL', 'extraInfoMap.report_url', 'value'),
+]
+
+# 用户标签展开的列：(列名后缀, 标签字段)
+USER_TAG_COLUMNS = [('代码', 'tagCode'), ('描述', 'tagDesc'), ('图标', 'tagIconPic')]
+
+# 可导出的字段路径（字段投影时的可选值），用户标签整体为userTagList
+EXPORT_FIELDS = [path for _, path, _ in EXPORT_COLUMNS] + ['userTagList']
+
+
+def parse_field_list(text):
+    """
+    解析逗号分隔的字段路径列表，如 "feedback,createTime,interactInfo.likeCount"
+    :return: 字段路径列表
+    :raises ValueError: 包含未知字段时
+    """
+    fields = [field.strip() for field in text.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in EXPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}，可选字段: {', '.join(EXPORT_FIELDS)}")
+    if not fields:
+        raise ValueError("字段列表为空")
+    return fields
+
+
+def comments_to_frame(comments, fields=None):
+    """
+    按EXPORT_COLUMNS列式展开评论数据，用户标签展开为 用户标签_序号_代码/描述/图标 列
+    原始记录只遍历一次就取出所有需要的列（见field_columns），"是"/"否"标记、评价类型等映射都按整列计算
+    :param comments: 原始评论字典或CommentRecord列表
+    :param fields: 只展开这些字段路径对应的列（用户标签为userTagList），为None时展开全部列
+    :return: pandas.DataFrame
+    """
+    import numpy as np
+    import pandas as pd
+
+    index = pd.RangeIndex(len(comments))
+    selected = [(name, path, kind) for name, path, kind in EXPORT_COLUMNS if fields is None or path in fields]
+    with_tags = fields is None or 'userTagList' in fields
+    raw = field_columns(comments, [path for _, path, _ in selected] + (['userTagList'] if with_tags else []))
+
+    def raw_column(path):
+        """整列原始值（缺失为None），返回一维object数组"""
+        values = raw[path]
+        return np.fromiter(values, dtype=object, count=len(values))
+
+    columns = {}
+    for name, path, kind in selected:
+        values = raw_column(path)
+        if kind in ('value', 'count'):
+            default = 0 if kind == 'count' else ''
+            missing = np.equal(values, None)
+            if missing.any():
+                values[missing] = default
+            columns[name] = values
+        elif kind == 'flag1':
+            columns[name] = np.where(values == '1', '是', '否').astype(object)
+        elif kind == 'flag_true':
+            columns[name] = np.where(values == 'true', '是', '否').astype(object)
+        elif kind == 'rate':
+            columns[name] = np.select([values == '1', values == '0'], ['好评', '中评'], '差评').astype(object)
+        elif kind == 'sku':
+            # 相同规格大量重复，按规格内容缓存拼接结果
+            cache = {}
+            formatted = []
+            for sku_map in values:
+                if isinstance(sku_map, dict) and sku_map:
+                    key = tuple(sku_map.items())
+                    if key not in cache:
+                        cache[key] = ', '.join(f"{k}: {v}" for k, v in key)
+                    formatted.append(cache[key])
+                else:
+                    formatted.append('')
+            columns[name] = np.array(formatted, dtype=object)
+
+    # 导出时按object逐列取值，不再推断字符串类型（pandas的字符串推断对大表开销明显）
+    frame = pd.DataFrame(columns, index=index, dtype=object)
+
+    if not with_tags:
+        return frame
+
+    # 用户标签列表：整体展开后按标签序号拆成列
+    tags = pd.Series(raw_column('userTagList'), index=index)
+    tags = tags[tags.map(lambda t: isinstance(t, list) and len(t) > 0)].explode()
+    if len(tags):
+        position = tags.groupby(level=0).cumcount().to_numpy()
+        tag_dicts = [t if isinstance(t, dict) else {} for t in tags]
+        tag_fields = {field: pd.Series([t.get(field, '') for t in tag_dicts], index=tags.index)
+                      for _, field in USER_TAG_COLUMNS}
+        tag_columns = {}
+        for i in range(position.max() + 1):
+            selected = position == i
+            for suffix, field in USER_TAG_COLUMNS:
+                tag_columns[f'用户标签_{i+1}_{suffix}'] = tag_fields[field][selected].reindex(index)
+        frame = pd.concat([frame, pd.DataFrame(tag_columns, index=index)], axis=1)
+
+    return frame
+
+
+# Excel不允许的控制字符（0x00-0x1F）统一替换为空格，预先编译为转换表
+EXCEL_ILLEGAL_TRANSLATION = {i: ' ' for i in range(32)}
+
+# 单个工作表的最大行数（含表头）
+XLSX_MAX_ROWS = 1048576
+
+
+def sanitize_column(values):
+    """对一整列值移除Excel不允许的控制字符，非字符串值原样保留"""
+    table = EXCEL_ILLEGAL_TRANSLATION
+    return [v.translate(table) if isinstance(v, str) else v for v in values]
+
+
+def field_accessor(field):
+    """
+    把字段名编译为取值函数，嵌套字段用点号表示（如 interactInfo.likeCount），
+    缺失时返回''，与extract_field_column的取值规则相同
+    """
+    if '.' not in field:
+        return lambda comment: comment.get(field, '')
+    getter = path_getter(field)
+    return lambda comment: getter(comment) or ''
+
+
+def column_extractor(field):
+    """
+    把字段名编译为按列取值的函数：评论列表 -> 该字段的值列表，取值规则与extract_field_column相同
+    字段路径只解析一次，适合对同一字段逐块重复取值
+    """
+    if '.' not in field:
+        return lambda comments: [c.get(field, '') for c in comments]
+    getter = path_getter(field)
+    return lambda comments: [getter(c) or '' for c in comments]
+
+
+def extract_field_column(comments, field):
+    """
+    按字段名取出一整列值，嵌套字段用点号表示（如 interactInfo.likeCount），
+    嵌套字段缺失时为''
+    """
+    return column_extractor(field)(comments)
+
+
+def frame_row_chunks(df, chunk_size=5000):
+    """把DataFrame按块转换为行列表，NaN转为空单元格，字符串移除控制字符"""
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        columns = []
+        for name in chunk.columns:
+            values = chunk[name].astype(object)
+            columns.append(sanitize_column(values.where(values.notna(), None).tolist()))
+        yield list(zip(*columns))
+
+
+def write_xlsx(output_file, header, row_chunks):
+    """
+    使用openpyxl的只写模式逐块写入xlsx，行数据随写随落盘，内存占用与总行数无关
+    超过单个工作表的行数上限时自动续写到新的工作表
+    :param header: 表头列名列表
+    :param row_chunks: 可迭代对象，每个元素是一批行（每行为值序列）
+    :return: 写入的数据行数
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(list(header))
+    sheet_rows = 1
+    written = 0
+    for rows in row_chunks:
+        for row in rows:
+            if sheet_rows >= XLSX_MAX_ROWS:
+                sheet = workbook.create_sheet(f'Sheet{len(workbook.worksheets) + 1}')
+                sheet.append(list(header))
+                sheet_rows = 1
+            sheet.append(row)
+            sheet_rows += 1
+            written += 1
+    workbook.save(output_file)
+    return written
+
+
+# Parquet导出的列类型：互动计数按整数存储；低基数字段（商品信息、规格、等级、"是"/"否"标记等）
+# 按字典编码存储，文件更小，读回pandas时为category类型；其余列按字符串存储
+PARQUET_INT_PATHS = {'interactInfo.likeCount', 'interactInfo.commentCount', 'interactInfo.readCount'}
+PARQUET_DICTIONARY_PATHS = {path for _, path, kind in EXPORT_COLUMNS if kind in ('flag1', 'flag_true', 'rate')} | {
+    'auctionNumId', 'auctionTitle', 'skuId', 'skuMap', 'skuValueStr', 'structTagEndSize',
+    'creditLevel', 'userStar', 'headFrameUrl', 'userMark', 'extraInfoMap.userGrade',
+}
+
+
+def parquet_column_kind(path):
+    """按字段路径返回Parquet列类型：'int'、'dictionary'或'string'"""
+    if path in PARQUET_INT_PATHS:
+        return 'int'
+    if path in PARQUET_DICTIONARY_PATHS:
+        return 'dictionary'
+    return 'string'
+
+
+# 展开后的导出列名 -> Parquet列类型，用户标签列都按字典编码
+PARQUET_EXPORT_KINDS = {name: parquet_column_kind(path) for name, path, _ in EXPORT_COLUMNS}
+
+
+def export_column_kind(name):
+    """按展开后的导出列名返回Parquet列类型"""
+    if name.startswith('用户标签_'):
+        return 'dictionary'
+    return PARQUET_EXPORT_KINDS.get(name, 'string')
+
+
+def _to_int(value):
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def arrow_table(names, kinds, columns):
+    """
+    按列类型构建pyarrow.Table
+    :param names: 列名列表
+    :param kinds: 与names对应的列类型列表（'int' / 'dictionary' / 'string'）
+    :param columns: 与names对应的列值列表
+    """
+    import pyarrow as pa
+
+    arrays = []
+    for kind, values in zip(kinds, columns):
+        if kind == 'int':
+            arrays.append(pa.array([_to_int(v) for v in values], type=pa.int64()))
+            continue
+        values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+        array = pa.array(values, type=pa.string())
+        arrays.append(array.dictionary_encode() if kind == 'dictionary' else array)
+    return pa.Table.from_arrays(arrays, names=list(names))
+
+
+def arrow_schema(names, kinds):
+    """与arrow_table对应的表结构"""
+    import pyarrow as pa
+
+    types = {'int': pa.int64(), 'dictionary': pa.dictionary(pa.int32(), pa.string()), 'string': pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind in zip(names, kinds)])
+
+
+def write_parquet(output_file, names, kinds, column_chunks, compression='zstd'):
+    """
+    逐块写入Parquet文件（需要安装pyarrow），每块一个row group，内存占用与总行数无关
+    :param names: 列名列表
+    :param kinds: 与names对应的列类型列表，见parquet_column_kind
+    :param column_chunks: 可迭代对象，每个元素是一批数据的列值列表（与names对应）
+    :return: 写入的数据行数
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("导出Parquet需要安装pyarrow: pip install pyarrow")
+
+    schema = arrow_schema(names, kinds)
+    written = 0
+    with pq.ParquetWriter(output_file, schema, compression=compression) as writer:
+        for columns in column_chunks:
+            table = arrow_table(names, kinds, columns)
+            writer.write_table(table.cast(schema))
+            written += table.num_rows
+    return written
+
+
+def frame_column_chunks(df, chunk_size=50000):
+    """把展开后的DataFrame按块转换为列值列表，NaN转为None"""
+    for start in range(0, len(df), chunk_size):
+        yield frame_columns(df.iloc[start:start + chunk_size])
+
+
+def frame_columns(df, names=None):
+    """
+    按names的顺序取出DataFrame的列值列表，NaN和df中没有的列为None
+    整表一次转换为object数组再按列拆分，不逐列调用pandas（每页都调用时逐列开销远大于数据本身）
+    :param names: 列名列表，为None时为df的全部列
+    """
+    import pandas as pd
+
+    values = df.to_numpy(dtype=object)
+    missing = pd.isna(values)
+    if missing.any():
+        values[missing] = None
+    columns = values.T.tolist()
+    if names is None:
+        return columns
+    positions = {name: i for i, name in enumerate(df.columns)}
+    empty = [None] * len(df)
+    return [columns[positions[name]] if name in positions else empty for name in names]
+
+
+class CommentSink:
+    """
+    增量写盘的评论输出基类：每到一页就按comments_to_frame展开并追加到文件，内存中只保留当前页
+    :param output_file: 输出文件路径
+    :param filter_empty_comments: 是否过滤掉空评价（"此用户没有填写评价。"）
+    :param fields: 只输出这些字段路径对应的列（用户标签为userTagList），为None时输出全部列
+    """
+    def __init__(self, output_file, filter_empty_comments=False, fields=None):
+        self.output_file = output_file
+        self.filter_empty_comments = filter_empty_comments
+        self.fields = fields
+        self.rows_written = 0
+        self.filtered_count = 0
+
+    def write_page(self, comments):
+        """追加一页评论"""
+        if self.filter_empty_comments:
+            kept = [comment for comment in comments if comment.get('feedback', '') != EMPTY_FEEDBACK]
+            self.filtered_count += len(comments) - len(kept)
+            comments = kept
+        if comments:
+            self._write_comments(comments)
+            self.rows_written += len(comments)
+
+    def _write_comments(self, comments):
+        self._write_frame(comments_to_frame(comments, self.fields))
+
+    def _write_frame(self, frame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CsvSink(CommentSink):
+    """
+    CSV输出（utf-8-sig编码，Excel可直接打开）
+    表头由第一页确定；之后的页面出现新的列（如更多的用户标签）时，扩展表头并重写已写入的行，
+    新列在之前的行中为空。用户标签列只有少数几种，重写只会发生几次
+    """
+    def __init__(self, output_file, filter_empty_comments=False, fields=None):
+        super().__init__(output_file, filter_empty_comments, fields)
+        self._file = open(output_file, 'w', encoding='utf-8-sig', newline='')
+        self._writer = None
+        self._fieldnames = []
+
+    def _write_frame(self, frame):
+        new_names = _new_columns(self._fieldnames, frame)
+        if self._writer is None:
+            self._fieldnames = new_names
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self._fieldnames)
+        elif new_names:
+            self._extend_header(self._fieldnames + new_names)
+        self._writer.writerows(zip(*frame_columns(frame, self._fieldnames)))
+        self._file.flush()
+
+    def _extend_header(self, fieldnames):
+        """用扩展后的表头重写已写入的行，然后继续追加"""
+        self._file.close()
+        tmp_path = f"{self.output_file}.tmp"
+        padding = [''] * (len(fieldnames) - len(self._fieldnames))
+        with open(self.output_file, 'r', encoding='utf-8-sig', newline='') as src, \
+                open(tmp_path, 'w', encoding='utf-8-sig', newline='') as dst:
+            reader = csv.reader(src)
+            next(reader, None)
+            writer = csv.writer(dst)
+            writer.writerow(fieldnames)
+            writer.writerows(row + padding for row in reader)
+        os.replace(tmp_path, self.output_file)
+        # 追加模式下不再写入BOM
+        self._file = open(self.output_file, 'a', encoding='utf-8', newline='')
+        self._fieldnames = fieldnames
+        self._writer = csv.writer(self._file)
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlSink(CommentSink):
+    """
+    JSON Lines输出，每行一条评论，只写出该评论有的用户标签列
+    :param raw: 为True时写入接口返回的原始评论字典，而不是展开后的行
+    """
+    def __init__(self, output_file, filter_empty_comments=False, fields=None, raw=False):
+        super().__init__(output_file, filter_empty_comments, fields)
+        self.raw = raw
+        self._file = open(output_file, 'w', encoding='utf-8')
+
+    def _write_comments(self, comments):
+        if self.raw:
+            self._write_lines(as_dict(comment) for comment in comments)
+        else:
+            super()._write_comments(comments)
+
+    def _write_frame(self, frame):
+        names = list(frame.columns)
+        # 展开后只有该评论没有的用户标签列为空
+        self._write_lines({name: value for name, value in zip(names, row) if value is not None}
+                          for row in zip(*frame_columns(frame)))
+
+    def _write_lines(self, rows):
+        self._file.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink(CommentSink):
+    """
+    Parquet输出（需要安装pyarrow），每页写入一个row group
+    表结构由第一页确定，列类型见export_column_kind；之后的页面出现新的列时，从该页起写入新的分段文件，
+    关闭时按最终的列逐个row group合并各分段，之前分段中缺少的列为空
+    """
+    def __init__(self, output_file, filter_empty_comments=False, fields=None):
+        super().__init__(output_file, filter_empty_comments, fields)
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("导出Parquet需要安装pyarrow: pip install pyarrow")
+        self._pq = pq
+        self._writer = None
+        self._names = []
+        self._kinds = []
+        self._segments = []  # 各分段文件路径，第一个分段直接写入output_file
+
+    def _write_frame(self, frame):
+        new_names = _new_columns(self._names, frame)
+        if self._writer is None or new_names:
+            if self._writer is not None:
+                self._writer.close()
+            self._names = self._names + new_names
+            self._kinds = [export_column_kind(name) for name in self._names]
+            self._schema = arrow_schema(self._names, self._kinds)
+            path = self.output_file if not self._segments else f"{self.output_file}.part{len(self._segments)}"
+            self._segments.append(path)
+            self._writer = self._pq.ParquetWriter(path, self._schema, compression='zstd')
+        columns = frame_columns(frame, self._names)
+        self._writer.write_table(arrow_table(self._names, self._kinds, columns).cast(self._schema))
+
+    def close(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        if len(self._segments) > 1:
+            self._merge_segments()
+
+    def _merge_segments(self):
+        """按最终的表结构逐个row group合并分段文件，缺少的列补为空值"""
+        import pyarrow as pa
+
+        tmp_path = f"{self.output_file}.tmp"
+        with self._pq.ParquetWriter(tmp_path, self._schema, compression='zstd') as writer:
+            for path in self._segments:
+                segment = self._pq.ParquetFile(path)
+                for i in range(segment.num_row_groups):
+                    table = segment.read_row_group(i)
+                    arrays = [table.column(field.name) if field.name in table.column_names
+                              else pa.nulls(table.num_rows, type=field.type) for field in self._schema]
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        os.replace(tmp_path, self.output_file)
+        for path in self._segments[1:]:
+            os.remove(path)
+        self._segments = [self.output_file]
+
+
+class XlsxSink(CommentSink):
+    """
+    xlsx输出（openpyxl只写模式，见write_xlsx）
+    只写模式的表头必须最先写入，而用户标签有几列要看完所有页面才知道，所以每页展开后先按列追加到临时文件，
+    关闭时按最终的表头逐页读回写入工作簿并清洗控制字符；整个过程内存中只有一页
+    """
+    def __init__(self, output_file, filter_empty_comments=False, fields=None):
+        super().__init__(output_file, filter_empty_comments, fields)
+        self._spill_path = f"{output_file}.rows.tmp"
+        self._spill = open(self._spill_path, 'wb')
+        self._names = []
+
+    def _write_frame(self, frame):
+        self._names = self._names + _new_columns(self._names, frame)
+        pickle.dump((list(frame.columns), frame_columns(frame)), self._spill, pickle.HIGHEST_PROTOCOL)
+
+    def _row_chunks(self):
+        """按最终的表头逐页读回临时文件中的行"""
+        with open(self._spill_path, 'rb') as f:
+            while True:
+                try:
+                    names, columns = pickle.load(f)
+                except EOFError:
+                    return
+                by_name = dict(zip(names, columns))
+                empty = [None] * len(columns[0])
+                yield list(zip(*(sanitize_column(by_name.get(name, empty)) for name in self._names)))
+
+    def close(self):
+        if self._spill is None:
+            return
+        self._spill.close()
+        self._spill = None
+        try:
+            if self.rows_written:
+                write_xlsx(self.output_file, self._names, self._row_chunks())
+        finally:
+            os.remove(self._spill_path)
+
+
+def _new_columns(names, frame):
+    """frame中出现、names中还没有的列名，按列的顺序"""
+    known = set(names)
+    return [name for name in frame.columns if name not in known]
+
+
+SINK_TYPES = {
+    '.xlsx': XlsxSink,
+    '.csv': CsvSink,
+    '.jsonl': JsonlSink,
+    '.parquet': ParquetSink,
+}
+
+
+def open_sink(output_file, filter_empty_comments=False, fields=None):
+    """
+    根据文件扩展名创建对应的增量输出（.xlsx / .csv / .jsonl / .parquet）
+    :param fields: 只输出这些字段路径对应的列，为None时输出全部列
+    """
+    ext = os.path.splitext(output_file)[1].lower()
+    if ext not in SINK_TYPES:
+        raise ValueError(f"不支持的输出格式: {ext}，可选: {', '.join(SINK_TYPES)}")
+    return SINK_TYPES[ext](output_file, filter_empty_comments, fields)
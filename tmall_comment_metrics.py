@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+运行指标：计数器、直方图和仪表，线程安全，可导出为Prometheus文本格式
+（写入文件供node_exporter的textfile收集器读取，或在本地开一个HTTP端点供抓取），
+并生成运行结束时的中文汇总
+用法:
+  registry = MetricsRegistry()
+  crawler = TmallCommentCrawler(metrics=registry)
+  ...
+  registry.write_prometheus('tmall.prom')
+  for line in crawler.metrics.summary_lines(): print(line)
+"""
+
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 请求延迟、解析耗时等的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 响应体大小的分桶（字节）
+BYTES_BUCKETS = (1024, 4096, 16384, 32768, 65536, 131072, 262144, 1048576)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """指标基类，按标签组合分别记录"""
+    kind = ''
+
+    def __init__(self, name, help_text=''):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def labelsets(self):
+        """已记录的标签组合列表，每项为标签字典"""
+        with self._lock:
+            return [dict(key) for key in self._values]
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """只增不减的计数器，如请求数、字节数、累计等待时间"""
+    kind = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def total(self):
+        """所有标签组合的合计"""
+        with self._lock:
+            return sum(self._values.values())
+
+    def by_label(self, name):
+        """按某个标签汇总，返回 {标签值: 合计}"""
+        result = {}
+        with self._lock:
+            for key, value in self._values.items():
+                label = dict(key).get(name, '')
+                result[label] = result.get(label, 0) + value
+        return result
+
+    def exposition(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    """可增可减的仪表，如当前请求速率、在途页面数"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, value=1, **labels):
+        self.inc(-value, **labels)
+
+
+class Histogram(_Metric):
+    """
+    直方图：按分桶统计观测值的分布，同时记录总和与次数，可估算分位数
+    :param buckets: 各分桶的上界（升序），最后自动追加+Inf
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help_text='', buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各分桶计数（最后一个为+Inf）, 总和, 次数]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _merged(self, labels=None):
+        """合并指定标签组合（None表示全部）的分桶计数，返回 (分桶计数, 总和, 次数)"""
+        counts = [0] * (len(self.buckets) + 1)
+        total, count = 0.0, 0
+        with self._lock:
+            if labels is None:
+                states = list(self._values.values())
+            else:
+                key = _label_key(labels)
+                states = [self._values[key]] if key in self._values else []
+            for bucket_counts, state_sum, state_count in states:
+                for i, n in enumerate(bucket_counts):
+                    counts[i] += n
+                total += state_sum
+                count += state_count
+        return counts, total, count
+
+    def count(self, labels=None):
+        return self._merged(labels)[2]
+
+    def sum(self, labels=None):
+        return self._merged(labels)[1]
+
+    def mean(self, labels=None):
+        _, total, count = self._merged(labels)
+        return total / count if count else 0.0
+
+    def quantile(self, q, labels=None):
+        """
+        按分桶线性插值估算分位数（与Prometheus的histogram_quantile相同），落在+Inf桶时返回最大的有限上界
+        :param q: 0-1之间的分位点，如0.95
+        :param labels: 只统计该标签组合，None表示所有标签合并
+        """
+        counts, _, count = self._merged(labels)
+        if not count:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for i, n in enumerate(counts):
+            if cumulative + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.buckets[-1]
+
+    def exposition(self):
+        lines = self._header()
+        with self._lock:
+            items = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._values.items())
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(float(bound)))])} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    指标注册表：按名称获取或创建指标，同名指标只创建一次，可在多个爬虫实例和线程之间共享
+    :param prefix: 指标名前缀
+    """
+    def __init__(self, prefix='tmall_'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._server = None
+        self._thread = None
+
+    def _get(self, cls, name, help_text, **kwargs):
+        full_name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = cls(full_name, help_text, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"指标 {full_name} 已注册为 {metric.kind} 类型")
+            return metric
+
+    def counter(self, name, help_text=''):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=''):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text='', buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def to_prometheus(self):
+        """导出为Prometheus文本格式"""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.exposition())
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """写入Prometheus文本文件，先写临时文件再替换，避免收集器读到写了一半的文件"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve(self, port=9108, host='127.0.0.1'):
+        """
+        在后台线程开启本地HTTP端点，GET任意路径返回Prometheus文本格式的指标
+        :return: 实际监听的端口（port为0时由系统分配）
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self._server.server_port
+
+    def close(self):
+        """关闭HTTP端点"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class CrawlMetrics:
+    """
+    爬虫使用的一组指标，统一在这里定义名称和说明，多个爬虫实例共享同一个注册表时指标会合并累计
+    :param registry: 指标注册表，为None时新建
+    """
+    def __init__(self, registry=None):
+        self.registry = registry if registry is not None else MetricsRegistry()
+        r = self.registry
+        self.requests = r.counter('requests_total', "评论接口请求数，按返回码（ret）分类")
+        self.request_seconds = r.histogram('request_seconds', "单次请求的网络耗时（秒）")
+        self.response_bytes = r.counter('response_bytes_total', "接收的响应体字节数")
+        self.response_size = r.histogram('response_bytes', "单个响应体的大小（字节）", BYTES_BUCKETS)
+        self.parse_seconds = r.histogram('parse_seconds', "JSONP响应解析耗时（秒）")
+        self.pages = r.counter('pages_total', "完成的页面数，按状态（ok/cached/failed）分类")
+        self.comments = r.counter('comments_total', "交付的评论数（去重和入库之后，不含取消时未交付的页面）")
+        self.duplicates = r.counter('duplicates_total', "去重索引丢弃的重复评论数")
+        self.retries = r.counter('retries_total', "重试次数，按原因分类")
+        self.sleep_seconds = r.counter('sleep_seconds_total', "等待时间（秒），按原因分类（速率预算/退避）")
+        self.export_seconds = r.histogram('export_seconds', "导出文件耗时（秒），按格式分类")
+        self.rate = r.gauge('request_rate', "当前请求速率（次/秒）")
+        self.inflight = r.gauge('inflight_pages', "正在请求中的页面数")
+
+    def summary_lines(self):
+        """运行结束时的中文汇总，每项一行"""
+        lines = []
+        if self.requests.total():
+            ret_counts = ', '.join(f"{ret} {n}" for ret, n in sorted(self.requests.by_label('ret').items(),
+                                                                      key=lambda item: -item[1]))
+            latency = self.request_seconds
+            lines.append(f"请求 {self.requests.total()} 次，返回码: {ret_counts}")
+            lines.append(f"请求延迟: 平均 {latency.mean():.3f} 秒，p50 {latency.quantile(0.5):.3f} 秒，"
+                         f"p95 {latency.quantile(0.95):.3f} 秒，p99 {latency.quantile(0.99):.3f} 秒")
+            lines.append(f"接收 {self.response_bytes.total() / 1048576:.2f} MB，"
+                         f"解析耗时 {self.parse_seconds.sum():.2f} 秒")
+        pages = self.pages.by_label('status')
+        if pages:
+            lines.append(f"页面: 成功 {pages.get('ok', 0)}，缓存 {pages.get('cached', 0)}，失败 {pages.get('failed', 0)}，"
+                         f"评论 {self.comments.total()} 条")
+        if self.duplicates.total():
+            lines.append(f"去重: 重复评论 {self.duplicates.total()} 条，"
+                         f"重复率 {self.duplicates.total() / max(1, self.comments.total()) * 100:.1f}%")
+        retries = self.retries.by_label('reason')
+        if retries:
+            lines.append("重试: " + ', '.join(f"{reason} {n}" for reason, n in sorted(retries.items())))
+        sleeps = self.sleep_seconds.by_label('reason')
+        if sleeps:
+            lines.append("等待: " + ', '.join(f"{reason} {seconds:.1f} 秒" for reason, seconds in sorted(sleeps.items())))
+        if self.export_seconds.count():
+            lines.append(f"导出 {self.export_seconds.count()} 次，耗时 {self.export_seconds.sum():.2f} 秒")
+        return lines
@@ -0,0 +1,463 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+紧凑的评论记录：解析后立即把接口返回的评论字典转换为CommentRecord，常驻内存约为原始字典的十分之一
+- 用__slots__代替每条记录一个60多个键的字典，键名不再逐条保存
+- "true"/"false"/"0"/"1"标记、商品标题、规格、等级等低基数值共享同一个对象，
+  共享表（ValuePool）属于一个爬虫实例，每次爬取结束时清空，不会在长期运行中累积
+- interactInfo / share / extraInfoMap 按固定键顺序存为元组并共享，
+  share和举报URL中的评论ID替换为占位符后再共享，取值时还原
+- skuMap、userTagList按内容共享同一个对象（只读）
+- 评论ID存为整数
+取值接口与字典兼容（get / [] / in / keys / items），dict(record)或to_dict()可还原为原始字典
+指定字段投影（Projection）时只保留需要的字段，其余字段解析后即丢弃
+"""
+
+from collections.abc import Mapping
+from itertools import repeat
+from operator import attrgetter, itemgetter
+
+# 直接存放在槽位中的顶层字段
+SCALAR_FIELDS = (
+    'userNick', 'feedback', 'createTime', 'createTimeInterval', 'feedbackDate', 'id', 'auctionNumId',
+    'auctionTitle', 'skuId', 'skuValueStr', 'rateType', 'annoy', 'topRate', 'hasDetail', 'repeatBusiness',
+    'goldUser', 'formalBlackUser', 'copy', 'own', 'structTagEndSize', 'reply', 'userId', 'creditLevel',
+    'userStar', 'userStarPic', 'headPicUrl', 'headFrameUrl', 'userIndexURL', 'userMark', 'reduceUserNick',
+    'addCartUrl', 'allowComment', 'allowInteract', 'allowNote', 'allowReportReview', 'allowReportUser',
+    'allowShieldReview', 'allowShieldUser',
+)
+
+# 基本每条都不同的字段，不做共享
+UNIQUE_FIELDS = frozenset(('userNick', 'feedback', 'id', 'reply', 'userMark', 'reduceUserNick'))
+
+# 按固定键顺序存为元组的嵌套字段：字段名 -> 子键顺序
+NESTED_FIELDS = {
+    'interactInfo': ('alreadyLike', 'commentCount', 'enableComment', 'enableLike', 'enableShare', 'likeCount',
+                     'readCount'),
+    'share': ('detailShareUrl', 'detailUrl', 'shareSupport', 'shareURL'),
+    'extraInfoMap': ('userGrade', 'report_url'),
+}
+
+# 按内容共享同一个对象的字段（字典或列表，只读）
+SHARED_FIELDS = ('skuMap', 'userTagList')
+
+# 嵌套字段中评论ID的占位符
+ID_PLACEHOLDER = '\x00'
+
+# 共享值表的容量上限，超出后不再加入新值（已共享的值不受影响）
+MAX_SHARED_VALUES = 1 << 17
+
+_MISSING = object()
+
+
+class ValuePool:
+    """
+    共享值表：相等的值只保留第一次遇到的对象
+    记录只引用共享的对象，不引用表本身，清空表不影响已构建的记录
+    :param capacity: 容量上限，超出后不再加入新值（已共享的值不受影响）
+    """
+    def __init__(self, capacity=MAX_SHARED_VALUES):
+        self.capacity = capacity
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def share(self, value):
+        """返回与value相等的共享对象，值必须可哈希"""
+        shared = self._values.get(value)
+        if shared is not None:
+            return shared
+        if len(self._values) < self.capacity:
+            return self._values.setdefault(value, value)
+        return value
+
+    def share_content(self, value):
+        """字典或列表按内容共享，内容用于查找，共享的是第一次遇到的对象"""
+        try:
+            key = ('content', repr(value))
+        except Exception:
+            return value
+        shared = self._values.get(key)
+        if shared is not None:
+            return shared
+        if len(self._values) < self.capacity:
+            return self._values.setdefault(key, value)
+        return value
+
+    def clear(self):
+        self._values.clear()
+
+
+def _pack_id(value):
+    """纯数字、无前导零的评论ID存为整数"""
+    if isinstance(value, str) and value.isdigit() and not value.startswith('0'):
+        return int(value)
+    return value
+
+
+def _pack_nested(value, keys, rate_id, pool):
+    """嵌套字典按keys顺序转换为共享元组，键不一致时返回None（原样保存）"""
+    if not isinstance(value, dict) or len(value) != len(keys):
+        return None
+    packed = []
+    for key in keys:
+        item = value.get(key, _MISSING)
+        if item is _MISSING or not (item is None or isinstance(item, str)):
+            return None
+        if rate_id and item and rate_id in item:
+            item = item.replace(rate_id, ID_PLACEHOLDER)
+        packed.append(item)
+    return pool.share(tuple(packed))
+
+
+class CommentRecord(Mapping):
+    """
+    紧凑的评论记录，与原始评论字典按相同的方式取值
+    记录及其中共享的skuMap / userTagList对象都应视为只读
+    """
+    __slots__ = SCALAR_FIELDS + tuple(NESTED_FIELDS) + SHARED_FIELDS + ('_extra',)
+
+    @classmethod
+    def from_dict(cls, comment, keys=None, pool=None):
+        """
+        从接口返回的评论字典构建记录，已经是CommentRecord时原样返回
+        :param keys: 只保留这些顶层字段，为None时保留全部
+        :param pool: 共享值表（ValuePool），为None时只在这条记录内共享
+        """
+        if isinstance(comment, CommentRecord):
+            return comment
+        if pool is None:
+            pool = ValuePool()
+        record = cls.__new__(cls)
+        extra = None
+        for key, value in comment.items():
+            if keys is not None and key not in keys:
+                continue
+            if key in _SCALAR_SET:
+                if key == 'id':
+                    value = _pack_id(value)
+                elif key not in UNIQUE_FIELDS and isinstance(value, str):
+                    value = pool.share(value)
+                setattr(record, key, value)
+            elif key in NESTED_FIELDS:
+                packed = _pack_nested(value, NESTED_FIELDS[key], str(comment.get('id') or ''), pool)
+                if packed is None:
+                    extra = extra or {}
+                    extra[key] = value
+                else:
+                    setattr(record, key, packed)
+            elif key in SHARED_FIELDS:
+                setattr(record, key, pool.share_content(value))
+            else:
+                extra = extra or {}
+                extra[key] = value
+        record._extra = extra
+        return record
+
+    def _rate_id(self):
+        value = getattr(self, 'id', '')
+        return '' if value is None else str(value)
+
+    def _unpack_nested(self, key, packed):
+        rate_id = None
+        values = []
+        for item in packed:
+            if item and ID_PLACEHOLDER in item:
+                if rate_id is None:
+                    rate_id = self._rate_id()
+                item = item.replace(ID_PLACEHOLDER, rate_id)
+            values.append(item)
+        return dict(zip(NESTED_FIELDS[key], values))
+
+    def get(self, key, default=None):
+        if key in _PLAIN_SET:
+            # 顶层字段原样存放在槽位中，不会出现在_extra里
+            return getattr(self, key, default)
+        value = getattr(self, key, _MISSING) if key in _SLOT_SET else _MISSING
+        if value is _MISSING:
+            # 未知字段和无法压缩的嵌套字段原样保存在_extra中
+            return self._extra.get(key, default) if self._extra is not None else default
+        if key == 'id' and isinstance(value, int):
+            return str(value)
+        if key in NESTED_FIELDS:
+            return self._unpack_nested(key, value)
+        return value
+
+    def get_path(self, path, default=None):
+        """
+        按字段路径取值，嵌套字段用点号表示（如 interactInfo.likeCount），缺失时返回default
+        嵌套字段直接从元组中取值，不构建中间字典
+        """
+        if '.' not in path:
+            return self.get(path, default)
+        parent, child = path.split('.', 1)
+        keys = NESTED_FIELDS.get(parent)
+        packed = getattr(self, parent, None) if keys is not None else None
+        if packed is None:
+            value = self.get(parent)
+            for part in child.split('.'):
+                if not isinstance(value, dict):
+                    return default
+                value = value.get(part, _MISSING)
+                if value is _MISSING:
+                    return default
+            return value
+        try:
+            item = packed[keys.index(child)]
+        except ValueError:
+            return default
+        if item and ID_PLACEHOLDER in item:
+            item = item.replace(ID_PLACEHOLDER, self._rate_id())
+        return item
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        if key in _SLOT_SET and hasattr(self, key):
+            return True
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key in _SLOTS:
+            if hasattr(self, key):
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        """还原为原始评论字典"""
+        return {key: self.get(key) for key in self}
+
+    def __repr__(self):
+        return f"CommentRecord(id={self.get('id')!r}, feedback={self.get('feedback')!r})"
+
+    def __reduce__(self):
+        return CommentRecord.from_dict, (self.to_dict(),)
+
+
+_SCALAR_SET = frozenset(SCALAR_FIELDS)
+_SLOTS = SCALAR_FIELDS + tuple(NESTED_FIELDS) + SHARED_FIELDS
+_SLOT_SET = frozenset(_SLOTS)
+_PLAIN_SET = _SCALAR_SET - {'id'}
+
+
+def to_records(comments, projection=None, pool=None):
+    """
+    把一页评论字典转换为CommentRecord列表
+    :param projection: 字段投影（Projection），为None时保留全部字段
+    :param pool: 共享值表（ValuePool），在多页之间共享低基数值；为None时只在这一页内共享
+    """
+    keys = projection.keys if projection is not None else None
+    if pool is None:
+        pool = ValuePool()
+    return [CommentRecord.from_dict(c, keys, pool) for c in comments]
+
+
+def as_dict(comment):
+    """评论的字典形式，用于JSON序列化；原始字典原样返回"""
+    return comment if isinstance(comment, dict) else comment.to_dict()
+
+
+def path_getter(path):
+    """
+    把字段路径编译为取值函数，缺失时返回None，CommentRecord和原始字典都适用
+    嵌套字段用点号表示（如 interactInfo.likeCount）
+    """
+    parts = path.split('.')
+    parent = parts[0]
+    nested_keys = NESTED_FIELDS.get(parent) if len(parts) == 2 else None
+    # 压缩为元组的嵌套字段预先算好下标，取值时不再拆分路径
+    index = nested_keys.index(parts[1]) if nested_keys and parts[1] in nested_keys else None
+
+    def get(comment):
+        if type(comment) is CommentRecord:
+            if index is not None:
+                packed = getattr(comment, parent, None)
+                if packed is not None:
+                    item = packed[index]
+                    if item and ID_PLACEHOLDER in item:
+                        item = item.replace(ID_PLACEHOLDER, comment._rate_id())
+                    return item
+            return comment.get_path(path)
+        value = comment
+        for part in parts:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value
+    return get
+
+
+def field_columns(comments, paths):
+    """
+    一次遍历取出多个字段路径的整列值（缺失为None），CommentRecord和原始字典都适用，取值规则与path_getter相同
+    每条记录的顶层字段用一次C层的map取出后整体转置，嵌套字段先取出父字段再整体展开，
+    不再每列、每行各调用一次取值函数
+    :param comments: CommentRecord或原始评论字典列表
+    :param paths: 字段路径列表，嵌套字段用点号表示（如 interactInfo.likeCount）
+    :return: 字段路径 -> 值序列（列表或元组）
+    """
+    paths = list(dict.fromkeys(paths))
+    if not comments:
+        return {path: [] for path in paths}
+    if all(type(c) is CommentRecord for c in comments):
+        return _record_columns(comments, paths)
+    if all(type(c) is dict for c in comments):
+        return _dict_columns(comments, paths)
+    return {path: [get(c) for c in comments] for path, get in zip(paths, map(path_getter, paths))}
+
+
+def _split_paths(paths):
+    """把字段路径分为顶层字段和 父字段 -> 子键列表；超过两级的路径单独返回"""
+    top, children, deep = [], {}, []
+    for path in paths:
+        parts = path.split('.')
+        if len(parts) > 2:
+            deep.append(path)
+            continue
+        if parts[0] not in top:
+            top.append(parts[0])
+        if len(parts) == 2:
+            children.setdefault(parts[0], []).append(parts[1])
+    return top, children, deep
+
+
+def _tuple_getter(getter, keys):
+    """operator.itemgetter / attrgetter 只有一个键时不返回元组，统一为元组"""
+    get = getter(*keys)
+    if len(keys) == 1:
+        return lambda obj: (get(obj),)
+    return get
+
+
+def _dict_rows(dicts, keys):
+    """每个字典按keys取值为一个元组（缺失为None）；全部键齐全时走C层的itemgetter"""
+    try:
+        return list(map(_tuple_getter(itemgetter, keys), dicts))
+    except (KeyError, TypeError):
+        missing = (None,) * len(keys)
+        return [tuple(map(d.get, keys)) if type(d) is dict else missing for d in dicts]
+
+
+def _dict_columns(comments, paths):
+    top, children, deep = _split_paths(paths)
+    top_columns = dict(zip(top, zip(*_dict_rows(comments, top))))
+    columns = {}
+    for parent, keys in children.items():
+        columns.update(zip((f"{parent}.{key}" for key in keys), zip(*_dict_rows(top_columns[parent], keys))))
+    for path in deep:
+        get = path_getter(path)
+        columns[path] = [get(c) for c in comments]
+    return {path: columns[path] if path in columns else top_columns[path] for path in paths}
+
+
+def _record_columns(comments, paths):
+    top, children, deep = _split_paths(paths)
+    slots = [key for key in top if key in _SLOT_SET]
+    top_columns = {}
+    if slots:
+        try:
+            rows = list(map(_tuple_getter(attrgetter, slots), comments))
+        except AttributeError:
+            # 投影或缺失的字段没有设置槽位
+            count = len(slots)
+            rows = [tuple(map(getattr, repeat(c, count), slots, repeat(None, count))) for c in comments]
+        top_columns = dict(zip(slots, zip(*rows)))
+    for key in top:
+        if key not in _SLOT_SET:
+            top_columns[key] = [c.get(key) for c in comments]
+    if 'id' in top_columns:
+        top_columns['id'] = [str(v) if type(v) is int else v for v in top_columns['id']]
+
+    columns = {}
+    rate_ids = None
+    for parent, keys in children.items():
+        nested_keys = NESTED_FIELDS.get(parent)
+        if nested_keys is None or any(key not in nested_keys for key in keys):
+            for key in keys:
+                get = path_getter(f"{parent}.{key}")
+                columns[f"{parent}.{key}"] = [get(c) for c in comments]
+            continue
+        missing = (None,) * len(nested_keys)
+        packed = top_columns[parent]
+        # 无法压缩的嵌套字段原样保存在_extra中，按子键顺序补成元组
+        packed = [p if p is not None else _nested_from_extra(c, parent, nested_keys, missing)
+                  for c, p in zip(comments, packed)]
+        unpacked = list(zip(*packed))
+        for key in keys:
+            values = unpacked[nested_keys.index(key)]
+            if any(v and ID_PLACEHOLDER in v for v in set(values) if isinstance(v, str)):
+                if rate_ids is None:
+                    rate_ids = [c._rate_id() for c in comments]
+                values = [v.replace(ID_PLACEHOLDER, rate_id) if v and ID_PLACEHOLDER in v else v
+                          for v, rate_id in zip(values, rate_ids)]
+            columns[f"{parent}.{key}"] = values
+    for path in deep:
+        get = path_getter(path)
+        columns[path] = [get(c) for c in comments]
+    return {path: columns[path] if path in columns else top_columns[path] for path in paths}
+
+
+def _nested_from_extra(record, parent, keys, missing):
+    value = record._extra.get(parent) if record._extra is not None else None
+    if not isinstance(value, dict):
+        return missing
+    return tuple(map(value.get, keys))
+
+
+class Projection:
+    """
+    字段投影：只保留指定的字段，在解析时就丢弃其余字段（URL、用户标签等大块数据），减少常驻内存，
+    导出时也只展开投影的字段
+    :param fields: 字段路径列表，嵌套字段用点号表示（如 interactInfo.likeCount）
+    """
+    # 始终保留的字段：评论ID用于去重和入库，评论内容用于过滤空评价，商品ID和标题用于生成文件名
+    REQUIRED_KEYS = frozenset(('id', 'feedback', 'auctionNumId', 'auctionTitle'))
+
+    def __init__(self, fields):
+        self.fields = tuple(dict.fromkeys(fields))
+        if not self.fields:
+            raise ValueError("字段投影至少需要一个字段")
+        self.keys = frozenset(field.split('.', 1)[0] for field in self.fields) | self.REQUIRED_KEYS
+        # 原始字典投影时嵌套字段只保留用到的子键：父字段 -> 子键集合，None表示保留整个字段
+        self._children = {}
+        for field in self.fields:
+            parent, _, child = field.partition('.')
+            if not child or self._children.get(parent, ()) is None:
+                self._children[parent] = None
+            else:
+                self._children.setdefault(parent, set()).add(child.split('.', 1)[0])
+
+    def __contains__(self, field):
+        """该字段路径在投影后是否仍有值"""
+        parent, _, child = field.partition('.')
+        if parent in self.REQUIRED_KEYS:
+            return True
+        if parent not in self._children:
+            return False
+        children = self._children[parent]
+        return children is None or not child or child.split('.', 1)[0] in children
+
+    def __repr__(self):
+        return f"Projection({list(self.fields)!r})"
+
+    def apply(self, comment):
+        """返回只包含投影字段的原始评论字典"""
+        projected = {}
+        for key, value in comment.items():
+            if key not in self.keys:
+                continue
+            children = self._children.get(key)
+            if children is not None and isinstance(value, dict):
+                value = {k: v for k, v in value.items() if k in children}
+            projected[key] = value
+        return projected
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from tmall_comment_record import as_dict
+
+
+def comment_key(comment):
+    """
+    评论在库中的键：有评论ID时为评论ID；没有ID时为评论内容的哈希，
+    否则所有无ID的评论共用''这个键，只有第一条能入库，还原页面时会重复这一条
+    """
+    comment_id = comment.get('id')
+    if comment_id:
+        return str(comment_id)
+    content = json.dumps(as_dict(comment), ensure_ascii=False, sort_keys=True)
+    return 'sha1:' + hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class CommentStore:
+    """
+    基于SQLite的本地评论库
+    - comments: 按 (商品ID, 评论ID) 去重保存原始评论，没有ID的评论按内容哈希去重（见comment_key）
+    - pages: 记录每个 (商品ID, 排序方式, 页码) 抓到了哪些评论，用于断点续爬时还原页面
+    - checkpoints: 每个 (商品ID, 排序方式) 已连续完成的最后一页
+    同一个实例可以在多个线程间共享
+    :param path: 数据库文件路径
+    """
+    def __init__(self, path='tmall_comments.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS comments (
+                auction_num_id TEXT NOT NULL,
+                id TEXT NOT NULL,
+                raw TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                PRIMARY KEY (auction_num_id, id)
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                auction_num_id TEXT NOT NULL,
+                order_type TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                comment_ids TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (auction_num_id, order_type, page)
+            );
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                auction_num_id TEXT NOT NULL,
+                order_type TEXT NOT NULL,
+                last_page INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (auction_num_id, order_type)
+            );
+        """)
+        self._conn.commit()
+
+    def add_page(self, item_id, order_type, page, comments, advance_checkpoint=True):
+        """
+        保存一页评论（已存在的评论ID会被忽略），并在同一事务中推进断点
+        :param advance_checkpoint: 是否把断点推进到该页；之前有失败页时应为False，保证断点之前的页面都是完整的
+        :return: 新增的评论数
+        """
+        item_id = str(item_id)
+        now = time.time()
+        ids = [comment_key(c) for c in comments]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO comments (auction_num_id, id, raw, first_seen) VALUES (?, ?, ?, ?)",
+                [(item_id, cid, json.dumps(as_dict(c), ensure_ascii=False), now)
+                 for cid, c in zip(ids, comments)]
+            )
+            added = self._conn.total_changes - before
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (auction_num_id, order_type, page, comment_ids, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (item_id, order_type, page, json.dumps(ids), now)
+            )
+            if advance_checkpoint:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints (auction_num_id, order_type, last_page, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (item_id, order_type, page, now)
+                )
+        return added
+
+    def known_ids(self, item_id, ids):
+        """返回ids中已经保存过的评论ID集合"""
+        ids = [str(i) for i in ids if i]
+        if not ids:
+            return set()
+        placeholders = ','.join('?' * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM comments WHERE auction_num_id = ? AND id IN ({placeholders})",
+                [str(item_id)] + ids
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def get_checkpoint(self, item_id, order_type=""):
+        """返回已连续完成的最后一页页码，没有断点时返回0"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_page FROM checkpoints WHERE auction_num_id = ? AND order_type = ?",
+                (str(item_id), order_type)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def set_checkpoint(self, item_id, order_type, last_page):
+        """手动设置断点，last_page为0表示清除"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (auction_num_id, order_type, last_page, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (str(item_id), order_type, last_page, time.time())
+            )
+
+    def iter_pages(self, item_id, order_type, start_page, end_page):
+        """
+        按页码顺序读取已保存的页面
+        :return: 生成器，每次产出 (页码, 该页评论列表)
+        """
+        item_id = str(item_id)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page, comment_ids FROM pages "
+                "WHERE auction_num_id = ? AND order_type = ? AND page BETWEEN ? AND ? ORDER BY page",
+                (item_id, order_type, start_page, end_page)
+            ).fetchall()
+        for page, comment_ids in rows:
+            ids = json.loads(comment_ids)
+            if not ids:
+                yield page, []
+                continue
+            placeholders = ','.join('?' * len(ids))
+            with self._lock:
+                raws = dict(self._conn.execute(
+                    f"SELECT id, raw FROM comments WHERE auction_num_id = ? AND id IN ({placeholders})",
+                    [item_id] + ids
+                ).fetchall())
+            yield page, [json.loads(raws[cid]) for cid in ids if cid in raws]
+
+    def load_comments(self, item_id):
+        """读取某个商品保存的全部评论（按首次入库时间排序）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT raw FROM comments WHERE auction_num_id = ? ORDER BY first_seen, rowid",
+                (str(item_id),)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def count(self, item_id):
+        """某个商品已保存的评论数"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM comments WHERE auction_num_id = ?", (str(item_id),)
+            ).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    磁盘响应缓存（SQLite），以规范化后的请求data JSON为键（不含签名和时间戳）
+    - 超过ttl秒的条目视为过期
+    - 总大小超过max_bytes时按最近访问时间淘汰（LRU），总大小在内存中累计，写入时不再扫描全表
+    - hits / misses 记录命中情况
+    同一个实例可以在多个线程间共享
+    :param path: 缓存数据库文件路径
+    :param ttl: 条目有效期（秒）
+    :param max_bytes: 缓存总大小上限（字节）
+    """
+    PURGE_INTERVAL = 1000  # 每写入多少次清理一次过期条目
+
+    def __init__(self, path='tmall_response_cache.db', ttl=6 * 3600, max_bytes=200 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access);
+            CREATE INDEX IF NOT EXISTS idx_responses_created_at ON responses (created_at);
+        """)
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._puts = 0
+
+    @staticmethod
+    def make_key(data):
+        """把请求的data字典规范化为缓存键（键排序、紧凑格式）"""
+        return json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+    def get(self, key):
+        """读取缓存，未命中或已过期时返回None"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT body, created_at, size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._total -= row[2]
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return bytes(row[0])
+
+    def put(self, key, body):
+        """写入缓存，并在超过大小上限时淘汰最久未访问的条目"""
+        if len(body) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(body), len(body), now, now)
+            )
+            self._total += len(body) - (old[0] if old else 0)
+            self._puts += 1
+            if self._total > self.max_bytes or self._puts % self.PURGE_INTERVAL == 0:
+                self._evict()
+
+    def _evict(self):
+        """删除过期条目，然后按LRU删除直到总大小不超过上限（调用方需持有锁）"""
+        expire_before = time.time() - self.ttl
+        expired = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses WHERE created_at < ?", (expire_before,)
+        ).fetchone()[0]
+        if expired:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (expire_before,))
+            self._total -= expired
+        while self._total > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access LIMIT 64").fetchall()
+            if not rows:
+                self._total = 0
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total -= size
+                if self._total <= self.max_bytes:
+                    break
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'bytes': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+            self._total = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本地模拟的mtop评论接口，用于在不访问线上接口的情况下做并发、限流和错误处理的端到端测试
+- 返回与 响应完整.txt 结构相同的分页rateList数据，按totalPage / hasNext分页，每条评论ID唯一
+- 按 md5(token&t&appKey&data) 校验签名，签名不对时返回FAIL_SYS_ILLEGAL_ACCESS，
+  Cookie中的令牌不是当前令牌时返回令牌过期
+- 支持多个账号（按Cookie中的unb区分），每个账号有独立的令牌和每秒请求数上限
+- 可注入延迟、限流（按概率或按每个账号的每秒请求数上限）、令牌过期和非法访问错误
+- 令牌过期时与线上一样通过Set-Cookie下发新的_m_h5_tk，旧令牌随即失效
+- 指定population时模拟一个固定的评论全集：按评价类型（rateType）和标签（expression）筛选，
+  默认排序与时间排序的顺序不同，每种筛选最多返回page_cap页，用于测试分片覆盖爬取
+用法:
+  python tmall_fake_mtop.py --port 8765 --pages 50 --latency 0.05 --throttle 0.1
+  爬虫中: crawler.set_base_url(server.url); crawler.set_cookie(server.cookie())
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PAYLOAD = os.path.join(BASE_DIR, '响应完整.txt')
+API_PATH = '/h5/mtop.taobao.rate.detaillist.get/6.0/'
+APP_KEY = '12574478'
+
+SUCCESS_RET = 'SUCCESS::调用成功'
+THROTTLE_RET = 'FAIL_SYS_TRAFFIC_LIMIT::哎哟喂,被挤爆啦,请稍后重试'
+# 线上接口令牌过期的返回码就是这个拼写（EXOIRED）
+TOKEN_EXPIRED_RET = 'FAIL_SYS_TOKEN_EXOIRED::令牌过期'
+ILLEGAL_ACCESS_RET = 'FAIL_SYS_ILLEGAL_ACCESS::非法请求'
+
+
+def load_template(path=DEFAULT_PAYLOAD):
+    """读取响应样本，作为每页响应的模板"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    return json.loads(text[text.index('(') + 1:text.rindex(')')])
+
+
+class FakeMtopServer:
+    """
+    本地模拟的mtop评论接口（后台线程运行的HTTP服务）
+    :param total_pages: 每个商品的总页数
+    :param page_size: 每页评论数
+    :param latency: 每个请求的固定延迟（秒）
+    :param jitter: 额外的随机延迟上限（秒）
+    :param throttle_rate: 随机返回限流错误的概率
+    :param max_qps: 每个账号的每秒请求数上限，超出的请求返回限流错误，为None表示不限
+    :param token_expire_rate: 随机令牌过期的概率，过期后下发新令牌
+    :param illegal_access_rate: 随机返回非法访问错误的概率
+    :param token: 第一个账号的初始令牌（_m_h5_tk的前半部分），为None时随机生成
+    :param accounts: 账号数，cookie(i)返回第i个账号的Cookie
+    :param seed: 随机数种子，便于复现
+    :param population: 每个商品的评论总数，指定后按评论全集分页并支持筛选，total_pages不再使用
+    :param page_cap: 每种筛选条件最多可翻的页数（与线上totalPage的上限相同），为None表示不限
+    """
+    def __init__(self, total_pages=10, page_size=20, latency=0.0, jitter=0.0, throttle_rate=0.0, max_qps=None,
+                 token_expire_rate=0.0, illegal_access_rate=0.0, token=None, seed=None, host='127.0.0.1', port=0,
+                 payload=DEFAULT_PAYLOAD, accounts=1, population=None, page_cap=None):
+        self.total_pages = total_pages
+        self.page_size = page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.max_qps = max_qps
+        self.token_expire_rate = token_expire_rate
+        self.illegal_access_rate = illegal_access_rate
+        self.tokens = [token or uuid.uuid4().hex] + [uuid.uuid4().hex for _ in range(accounts - 1)]
+        self.host = host
+        self.port = port
+        self.population = population
+        self.page_cap = page_cap
+
+        template = load_template(payload)
+        self._comments = template['data']['rateList']
+        template['data']['rateList'] = []
+        self._template = template
+        self._tags = [tag['attributeId'] for tag in template['data'].get('imprItemVOS') or []]
+        self._orders = {}  # 评论全集模式下每个商品的默认排序顺序
+        if population:
+            # 评论全集中每条评论的评价类型和标签：约85%好评、8%中评、7%差评，越靠前的标签越常见
+            self._rate_types = []
+            for index in range(population):
+                roll = self._hash('rate', index) % 100
+                self._rate_types.append('1' if roll < 85 else '0' if roll < 93 else '-1')
+            self._tag_members = [
+                {index for index in range(population)
+                 if self._hash('tag', index, position) % 100 < max(3, 15 - 2 * position)}
+                for position in range(len(self._tags))
+            ]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._windows = [[] for _ in self.tokens]  # 每个账号最近一秒内的请求时间，用于max_qps
+        self._server = None
+        self._thread = None
+        self.reset_stats()
+
+    # ---- 统计 ----
+
+    def reset_stats(self):
+        """清空统计信息"""
+        with self._lock:
+            self.requests = 0
+            self.ret_counts = Counter()
+            self.failed_pages = set()     # 曾经返回过错误的 (商品ID, 页码)
+            self.succeeded_pages = set()  # 成功返回过的 (商品ID, 页码)
+
+    def stats(self):
+        """
+        返回统计信息：请求数、各返回码次数、出错后又成功（已恢复）和始终未成功的页数
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'ret_counts': dict(self.ret_counts),
+                'pages_succeeded': len(self.succeeded_pages),
+                'pages_with_errors': len(self.failed_pages),
+                'pages_recovered': len(self.failed_pages & self.succeeded_pages),
+                'pages_unrecovered': len(self.failed_pages - self.succeeded_pages),
+            }
+
+    # ---- 生命周期 ----
+
+    @property
+    def url(self):
+        """爬虫应使用的base_url"""
+        return f"http://{self.host}:{self.port}{API_PATH}"
+
+    @property
+    def token(self):
+        """第一个账号的当前令牌"""
+        return self.tokens[0]
+
+    def cookie(self, account=0):
+        """第account个账号包含当前令牌的Cookie字符串"""
+        return (f"unb={account}; tracknick=fake{account}; _m_h5_tk={self.tokens[account]}_{int(time.time() * 1000)}; "
+                f"_m_h5_tk_enc={uuid.uuid4().hex}")
+
+    def start(self):
+        """在后台线程中启动服务，返回self"""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # ---- 请求处理 ----
+
+    def _handle(self, handler):
+        query = parse_qs(urlparse(handler.path).query)
+        params = {key: values[0] for key, values in query.items()}
+        callback = params.get('callback', 'mtopjsonppcdetail1')
+
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        try:
+            data = json.loads(params.get('data', ''))
+            page_key = (str(data.get('auctionNumId', '')), int(data.get('pageNo', 1)))
+        except (TypeError, ValueError):
+            data, page_key = None, None
+
+        cookie = handler.headers.get('Cookie', '')
+        m = re.search(r'_m_h5_tk=([^_;]+)_', cookie)
+        account = re.search(r'(?:^|;\s*)unb=(\d+)', cookie)
+        account = int(account.group(1)) if account else 0
+        if account >= len(self.tokens):
+            account = 0
+        headers = {}
+        ret, body_data = self._dispatch(params, data, account, m.group(1) if m else '', headers)
+        with self._lock:
+            self.requests += 1
+            self.ret_counts[ret.split('::')[0]] += 1
+            if page_key is not None:
+                (self.succeeded_pages if ret == SUCCESS_RET else self.failed_pages).add(page_key)
+
+        result = copy.copy(self._template)
+        result['ret'] = [ret]
+        result['data'] = body_data
+        body = f"{callback}({json.dumps(result, ensure_ascii=False)})".encode('utf-8')
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json;charset=UTF-8')
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _dispatch(self, params, data, account, cookie_token, headers):
+        """
+        按注入规则决定返回码，返回 (返回码, 响应data)
+        :param account: 账号序号
+        :param cookie_token: 请求Cookie中_m_h5_tk的令牌部分
+        :param headers: 需要附加的响应头，令牌过期时在这里写入Set-Cookie
+        """
+        if data is None:
+            return ILLEGAL_ACCESS_RET, {}
+
+        with self._lock:
+            if self.max_qps:
+                now = time.monotonic()
+                window = [t for t in self._windows[account] if now - t < 1.0]
+                self._windows[account] = window
+                if len(window) >= self.max_qps:
+                    return THROTTLE_RET, {}
+                window.append(now)
+            roll = self._random.random()
+            token = self.tokens[account]
+
+        if cookie_token != token:
+            # Cookie中的令牌不是当前令牌时与线上一样返回令牌过期，并下发当前令牌
+            headers['Set-Cookie'] = self._token_cookie(token)
+            return TOKEN_EXPIRED_RET, {}
+        expected = hashlib.md5(
+            f"{token}&{params.get('t', '')}&{params.get('appKey', '')}&{params.get('data', '')}".encode('utf-8')
+        ).hexdigest()
+        if params.get('appKey') != APP_KEY or params.get('sign') != expected:
+            return ILLEGAL_ACCESS_RET, {}
+
+        # 按累积概率注入错误
+        threshold = self.throttle_rate
+        if roll < threshold:
+            return THROTTLE_RET, {}
+        threshold += self.token_expire_rate
+        if roll < threshold:
+            with self._lock:
+                if self.tokens[account] == token:
+                    self.tokens[account] = uuid.uuid4().hex
+                token = self.tokens[account]
+            headers['Set-Cookie'] = self._token_cookie(token)
+            return TOKEN_EXPIRED_RET, {}
+        threshold += self.illegal_access_rate
+        if roll < threshold:
+            return ILLEGAL_ACCESS_RET, {}
+
+        return SUCCESS_RET, self._page_data(data)
+
+    @staticmethod
+    def _token_cookie(token):
+        return f"_m_h5_tk={token}_{int(time.time() * 1000)};Path=/;Domain=127.0.0.1;Max-Age=86400"
+
+    def _page_data(self, data):
+        """生成一页响应data，超出总页数时rateList为空"""
+        if self.population:
+            return self._population_page_data(data)
+        item_id = str(data.get('auctionNumId', ''))
+        page = int(data.get('pageNo', 1))
+        page_size = int(data.get('pageSize', self.page_size) or self.page_size)
+        body_data = copy.copy(self._template['data'])
+        total = self.total_pages * page_size
+
+        comments = []
+        if page <= self.total_pages:
+            for i in range(page_size):
+                comment = dict(self._comments[i % len(self._comments)])
+                comment['id'] = f"{page:06d}{i:03d}"
+                comment['auctionNumId'] = item_id
+                comments.append(comment)
+
+        body_data['rateList'] = comments
+        body_data['total'] = str(total)
+        body_data['feedAllCount'] = str(total)
+        body_data['totalPage'] = str(self.total_pages)
+        body_data['hasNext'] = 'true' if page < self.total_pages else 'false'
+        return body_data
+
+    # ---- 评论全集模式 ----
+
+    @staticmethod
+    def _hash(*values):
+        return int(hashlib.md5('|'.join(map(str, values)).encode('utf-8')).hexdigest()[:8], 16)
+
+    def _population_order(self, item_id, order_type):
+        """按排序方式返回评论序号列表：时间排序为从新到旧，默认排序为固定的随机顺序"""
+        if order_type == 'feedbackdate':
+            return range(self.population)
+        with self._lock:
+            order = self._orders.get(item_id)
+            if order is None:
+                order = list(range(self.population))
+                random.Random(item_id).shuffle(order)
+                self._orders[item_id] = order
+            return order
+
+    def _population_page_data(self, data):
+        item_id = str(data.get('auctionNumId', ''))
+        page = int(data.get('pageNo', 1))
+        page_size = int(data.get('pageSize', self.page_size) or self.page_size)
+        rate_type = str(data.get('rateType') or '')
+        match = re.search(r'attributeId:(\d+)', str(data.get('expression') or ''))
+        members = self._tag_members[self._tags.index(match.group(1))] if match and match.group(1) in self._tags \
+            else None
+
+        rate_types = self._rate_types
+        selected = [index for index in self._population_order(item_id, data.get('orderType', ''))
+                    if (not rate_type or rate_types[index] == rate_type) and (members is None or index in members)]
+        total_pages = -(-len(selected) // page_size)
+        if self.page_cap:
+            total_pages = min(total_pages, self.page_cap)
+
+        comments = []
+        if page <= total_pages:
+            for index in selected[(page - 1) * page_size:page * page_size]:
+                comment = dict(self._comments[index % len(self._comments)])
+                comment['id'] = str(10 ** 12 + index)
+                comment['auctionNumId'] = item_id
+                comment['rateType'] = rate_types[index]
+                comments.append(comment)
+
+        body_data = copy.copy(self._template['data'])
+        body_data['rateList'] = comments
+        body_data['total'] = str(len(selected))
+        body_data['feedAllCount'] = str(self.population)
+        body_data['totalPage'] = str(total_pages)
+        body_data['hasNext'] = 'true' if page < total_pages else 'false'
+        body_data['imprItemVOS'] = [
+            dict(tag_info, count=str(len(members)))
+            for tag_info, members in zip(self._template['data'].get('imprItemVOS') or [], self._tag_members)
+        ]
+        return body_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的mtop评论接口")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pages', type=int, default=10, help="每个商品的总页数")
+    parser.add_argument('--latency', type=float, default=0.0, help="每个请求的固定延迟（秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="额外的随机延迟上限（秒）")
+    parser.add_argument('--throttle', type=float, default=0.0, help="随机限流的概率")
+    parser.add_argument('--max-qps', type=float, help="每个账号的每秒请求数上限，超出返回限流错误")
+    parser.add_argument('--accounts', type=int, default=1, help="账号数")
+    parser.add_argument('--token-expire', type=float, default=0.0, help="随机令牌过期的概率")
+    parser.add_argument('--illegal-access', type=float, default=0.0, help="随机非法访问错误的概率")
+    parser.add_argument('--seed', type=int, help="随机数种子")
+    parser.add_argument('--population', type=int, help="每个商品的评论总数，指定后支持按评价类型和标签筛选")
+    parser.add_argument('--page-cap', type=int, help="每种筛选条件最多可翻的页数")
+    args = parser.parse_args()
+
+    server = FakeMtopServer(total_pages=args.pages, latency=args.latency, jitter=args.jitter,
+                            throttle_rate=args.throttle, max_qps=args.max_qps,
+                            token_expire_rate=args.token_expire, illegal_access_rate=args.illegal_access,
+                            seed=args.seed, host=args.host, port=args.port, accounts=args.accounts,
+                            population=args.population, page_cap=args.page_cap).start()
+    print(f"模拟接口已启动: {server.url}")
+    for i in range(args.accounts):
+        print(f"Cookie: {server.cookie(i)}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"统计: {json.dumps(server.stats(), ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()